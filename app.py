@@ -1,69 +1,343 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
+from flask import Flask, Blueprint, current_app, g, render_template, request, jsonify, session, redirect, url_for, send_file, send_from_directory
 from flask_session import Session
+import functools
+import logging
+import math
 import os
+import random
+import threading
 import time  
-import spotipy
 import dotenv
-import pandas as pd
-import numpy as np
-import matplotlib
-matplotlib.use("Agg")  # Prevents GUI errors
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-from spotipy.oauth2 import SpotifyOAuth
 from flask_cors import CORS
-import sqlite3
-import textwrap
-import openai
+import db
+import exports
+import logs
+import metrics
+import schema
+import queries
+import rollups
+from chart_cache import ChartCache
+from chart_data import ChartDataCache, bar_series, genre_shares
+import charts
+from charts import ChartRenderer
+import hashlib
+import shutil
+import json
+import uuid
+from history_import import import_streaming_history
+import zipfile
 import re
+from genre_pipeline import GenreEnrichmentPipeline
+from genre_cache import GenreCache, SOURCE_LLM
+from genre_classifier import BatchGenreClassifier, FakeLLMBackend, OpenAIBackend, is_valid_genre
+from jobs import JobRunner
+from metrics import EXTERNAL_LATENCY, HTTP_LATENCY
+from profiling import PROFILE_DIR, SamplingProfiler
+from response_cache import ResponseCache
+from shards import ShardRouter, claim_plays, shard_name, split_into_shards
+from history_sync import init_sync_state, save_plays, sync_recently_played
+import click
 dotenv.load_dotenv()
-
-openai.api_key = os.getenv("OPENAI_API_KEY")
+log = logging.getLogger(__name__)
 
 #Fonts
 poppins_path = "fonts/Poppins-Regular.ttf"
-poppins_font = fm.FontProperties(fname=poppins_path)
-# Flask App Setup
-app = Flask(__name__)
-CORS(app)
-
-app.secret_key = os.urandom(24)  # Required for session
-app.config["SESSION_PERMANENT"] = True  
-app.config["SESSION_TYPE"] = "filesystem"  # 🔥 Store session data properly
-app.config["SESSION_FILE_DIR"] = "/tmp/flask_session/"  # 🔥 Store it somewhere real
-app.config["SESSION_USE_SIGNER"] = True
-Session(app)
+
+# Routes live on a blueprint; create_app() (found automatically by `flask run`) builds the app
+bp = Blueprint("main", __name__, cli_group=None)
 
 UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-# Spotify API Setup
-CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
-CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
-REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI")
+# 💤 Services that need pandas / numpy / aiohttp / spotipy are built on first use, so a worker
+# starts without those imports and only the routes that need them pay for it (see warm_up())
+@functools.cache
+def get_dataset_store():
+    """📦 Uploaded CSVs live on disk per user/session; any worker can load them."""
+    from dataset_store import DatasetStore
+    return DatasetStore(os.getenv("DATASET_DIR", "datasets"),
+                        memory_budget=int(os.getenv("DATASET_MEMORY_MB", "256")) * 1024 * 1024)
+
+
+@functools.cache
+def get_search_indexes():
+    """🔎 Built once per dataset version, saved beside it."""
+    from search_index import SearchIndexCache
+    return SearchIndexCache()
+
+
+@functools.cache
+def get_recommenders():
+    """🧭 Track vectors per dataset / history version, saved to disk."""
+    from recommender import RecommenderCache
+    return RecommenderCache()
+
+
+@functools.cache
+def get_spotify():
+    """🌐 One pooled, rate-limited connection layer for every Spotify call."""
+    from spotify_client import SpotifyClient
+    return SpotifyClient(cache=spotify_cache)
+
+
+@functools.cache
+def get_sp_oauth():
+    from spotipy.oauth2 import SpotifyOAuth
+    oauth = SpotifyOAuth(
+        client_id=os.getenv("SPOTIFY_CLIENT_ID"),
+        client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"),
+        redirect_uri=os.getenv("SPOTIFY_REDIRECT_URI"),
+        scope="user-top-read user-read-recently-played"
+    )
+    accounts = os.getenv("SPOTIFY_ACCOUNTS_BASE")  # 🧪 e.g. benchmarks/stub_servers.py
+    if accounts:
+        oauth.OAUTH_AUTHORIZE_URL = f"{accounts}/authorize"
+        oauth.OAUTH_TOKEN_URL = f"{accounts}/api/token"
+    return oauth
+
+
+RECOMMENDER_DIR = os.getenv("RECOMMENDER_DIR", "recommender")
+chart_cache = ChartCache()
+chart_data_cache = ChartDataCache()  # 📦 Encoded JSON (+ gzip) for the client-side charts
+chart_renderer = ChartRenderer()  # CHART_RENDER_PROCESSES=0 renders in-process
+genre_cache = GenreCache()  # 🔥 Shared by all workers, survives restarts
+genre_classifier = BatchGenreClassifier(
+    FakeLLMBackend() if os.getenv("GENRE_LLM_BACKEND") == "fake" else OpenAIBackend(),
+    batch_size=int(os.getenv("GENRE_BATCH_SIZE", "25")),
+    tokens_per_minute=int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000"))
+)
+spotify_cache = ResponseCache()  # 🗃️ Per-user / per-endpoint TTLs for slow-changing Spotify reads
+shard_router = ShardRouter()  # 🗂️ SHARD_DIR=... gives every user their own plays database
+job_runner = JobRunner()
+ingest_runner = JobRunner()  # Separate queue so uploads never wait behind DB maintenance
+MAINTENANCE_CHUNK_SIZE = 200  # Artists per progress update / cancellation checkpoint
+MAINTENANCE_INTERVAL = int(os.getenv("MAINTENANCE_INTERVAL_HOURS", "6")) * 3600
+ROLLUP_INTERVAL = int(os.getenv("ROLLUP_INTERVAL_MINUTES", "15")) * 60
 
-sp_oauth = SpotifyOAuth(
-    client_id=CLIENT_ID,
-    client_secret=CLIENT_SECRET,
-    redirect_uri=REDIRECT_URI,
-    scope="user-top-read user-read-recently-played"
 
-)
+# 📏 /metrics: the caches' own stats() counters, read at scrape time
+def if_loaded(getter):
+    """stats() of a lazily built service, or nothing if it hasn't been built (a scrape never builds it)."""
+    return lambda: getter().stats() if getter.cache_info().currsize else {}
+
+
+cache_stats = metrics.REGISTRY.stats("app_cache", "Hit / miss / size counters from each cache's stats()", "cache")
+cache_stats.add("chart_png", lambda: chart_cache.stats())  # Looked up at scrape time; benchmarks swap the cache
+cache_stats.add("chart_data", chart_data_cache.stats)
+cache_stats.add("genre", genre_cache.stats)
+cache_stats.add("spotify_response", spotify_cache.stats)
+cache_stats.add("dataset", if_loaded(get_dataset_store))
+cache_stats.add("search_index", if_loaded(get_search_indexes))
+cache_stats.add("recommender", if_loaded(get_recommenders))
+component_stats = metrics.REGISTRY.stats("app_component", "Counters kept by the DB pool, genre classifier and shard router",
+                                         "component")
+component_stats.add("db_pool", lambda: db.get_pool().stats)
+component_stats.add("genre_classifier", lambda: genre_classifier.stats)
+component_stats.add("shards", shard_router.stats)
+profiled_requests = metrics.REGISTRY.counter("profiled_requests_total", "Requests run under the sampling profiler",
+                                             ["route"])
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dataset_owner():
+    """Who owns uploads in this session: the Spotify user if logged in, else a per-session ID."""
+    if session.get("spotify_user_id"):
+        return f"user:{session['spotify_user_id']}"
+    if "dataset_session_id" not in session:
+        session["dataset_session_id"] = uuid.uuid4().hex
+    return f"session:{session['dataset_session_id']}"
+
+
+def current_user_id():
+    """Whose listening history this request sees: the logged-in Spotify user, else the pre-login history."""
+    return session.get("spotify_user_id") or schema.LEGACY_USER_ID
+
+
+def user_scope():
+    """(user_id, db_path) for this request's plays; db_path is None unless sharding is on."""
+    user_id = current_user_id()
+    return user_id, shard_router.path(user_id)
+
+
+def load_music_data():
+    """Returns (DataFrame, version) for this user's latest upload, or (None, None)."""
+    return get_dataset_store().load(dataset_owner())
 
-music_data = None 
-genre_cache = {}
+
+def get_search_index(music_data, version, owner=None):
+    """Search index over the dataset's artists and tracks (built and saved on first use)."""
+    directory = os.path.join(get_dataset_store().dataset_dir(owner or dataset_owner(), version), "search")
+    return get_search_indexes().get(directory, music_data)
+
+
+def get_dataset_recommender(music_data, version, owner=None):
+    """Track vectors for the dataset (built and saved beside it on first use)."""
+    directory = os.path.join(get_dataset_store().dataset_dir(owner or dataset_owner(), version), "recommender")
+    from recommender import Recommender
+
+    return get_recommenders().get(directory, lambda: Recommender.from_frame(music_data))
+
+
+def history_recommender_dir(user_id):
+    return os.path.join(RECOMMENDER_DIR, shard_name(user_id).removesuffix(".db"))
+
+
+recommender_builds = set()  # History recommender directories with a rebuild queued or running
+recommender_builds_lock = threading.Lock()
+
+
+def build_history_recommender(job=None, user_id=schema.LEGACY_USER_ID, db_path=None):
+    """🧭 Builds (and saves) the recommender for the user's current data version, then drops older versions."""
+    from recommender import Recommender
+
+    version = queries.data_version(user_id, db_path)
+    directory = history_recommender_dir(user_id)
+    try:
+        if version is not None:
+            log.info("🧭 Building recommender for history version %s...", version)
+            get_recommenders().get(os.path.join(directory, version),
+                                   lambda: Recommender.from_history(user_id, db_path))
+            for name in os.listdir(directory):
+                if name != version and not name.startswith("."):  # Older versions, not in-flight saves
+                    shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    finally:
+        with recommender_builds_lock:
+            recommender_builds.discard(directory)
+
+
+job_runner.register("build_history_recommender", build_history_recommender)
+
+
+def get_history_recommender(user_id, db_path=None):
+    """Track vectors for the user's listening history.
+
+    When the data version has moved on, the rebuild runs on job_runner and the
+    previous version keeps serving until it's done; only a user's very first
+    recommender is built on the request thread.
+    """
+    version = queries.data_version(user_id, db_path)
+    if version is None:
+        return None
+    directory = history_recommender_dir(user_id)
+    current = os.path.join(directory, version)
+    if os.path.exists(current):
+        return get_recommenders().get(current, None)
+
+    previous = sorted((entry for entry in os.scandir(directory) if entry.is_dir() and not entry.name.startswith(".")),
+                      key=lambda entry: entry.stat().st_mtime) if os.path.isdir(directory) else []
+    if previous:
+        with recommender_builds_lock:
+            queued = directory in recommender_builds
+            recommender_builds.add(directory)
+        if not queued:
+            job_runner.submit("build_history_recommender", user_id=user_id, db_path=db_path)
+        try:
+            return get_recommenders().get(previous[-1].path, None)
+        except FileNotFoundError:
+            pass  # Removed by a rebuild that just finished
+
+    from recommender import Recommender
+
+    return get_recommenders().get(current, lambda: Recommender.from_history(user_id, db_path))
+
+
+def history_recommendations(track=None, artist=None, k=10):
+    """[{name, artist, score}] similar to a track/artist, or to the most played tracks when neither is given."""
+    user_id, db_path = user_scope()
+    recommender = get_history_recommender(user_id, db_path)
+    if recommender is None:
+        return []
+
+    where, params = ["p.user_id = ?"], [user_id]
+    if track:
+        where.append("t.name = ? COLLATE NOCASE")
+        params.append(track)
+    if artist:
+        where.append("a.name = ? COLLATE NOCASE")
+        params.append(artist)
+    with db.connection(db_path) as conn:
+        seeds = conn.execute(f"""
+            SELECT t.id, COUNT(*) AS plays FROM plays p
+            JOIN tracks t ON t.id = p.track_id
+            JOIN artists a ON a.id = t.artist_id
+            WHERE {" AND ".join(where)}
+            GROUP BY t.id ORDER BY plays DESC LIMIT 20
+        """, params).fetchall()
+        matches = recommender.similar([track_id for track_id, _ in seeds], k=k,
+                                      weights=[math.log1p(plays) for _, plays in seeds])
+        names = dict(((track_id, (name, artist_name)) for track_id, name, artist_name in conn.execute(f"""
+            SELECT t.id, t.name, a.name FROM tracks t JOIN artists a ON a.id = t.artist_id
+            WHERE t.id IN ({",".join("?" * len(matches))})
+        """, [track_id for track_id, _ in matches]).fetchall()))
+    return [{"name": names[track_id][0], "artist": names[track_id][1], "score": score} for track_id, score in matches]
+
+
+def search_results(music_data, matches):
+    return [{'track_name': music_data['track_name'].iat[row], 'artist': music_data['artist'].iat[row], 'score': score}
+            for row, score in matches]
+
+
+# ⏱️ Every request is timed per route; some are also profiled (see should_profile)
+def should_profile():
+    """PROFILE_SAMPLE_RATE of all requests, plus any sent with `X-Profile: 1` when PROFILE_HEADER is on."""
+    if current_app.config["PROFILE_HEADER"] and request.headers.get("X-Profile") == "1":
+        return True
+    rate = current_app.config["PROFILE_SAMPLE_RATE"]
+    return rate > 0 and random.random() < rate
+
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if should_profile():
+        g.profiler = SamplingProfiler().start()
+
+
+@bp.after_app_request
+def record_request_timing(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    if "request_start" in g:
+        HTTP_LATENCY.observe(time.perf_counter() - g.request_start, route=route, method=request.method,
+                             status=response.status_code)
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.stop()
+        profiled_requests.inc(route=route)
+        if profiler.samples:  # Requests shorter than one interval have nothing to show
+            name = profiler.save(f"{request.method} {route}")
+            response.headers["X-Profile"] = url_for("main.get_profile", name=name)
+            log.info("🔬 Profiled %s %s: %d samples in %.3fs -> %s", request.method, route, profiler.samples,
+                     profiler.elapsed, name)
+    return response
+
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    return current_app.response_class(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@bp.route('/profiles/<name>')
+def get_profile(name):
+    """A saved profile (folded stacks); only served while profiling is enabled."""
+    if not (current_app.config["PROFILE_HEADER"] or current_app.config["PROFILE_SAMPLE_RATE"]):
+        return jsonify({"error": "Profiling is disabled"}), 404
+    return send_from_directory(os.path.abspath(PROFILE_DIR), name, mimetype="text/plain")
 
 
 # 🌎 Home Route
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
 # 📤 Upload CSV File
-@app.route('/upload', methods=['POST'])
+@bp.route('/upload', methods=['POST'])
 def upload_file():
-    global music_data
     if 'file' not in request.files:
         return jsonify({'error': 'No file uploaded'})
 
@@ -71,19 +345,86 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'No selected file'})
 
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
+    # Unique name so two users uploading "history.csv" at once don't overwrite each other
+    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}.csv")
     file.save(filepath)
 
+    # ⏳ Parse in the background; the client polls the job for progress
+    job_id = ingest_runner.submit("ingest_upload", filepath=filepath, owner=dataset_owner())
+    return jsonify({'message': '⏳ Upload received, processing...', 'job_id': job_id,
+                    'progress_url': url_for('main.job_progress', job_id=job_id)}), 202
+
+
+def ingest_upload(job, filepath, owner):
+    """Streams an uploaded CSV into the owner's dataset, reporting progress in bytes read."""
     try:
-        music_data = pd.read_csv(filepath)
-        return jsonify({'message': '✅ File uploaded successfully!', 'columns': music_data.columns.tolist()})
-    except Exception as e:
-        return jsonify({'error': str(e)})
+        def progress(done_bytes, total_bytes, rows):
+            job.progress(done_bytes, total_bytes, f"{rows} rows read")
+
+        from csv_ingest import ingest_csv
+
+        df = ingest_csv(filepath, progress=progress, cancelled=lambda: job.cancelled)
+        if df is None:
+            return
+        # 🔑 The content hash doubles as the dataset version and chart cache key
+        version = file_sha256(filepath)
+        df = get_dataset_store().save(owner, df, version)
+        if {'artist', 'track_name'} <= set(df.columns):
+            job.progress(os.path.getsize(filepath), os.path.getsize(filepath), "🔎 Building search index")
+            get_search_index(df, version, owner)
+        job.progress(os.path.getsize(filepath), os.path.getsize(filepath),
+                     f"✅ {len(df)} rows, columns: {', '.join(map(str, df.columns))}")
+    finally:
+        os.remove(filepath)  # The dataset store keeps its own copy
+
+
+ingest_runner.register("ingest_upload", ingest_upload)
+
+
+# 📦 Import Spotify's extended streaming history export (my_spotify_data.zip)
+@bp.route('/import-streaming-history', methods=['POST'])
+def import_streaming_history_upload():
+    if 'file' not in request.files or request.files['file'].filename == '':
+        return jsonify({'error': 'No file uploaded'})
+
+    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}.zip")
+    request.files['file'].save(filepath)
+    if not zipfile.is_zipfile(filepath):
+        os.remove(filepath)
+        return jsonify({'error': '⚠️ Expected the .zip file from Spotify\'s data download'})
+
+    user_id, db_path = user_scope()
+    job_id = ingest_runner.submit("import_streaming_history", filepath=filepath, user_id=user_id, db_path=db_path)
+    return jsonify({'message': '⏳ Export received, importing...', 'job_id': job_id,
+                    'progress_url': url_for('main.job_progress', job_id=job_id)}), 202
+
+
+def import_streaming_history_job(job, filepath, user_id=schema.LEGACY_USER_ID, db_path=None):
+    """Imports an uploaded export zip into the user's plays, reporting progress per file."""
+    try:
+        stats = import_streaming_history(
+            filepath,
+            processes=int(os.getenv("IMPORT_PROCESSES", "0")) or None,
+            progress=lambda done, total, message: job.progress(done, total, message),
+            cancelled=lambda: job.cancelled,
+            user_id=user_id,
+            db_path=db_path
+        )
+        job.progress(stats["files"], stats["files"],
+                     f"✅ {stats['rows_inserted']} new plays ({stats['duplicates']} duplicates, "
+                     f"{stats['skipped']} non-music) at {stats['rows_per_sec']} rows/sec")
+        log.info("✅ Imported streaming history: %s", stats)
+        job_runner.submit("compact_rollups", db_path=db_path)  # 📈 Fold the new plays into the analytics rollups now
+    finally:
+        os.remove(filepath)
+
+
+ingest_runner.register("import_streaming_history", import_streaming_history_job)
 
 # 📊 Get Summary Stats
-@app.route('/summary', methods=['GET'])
+@bp.route('/summary', methods=['GET'])
 def summary():
-    global music_data
+    music_data, _ = load_music_data()
     if music_data is None:
         return jsonify({'error': '⚠️ No data uploaded'})
 
@@ -99,18 +440,23 @@ def summary():
 
 def get_genre(artist_name):
     """Fetches the genre of an artist using GPT-4o-mini if Spotify provides no genre."""
-    if artist_name in genre_cache:
-        return genre_cache[artist_name]  # ✅ Use cached value
+    cached_genre = genre_cache.get(artist_name)
+    if cached_genre is not None:
+        return cached_genre  # ✅ Use cached value
 
-    print(f"⚠️ {artist_name} - No genres found on Spotify. Fetching from OpenAI...")
+    log.debug("⚠️ %s - No genres found on Spotify. Fetching from OpenAI...", artist_name)
 
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",  # ✅ Uses GPT-4o-mini for cost efficiency
-            messages=[{"role": "user", "content": f"Provide only the primary genre of {artist_name} in one word."}],
-            max_tokens=3,  # ✅ Further limits response length
-            temperature=0  # ✅ Ensures deterministic output
-        )
+        import openai
+
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+        with EXTERNAL_LATENCY.time(service="openai", operation="single_genre"):
+            response = openai.ChatCompletion.create(
+                model="gpt-4o-mini",  # ✅ Uses GPT-4o-mini for cost efficiency
+                messages=[{"role": "user", "content": f"Provide only the primary genre of {artist_name} in one word."}],
+                max_tokens=3,  # ✅ Further limits response length
+                temperature=0  # ✅ Ensures deterministic output
+            )
 
         raw_genre = response["choices"][0]["message"]["content"].strip()
 
@@ -118,20 +464,20 @@ def get_genre(artist_name):
         genre_match = re.search(r"\b([A-Za-z-]+)\b", raw_genre)
         genre = genre_match.group(1) if genre_match else "Unknown"
 
-        print(f"🎨 AI-Fetched Genre for {artist_name}: {genre}")
+        log.debug("🎨 AI-Fetched Genre for %s: %s", artist_name, genre)
 
     except Exception as e:
-        print(f"❌ ERROR: Failed to fetch genre for {artist_name} - {e}")
+        log.error("❌ Failed to fetch genre for %s - %s", artist_name, e)
         genre = "Unknown"
 
-    genre_cache[artist_name] = genre  # ✅ Save to cache
+    genre_cache.set(artist_name, genre, SOURCE_LLM)  # ✅ Save to cache
     return genre
 
-@app.route('/update-data', methods=['GET'])
+@bp.route('/update-data', methods=['GET'])
 def update_data():
     """Fetches and updates the user's latest listening history and genres before visualizing data."""
     try:
-        print("🔄 Updating user data...")
+        log.info("🔄 Updating user data...")
         
         # Step 1: Fetch latest Spotify listening history
         spotify_listening_history()
@@ -139,352 +485,460 @@ def update_data():
         # Step 2: Update missing genres using Spotify API or GPT-4o-mini
         update_missing_genres()
         
-        print("✅ Data update complete.")
+        log.info("✅ Data update complete.")
         return jsonify({"message": "✅ Data update complete."})
     except Exception as e:
-        print(f"❌ ERROR: Data update failed - {e}")
+        log.error("❌ Data update failed - %s", e)
         return jsonify({"error": "Data update failed", "details": str(e)})
 
 
-def update_existing_unknown_genres():
+def update_existing_unknown_genres(job=None, db_path=None):
     """Finds and updates all 'Unknown' genres in the database using GPT-4o-mini."""
-    conn = sqlite3.connect("spotify_data.db")
-    cursor = conn.cursor()
-
     # Find all artists with 'Unknown' genre
-    cursor.execute("SELECT DISTINCT artist FROM listening_history WHERE genre = 'Unknown'")
-    unknown_artists = cursor.fetchall()
+    with db.connection(db_path) as conn:
+        unknown_artists = conn.execute("SELECT id, name, spotify_id FROM artists WHERE genre = 'Unknown'").fetchall()
 
     if not unknown_artists:
-        print("✅ No 'Unknown' genres to update.")
-        conn.close()
+        log.info("✅ No 'Unknown' genres to update.")
         return
 
-    print(f"🔄 Updating {len(unknown_artists)} 'Unknown' genres...")
+    log.info("🔄 Updating %d 'Unknown' genres...", len(unknown_artists))
 
     updated = 0
-    for artist_tuple in unknown_artists:
-        artist_name = artist_tuple[0]
-        new_genre = get_genre(artist_name)  # 🔥 Fetch new genre
+    for i in range(0, len(unknown_artists), MAINTENANCE_CHUNK_SIZE):
+        if job and job.cancelled:
+            log.info("🛑 Genre update cancelled.")
+            break
 
-        if new_genre and new_genre != "Unknown":
-            cursor.execute("UPDATE listening_history SET genre = ? WHERE artist = ?", (new_genre, artist_name))
-            conn.commit()
-            print(f"✅ Updated {artist_name} -> {new_genre}")
-            updated += 1
+        # 🔥 Many artists per GPT-4o-mini call; only invalid answers get re-asked
+        # The LLM only sees names; updates go by artists.id since several artists can share a name
+        chunk = unknown_artists[i:i + MAINTENANCE_CHUNK_SIZE]
+        new_genres = genre_classifier.classify([name for _, name, _ in chunk])
+        updates = [(artist_id, name, spotify_id, new_genres[name]) for artist_id, name, spotify_id in chunk
+                   if new_genres.get(name, "Unknown") != "Unknown"]
+        genre_cache.set_many([(name, spotify_id, genre, SOURCE_LLM) for _, name, spotify_id, genre in updates])
 
-    conn.close()
-    print(f"✅ Finished updating {updated} 'Unknown' genres.")
+        with db.transaction(db_path) as conn:
+            conn.executemany("UPDATE artists SET genre = ? WHERE id = ?",
+                             [(genre, artist_id) for artist_id, _, _, genre in updates])
+        updated += len(updates)
 
-# Call this function **after** fetching the listening history
-update_existing_unknown_genres()
+        if job:
+            job.progress(i + len(chunk), len(unknown_artists), "Fetching genres for 'Unknown' artists")
 
+    log.info("✅ Finished updating %d 'Unknown' genres.", updated)
 
 
-def reset_invalid_genres():
-    """Finds and resets invalid genres in the database."""
-    conn = sqlite3.connect("spotify_data.db")
-    cursor = conn.cursor()
 
+def reset_invalid_genres(job=None, db_path=None):
+    """Finds and resets invalid genres in the database."""
     # Find all genres currently stored
-    cursor.execute("SELECT DISTINCT artist, genre FROM listening_history")
-    all_genres = cursor.fetchall()
-
-    invalid_genres = []
-    for artist, genre in all_genres:
-        # ✅ If genre contains full sentences, artist names, or phrases, it's invalid
-        if len(genre.split()) > 3 or not re.match(r"^[a-zA-Z\s-]+$", genre):
-            invalid_genres.append((artist, genre))
+    with db.connection(db_path) as conn:
+        all_genres = conn.execute("SELECT id, name, genre FROM artists").fetchall()
 
-        # ✅ Check for artist mentions in genre (e.g., "Chase Shakur is known for R&B")
-        if artist.lower() in genre.lower():
-            invalid_genres.append((artist, genre))
+    # ✅ Sentences, phrases and artist mentions are all invalid
+    invalid_genres = [(artist_id, artist, genre) for artist_id, artist, genre in all_genres
+                      if not is_valid_genre(artist, genre)]
 
-    print(f"🚨 Found {len(invalid_genres)} invalid genres.")
+    log.info("🚨 Found %d invalid genres.", len(invalid_genres))
 
     # Reset all invalid genres to 'Unknown'
-    for artist, genre in invalid_genres:
-        cursor.execute("UPDATE listening_history SET genre = 'Unknown' WHERE artist = ?", (artist,))
-        print(f"🛑 Reset genre for {artist} -> 'Unknown' (Was: {genre})")
+    with db.transaction(db_path) as conn:
+        for artist_id, artist, genre in invalid_genres:
+            conn.execute("UPDATE artists SET genre = 'Unknown' WHERE id = ?", (artist_id,))
+            log.debug("🛑 Reset genre for %s -> 'Unknown' (Was: %s)", artist, genre)
 
-    conn.commit()
-    conn.close()
+    if job:
+        job.progress(len(invalid_genres), len(invalid_genres), "Reset invalid genres")
+        if job.cancelled:
+            return
 
-    print("✅ Reset complete. Re-fetching genres now...")
-    update_existing_unknown_genres()  # 🔥 Re-run OpenAI genre fetching
+    log.info("✅ Reset complete. Re-fetching genres now...")
+    update_existing_unknown_genres(job, db_path)  # 🔥 Re-run OpenAI genre fetching
 
-# Run this again to ensure full cleanup
-reset_invalid_genres()
 
+def compact_rollups(job=None, db_path=None):
+    """Folds plays added since the last run into the hourly / daily rollup tables."""
+    start = time.perf_counter()
+    folded = rollups.catch_up(progress=job.progress if job else None, db_path=db_path)
+    log.info("📈 Rolled up %d new plays in %.2fs", folded, time.perf_counter() - start)
 
 
+def every_database(fn):
+    """Runs a maintenance job on one database when given db_path, else on the main one and every user shard."""
+    @functools.wraps(fn)
+    def run(job=None, db_path=None):
+        for path in [db_path] if db_path is not None else shard_router.paths():
+            if job and job.cancelled:
+                break
+            fn(job, db_path=path)
+    return run
+
+
+# 🛠️ DB maintenance runs as background jobs instead of at import time
+job_runner.register("update_existing_unknown_genres", every_database(update_existing_unknown_genres))
+job_runner.register("reset_invalid_genres", every_database(reset_invalid_genres))
+job_runner.register("compact_rollups", every_database(compact_rollups))
 
 
 
 
 
-def update_missing_genres():
-    """Finds songs with missing genres and updates them using Spotify API or GPT-4o-mini."""
-    conn = sqlite3.connect("spotify_data.db")
-    cursor = conn.cursor()
 
-    # Fetch all artists without a genre
-    cursor.execute("SELECT DISTINCT artist FROM listening_history WHERE genre IS NULL OR genre = 'Unknown'")
-    missing_artists = cursor.fetchall()
 
-    conn.close()
+
+def update_missing_genres():
+    """Finds songs with missing genres and updates them using Spotify API or GPT-4o-mini."""
+    _, db_path = user_scope()
+    # Fetch all artists without a genre (plus their Spotify ID when we stored one)
+    with db.connection(db_path) as conn:
+        missing_artists = conn.execute(
+            "SELECT name, spotify_id FROM artists WHERE genre IS NULL OR genre = 'Unknown'"
+        ).fetchall()
 
     if not missing_artists:
-        print("✅ No missing genres to update.")
+        log.info("✅ No missing genres to update.")
         return
 
-    print(f"🔄 Updating {len(missing_artists)} artists with missing genres...")
+    log.info("🔄 Updating %d artists with missing genres...", len(missing_artists))
 
     token = get_token()
     if not token:
-        print("❌ ERROR: Spotify token is missing. Cannot fetch genres.")
+        log.error("❌ Spotify token is missing. Cannot fetch genres.")
         return
 
-    sp = spotipy.Spotify(auth=token)
+    sp = get_spotify().for_token(token)
 
-    updated = 0
-    for artist_tuple in missing_artists:
-        artist_name = artist_tuple[0]
-        genre = "Unknown"
+    # 🔥 Batched Spotify lookups + concurrent GPT-4o-mini fallback, one DB write at the end
+    pipeline = GenreEnrichmentPipeline(sp, get_genre, db_path=db_path, cache=genre_cache, classifier=genre_classifier)
+    stats = pipeline.run(missing_artists)
 
-        try:
-            # 🔍 Fetch artist details from Spotify
-            results = sp.search(q=artist_name, type="artist", limit=1)
-            if "artists" in results and results["artists"]["items"]:
-                artist_data = results["artists"]["items"][0]
-                genres = artist_data.get("genres", [])
+    log.info("✅ Genre update complete! Updated %d artists.", stats['artists'])
+    return stats
 
-                # ✅ Use first genre from Spotify if available
-                genre = genres[0] if genres else "Unknown"
 
-        except Exception as e:
-            print(f"⚠️ ERROR: Could not fetch Spotify genre for {artist_name}: {e}")
 
-        # 🔥 If still "Unknown", use GPT-4o-mini
-        if genre == "Unknown":
-            genre = get_genre(artist_name)
 
-        # ✅ Update database with final genre
-        conn = sqlite3.connect("spotify_data.db")
-        cursor = conn.cursor()
-        cursor.execute("UPDATE listening_history SET genre = ? WHERE artist = ?", (genre, artist_name))
-        conn.commit()
-        conn.close()
 
-        print(f"✅ Final Genre for {artist_name}: {genre}")
-        updated += 1
 
-    print(f"✅ Genre update complete! Updated {updated} artists.")
 
+# 🌐 Per-endpoint Spotify latency / retry / 429 counters
+@bp.route('/spotify-client-stats', methods=['GET'])
+def spotify_client_stats():
+    return jsonify(get_spotify().stats())
 
 
+@bp.route('/spotify-cache-stats', methods=['GET'])
+def spotify_cache_stats():
+    return jsonify(spotify_cache.stats())
 
 
+# 📊 Genre Cache Hit Rate
+@bp.route('/genre-cache-stats', methods=['GET'])
+def genre_cache_stats():
+    return jsonify(genre_cache.stats())
 
 
-# 📈 Generate Static Chart
-@app.route('/visualize', methods=['GET'])
-def visualize():
-    global music_data
-    if music_data is None or music_data.empty:
-        return jsonify({'error': '⚠️ No data available to generate a chart'})
+# 🛠️ Background Jobs
+@bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify({"jobs": job_runner.list(), "available": sorted(job_runner.registry)})
 
-    plt.figure(figsize=(10, 5))
-    top_artists = music_data['artist'].value_counts().head(10)
-    top_artists.plot(kind='bar', color='skyblue')
-    plt.xlabel('Artist')
-    plt.ylabel('Number of Songs')
-    plt.title('Top 10 Artists')
-    plt.xticks(rotation=45)
 
-    # 🛠️ Ensure static directory exists
-    static_dir = os.path.join(os.getcwd(), 'static')
-    if not os.path.exists(static_dir):
-        os.makedirs(static_dir)
+@bp.route('/jobs/<name>', methods=['POST'])
+def start_job(name):
+    if name not in job_runner.registry:
+        return jsonify({"error": f"Unknown job: {name}"}), 404
+    return jsonify({"job_id": job_runner.submit(name)})
 
-    # 📁 Save the Chart
-    chart_path = os.path.join(static_dir, "top_artists_chart.png")
-    plt.savefig(chart_path)
-    plt.close()
 
-    print(f"✅ DEBUG: Chart saved at: {chart_path}")
+@bp.route('/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_runner.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
 
-    return jsonify({'image_url': "/static/top_artists_chart.png"})
 
+@bp.route('/jobs/<int:job_id>/progress', methods=['GET'])
+def job_progress(job_id):
+    job = job_runner.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    progress = {key: job[key] for key in ("id", "status", "done", "total", "percent", "message")}
+    if job["error"]:
+        progress["error"] = job["error"].splitlines()[0]  # Just the message, not the traceback
+    return jsonify(progress)
 
-# 📊 Pie Chart for Genres with Improved Label Handling
-@app.route('/visualize-genres')
-def visualize_genres():
-    conn = sqlite3.connect("spotify_data.db")
-    df = pd.read_sql_query("SELECT genre FROM listening_history", conn)
-    conn.close()
 
-    if df.empty:
-        return jsonify({"error": "No genre data available."})
+@bp.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not job_runner.cancel(job_id):
+        return jsonify({"error": "Job is not running"}), 409
+    return jsonify({"message": "🛑 Cancellation requested", "job_id": job_id})
 
-    # Count occurrences of each genre
-    genre_counts = df["genre"].value_counts()
 
-    # 🎨 Create a transparent pie chart
-    fig, ax = plt.subplots(figsize=(7, 7))
-    fig.patch.set_alpha(0)  # Ensure background transparency
+# 💻 CLI: flask run-job reset_invalid_genres
+@bp.cli.command("run-job")
+@click.argument("name")
+def run_job_command(name):
+    """Runs a background job right now, in the foreground."""
+    if name not in job_runner.registry:
+        raise click.BadParameter(f"choose from {', '.join(sorted(job_runner.registry))}", param_hint="NAME")
+    job = job_runner.run_now(name)
+    click.echo(f"Job {job['id']} ({name}): {job['status']}")
 
-    wedges, texts, autotexts = ax.pie(
-        genre_counts,
-        labels=genre_counts.index,
-        autopct='%1.1f%%',
-        startangle=140,
-        pctdistance=0.85,  # Push percentage values inward
-        textprops={'fontsize': 10, 'color': 'white','fontproperties':poppins_font}  # Make all text white
-    )
 
-    # 🎨 Move small genre labels to the top-left
-    small_genre_texts = []
-    x_offset, y_offset = -1.8, 1.2
-    for i, (wedge, label, percentage) in enumerate(zip(wedges, texts, autotexts)):
-        pct = float(percentage.get_text().replace('%', ''))
-        if pct < 5:
-            label.set_visible(False)
-            percentage.set_visible(False)
-
-            color = wedge.get_facecolor()
-            small_genre_texts.append((label.get_text(), pct, color))
-
-    for i, (genre, pct, color) in enumerate(small_genre_texts):
-        ax.text(
-            x_offset, y_offset - (i * 0.1),
-            f"{genre}: {pct:.1f}%",
-            fontsize=10,
-            color=color,
-            fontweight="bold",
-            fontproperties=poppins_font
-        )
+# 💻 CLI: flask import-history my_spotify_data.zip
+@bp.cli.command("import-history")
+@click.argument("zip_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--processes", type=int, default=None, help="Parser processes (default: one per CPU, 0 = inline)")
+@click.option("--user", "user_id", default=schema.LEGACY_USER_ID, help="Spotify user ID the plays belong to")
+def import_history_command(zip_path, processes, user_id):
+    """Imports a Spotify extended streaming history export."""
+    stats = import_streaming_history(zip_path, processes=processes,
+                                     progress=lambda done, total, message: click.echo(f"📄 {done}/{total} files, {message}"),
+                                     user_id=user_id, db_path=shard_router.path(user_id))
+    click.echo(json.dumps(stats, indent=2))
+
 
-    # 🎵 Set title and remove white background
-    ax.set_title("Top Genres Played", fontsize=14, fontweight='bold', color='white')
-    plt.tight_layout()
+@bp.cli.command("claim-plays")
+@click.argument("user_id")
+@click.option("--from-user", default=schema.LEGACY_USER_ID, help="Current owner (default: the pre-multi-user history)")
+def claim_plays_command(user_id, from_user):
+    """Moves plays from one user (by default the unowned history) to USER_ID in the main database."""
+    click.echo(f"✅ Moved {claim_plays(user_id, from_user)} plays to {user_id}")
 
-    # 📁 Save the pie chart (Transparent)
-    chart_path = "static/genre_pie_chart.png"
-    plt.savefig(chart_path, dpi=300, bbox_inches="tight", transparent=True)
-    plt.close()
 
-    return jsonify({"image_url": chart_path})
+@bp.cli.command("split-shards")
+def split_shards_command():
+    """Copies every user's plays from the main database into their SHARD_DIR database."""
+    if not shard_router.sharded:
+        raise click.ClickException("Set SHARD_DIR to the directory for the per-user databases first")
+    copied = split_into_shards(shard_router, progress=lambda done, total: click.echo(f"🗂️ {done}/{total} users"))
+    click.echo(json.dumps(copied, indent=2))
+
+
+# 🗂️ Rendered charts are cached by content; the key covers data version + style
+UPLOAD_BAR_STYLE = {"figsize": (10, 5), "color": "skyblue"}
+HISTORY_BAR_STYLE = {"figsize": (10, 5), "dpi": 300, "color": "purple", "facecolor": "#121212"}
+GENRE_PIE_STYLE = {"figsize": (7, 7), "dpi": 300, "font": poppins_path, "small_slice_pct": 5}
+
+
+def cached_chart(chart, params, data_version, style, render_fn, get_data):
+    """Returns the image URL for a chart, rendering it only if this exact version isn't cached.
+
+    `get_data` runs here (it may hit the database); `render_fn` gets only the
+    aggregated rows and runs in the render process pool.
+    """
+    key = ChartCache.key(chart, params, data_version, style)
+    if chart_cache.get(key) is None:
+        chart_cache.put(key, chart_renderer.render(render_fn, get_data(), style))
+    return jsonify({"image_url": url_for("main.serve_chart", key=key)})
+
+
+# 🖼️ Serve cached charts with ETag / Last-Modified so browsers can revalidate with a 304
+@bp.route('/charts/<key>.png')
+def serve_chart(key):
+    path = chart_cache.path(key)
+    if not re.fullmatch(r"[0-9a-f]{32}", key) or not os.path.exists(path):
+        return jsonify({"error": "Chart not found"}), 404
+    return send_file(path, mimetype="image/png", conditional=True, etag=key,
+                     last_modified=os.path.getmtime(path), max_age=31536000)
+
+
+@bp.route('/dataset-store-stats', methods=['GET'])
+def dataset_store_stats():
+    return jsonify(get_dataset_store().stats())
+
+
+@bp.route('/chart-cache-stats', methods=['GET'])
+def chart_cache_stats():
+    return jsonify({**chart_cache.stats(), "chart_data": chart_data_cache.stats()})
+
+
+# 📊 JSON chart data for the browser renderer; the PNG routes below stay as an export path
+def chart_data_response(chart, params, data_version, get_data):
+    """Serves `get_data()` as compact JSON with a weak ETag, gzipped when the client accepts it.
+
+    A matching If-None-Match gets a 304 before any data is read; otherwise the
+    encoded body comes from chart_data_cache, so `get_data` runs once per data version.
+    """
+    key = ChartCache.key(chart, params, data_version, "json")
+    if request.if_none_match.contains_weak(key):
+        response = current_app.response_class(status=304)
+        chart_data_cache.record(not_modified=True)
+    else:
+        body, gzipped = chart_data_cache.get(key) or chart_data_cache.put(key, get_data())
+        response = current_app.response_class(body, mimetype="application/json")
+        if gzipped is not None and request.accept_encodings["gzip"]:
+            response.set_data(gzipped)
+            response.headers["Content-Encoding"] = "gzip"
+        chart_data_cache.record(sent=response.content_length)
+    response.set_etag(key, weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"  # Always revalidate; a 304 is nearly free
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+@bp.route('/chart-data/top-artists', methods=['GET'])
+def chart_data_top_artists():
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    if request.args.get('source') == 'upload':
+        music_data, music_data_version = load_music_data()
+        if music_data is None or music_data.empty:
+            return jsonify({'error': '⚠️ No data uploaded'}), 404
+        return chart_data_response("upload_top_artists", {"limit": limit}, music_data_version,
+                                   lambda: bar_series(music_data['artist'].value_counts().head(limit).items()))
+
+    user_id, db_path = user_scope()
+    data_version = queries.data_version(user_id, db_path)
+    if data_version is None:
+        return jsonify({"error": "No listening history available."}), 404
+    return chart_data_response("history_top_artists", {"limit": limit, "user": user_id}, data_version,
+                               lambda: bar_series(queries.top_artists(limit, user_id, db_path)))
+
+
+@bp.route('/chart-data/genres', methods=['GET'])
+def chart_data_genres():
+    user_id, db_path = user_scope()
+    data_version = queries.data_version(user_id, db_path)
+    if data_version is None:
+        return jsonify({"error": "No genre data available."}), 404
+    small_slice_pct = request.args.get('small_slice_pct', GENRE_PIE_STYLE["small_slice_pct"], type=float)
+    return chart_data_response("genre_pie", {"small_slice_pct": small_slice_pct, "user": user_id}, data_version,
+                               lambda: genre_shares(queries.genre_distribution(user_id, db_path), small_slice_pct))
+
+
+@bp.route('/chart-data/plays', methods=['GET'])
+def chart_data_plays():
+    user_id, db_path = user_scope()
+    data_version = queries.data_version(user_id, db_path)
+    if data_version is None:
+        return jsonify({"error": "No listening history available."}), 404
+    params = {"bucket": request.args.get('bucket', 'month'), "start_day": request.args.get('start'),
+              "end_day": request.args.get('end'), "by": request.args.get('by'),
+              "limit": min(request.args.get('limit', 5, type=int), 20)}
+
+    def plays_over_time():
+        rollups.catch_up(db_path=db_path)  # Only on a cache miss; a new play changes data_version and so the key
+        return rollups.trends(**params, user_id=user_id, db_path=db_path)
+
+    try:
+        return chart_data_response("plays_over_time", {**params, "user": user_id}, data_version, plays_over_time)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+# 📈 Generate Static Chart
+@bp.route('/visualize', methods=['GET'])
+def visualize():
+    music_data, music_data_version = load_music_data()
+    if music_data is None or music_data.empty:
+        return jsonify({'error': '⚠️ No data available to generate a chart'})
+
+    def top_artists():
+        return [(artist, int(count)) for artist, count in music_data['artist'].value_counts().head(10).items()]
+
+    return cached_chart("upload_top_artists", {}, music_data_version, UPLOAD_BAR_STYLE,
+                        charts.render_upload_top_artists, top_artists)
+
+
+# 📊 Pie Chart for Genres with Improved Label Handling
+@bp.route('/visualize-genres')
+def visualize_genres():
+    user_id, db_path = user_scope()
+    data_version = queries.data_version(user_id, db_path)
+    if data_version is None:
+        return jsonify({"error": "No genre data available."})
+
+    # Count occurrences of each genre (GROUP BY runs in SQLite)
+    return cached_chart("genre_pie", {"user": user_id}, data_version, GENRE_PIE_STYLE,
+                        charts.render_genre_pie, lambda: queries.genre_distribution(user_id, db_path))
 
 
 # 🎵 Basic CSV-Based Recommendation System
-@app.route('/recommend', methods=['POST'])
+@bp.route('/recommend', methods=['POST'])
 def recommend():
-    global music_data
+    music_data, version = load_music_data()
     if music_data is None:
         return jsonify({'error': '⚠️ No data uploaded'})
 
-    query = request.json.get('query', '').strip().lower()
+    query = request.json.get('query', '').strip()
     if not query:
         return jsonify({'error': '⚠️ Please enter an artist or song name'})
 
     if 'artist' not in music_data.columns or 'track_name' not in music_data.columns:
         return jsonify({'error': '⚠️ CSV is missing required columns: artist or track_name'})
 
-    matched_songs = music_data[
-        music_data['artist'].str.lower().str.contains(query, na=False, regex=False) |
-        music_data['track_name'].str.lower().str.contains(query, na=False, regex=False)
-    ]
-
-    if matched_songs.empty:
+    # 🔎 Ranked index lookup (accent/case-insensitive, prefix + typo tolerant) instead of scanning every row
+    matches = get_search_index(music_data, version).search(query, limit=5)
+    if not matches:
         return jsonify({'message': '⚠️ No matches found. Try another artist or song.'})
 
-    recommendations = matched_songs[['track_name', 'artist']].sample(min(len(matched_songs), 5)).to_dict(orient='records')
-    return jsonify(recommendations)
+    # 🧭 Songs most similar to the best matches (cosine over local track vectors)
+    similar = get_dataset_recommender(music_data, version).similar(
+        [row for row, _ in matches[:3]], k=5, weights=[score for _, score in matches[:3]])
+    return jsonify(search_results(music_data, similar or matches))
+
+
+# ⌨️ Typeahead suggestions for the search box
+@bp.route('/typeahead', methods=['GET'])
+def typeahead():
+    music_data, version = load_music_data()
+    if music_data is None or not {'artist', 'track_name'} <= set(music_data.columns):
+        return jsonify([])
+
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    matches = get_search_index(music_data, version).search(request.args.get('q', ''), limit=limit)
+    return jsonify(search_results(music_data, matches))
+
+
+@bp.route('/search-index-stats', methods=['GET'])
+def search_index_stats():
+    return jsonify(get_search_indexes().stats())
+
+
+@bp.route('/shard-stats', methods=['GET'])
+def shard_stats():
+    return jsonify(shard_router.stats())
 
-#This creates a table to store track name, artist, and timestamp
+#This creates the artists / tracks / plays tables (and migrates older databases)
 def init_db():
-    conn = sqlite3.connect("spotify_data.db")
-    cursor = conn.cursor()
-
-    # Ensure the table has a `genre` column
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS listening_history (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        track_name TEXT,
-        artist TEXT,
-        played_at TEXT UNIQUE,
-        genre TEXT
-    )
-    """)
-    conn.commit()
-    conn.close()
+    schema.migrate()
 
 
-# Run when the app starts
-init_db()
 
 def save_to_db(tracks):
-    """Saves track data to the SQLite database, ensuring genres are set."""
-    conn = sqlite3.connect("spotify_data.db")
-    cursor = conn.cursor()
-
-    sp = spotipy.Spotify(auth=get_token())  # Ensure API is initialized
-
-    for track in tracks:
-        artist_id = track.get("artist_id")  # Get artist ID
-        artist_name = track["artist"]
-
-        # Fetch genre if possible
-        if artist_id:
-            try:
-                artist_info = sp.artist(artist_id)
-                genre_list = artist_info.get("genres", [])
-                genre = genre_list[0] if genre_list else "Unknown"
-            except Exception as e:
-                print(f"⚠️ WARNING: Could not fetch genre for {artist_name}: {e}")
-                genre = "Unknown"
-        else:
-            genre = "Unknown"
-
-        # 🔥 If still unknown, use GPT-4o-mini
-        if genre == "Unknown":
-            genre = get_genre(artist_name)
+    """Saves track data to the user's plays, ensuring genres are set. Returns (new_rows, stage_stats)."""
+    sp = get_spotify().for_token(get_token())
+    user_id, db_path = user_scope()
 
-        try:
-            cursor.execute(
-                """INSERT INTO listening_history (track_name, artist, played_at, genre) 
-                   VALUES (?, ?, ?, ?)""",
-                (track["track_name"], artist_name, track["played_at"], genre)
-            )
-        except sqlite3.IntegrityError:
-            pass  # Avoid duplicate entries
-
-    conn.commit()
-    conn.close()
+    # 🔥 One batched lookup per distinct, not-yet-known artist (see history_sync.save_plays)
+    pipeline = GenreEnrichmentPipeline(sp, get_genre, db_path=db_path, cache=genre_cache, classifier=genre_classifier)
+    return save_plays(tracks, pipeline, user_id, db_path)
 
 
 
 # ✅ Spotify Helper Function to Handle Token Refresh
 def get_token():
     """Retrieve the access token from session and refresh it if expired"""
-    print(f"🔍 DEBUG: Token Info BEFORE: {session.get('token_info')}")
-
     token_info = session.get("token_info")
     if not token_info:
-        print("❌ ERROR: No token info found in session.")
+        log.warning("❌ No token info found in session.")
         return None
 
     # 🔄 Automatically refresh the token if it's expired
     if token_info["expires_at"] - time.time() < 60:  # Refresh if it's about to expire (less than 60 sec left)
-        print("🔄 DEBUG: Token expired, refreshing...")
+        log.debug("🔄 Token expired, refreshing...")
         try:
-            token_info = sp_oauth.refresh_access_token(token_info["refresh_token"])
+            with EXTERNAL_LATENCY.time(service="spotify", operation="oauth_refresh"):
+                token_info = get_sp_oauth().refresh_access_token(token_info["refresh_token"])
             session["token_info"] = token_info
             session.modified = True  # ✅ Persist session changes
-            print(f"✅ DEBUG: Token refreshed successfully: {token_info['access_token']}")
+            log.debug("✅ Token refreshed successfully")
         except Exception as e:
-            print(f"❌ ERROR: Failed to refresh token: {str(e)}")
+            log.error("❌ Failed to refresh token: %s", e)
             return None
 
     return token_info["access_token"]
@@ -493,46 +947,44 @@ def get_token():
 
 
 
+def get_spotify_user_id(sp):
+    """Returns the logged-in user's Spotify ID, cached in the session."""
+    user_id = session.get("spotify_user_id")
+    if not user_id:
+        user_id = sp.current_user()["id"]
+        session["spotify_user_id"] = user_id
+        session.modified = True
+    return user_id
+
+
 #Store data in database (CSV)
 def save_to_csv(tracks):
+    import pandas as pd
+
     df = pd.DataFrame(tracks)
     df.to_csv("spotify_listening_history.csv", mode="a", index=False, header=False)
 
 
 #listening history save to sql database
-@app.route('/spotify-listening-history')
+@bp.route('/spotify-listening-history')
 def spotify_listening_history():
     token_info = get_token()
     if not token_info:
         return jsonify({"error": "User not authenticated. Please log in."})
 
-    sp = spotipy.Spotify(auth=token_info)
+    sp = get_spotify().for_token(token_info)
 
     try:
-        results = sp.current_user_recently_played(limit=10)
+        # 🔄 Only fetch plays newer than this user's high-water mark
+        track_data, stats = sync_recently_played(sp, get_spotify_user_id(sp), save_to_db)
 
-        if "items" not in results or not results["items"]:
-            return jsonify({"error": "No listening history found."})
+        if not track_data:
+            return jsonify({"message": "✅ Listening history already up to date.", "tracks": [], "sync": stats})
 
-        track_data = []
-        for item in results["items"]:
-            track = item["track"]
-            artist_id = track["artists"][0]["id"]  # Get artist ID
-            artist_name = track["artists"][0]["name"]
-
-            track_data.append({
-                "track_name": track["name"],
-                "artist": artist_name,  
-                "played_at": item["played_at"],
-                "artist_id": artist_id  # Store artist ID
-            })
-
-        save_to_db(track_data)  # Store in SQLite
-
-        return jsonify({"message": "✅ Data saved to database!", "tracks": track_data})
+        return jsonify({"message": "✅ Data saved to database!", "tracks": track_data, "sync": stats})
 
     except Exception as e:
-        print(f"❌ ERROR: Failed to fetch listening history - {e}")
+        log.error("❌ Failed to fetch listening history - %s", e)
         return jsonify({"error": "Failed to fetch listening history", "details": str(e)})
 
 
@@ -540,56 +992,57 @@ def spotify_listening_history():
 
 
 #bar chart for top artists
-@app.route('/visualize-history')
+@bp.route('/visualize-history')
 def visualize_history():
-    conn = sqlite3.connect("spotify_data.db")
-    df = pd.read_sql_query("SELECT * FROM listening_history", conn)
-    conn.close()
-
-    if df.empty:
+    user_id, db_path = user_scope()
+    data_version = queries.data_version(user_id, db_path)
+    if data_version is None:
         return jsonify({"error": "No listening history available."})
 
-    # 🎨 Plot settings
-    fig, ax = plt.subplots(figsize=(10, 5))
-    fig.patch.set_alpha(0)  # Ensure background transparency
-    ax.set_facecolor("#121212")  # Match page background (dark gray)
+    # 🎵 Top 10 Artists, aggregated in SQLite
+    return cached_chart("history_top_artists", {"limit": 10, "user": user_id}, data_version, HISTORY_BAR_STYLE,
+                        charts.render_history_top_artists, lambda: queries.top_artists(10, user_id, db_path))
 
-    # 🎵 Top 10 Artists Bar Chart
-    top_artists = df['artist'].value_counts().head(10)
-    top_artists.plot(kind='bar', color='purple', ax=ax)
 
-    # 🎨 Formatting
-    ax.set_xlabel("Artist", fontsize=12, color="white")
-    ax.set_ylabel("Times Played", fontsize=12, color="white")
-    ax.set_title("Top 10 Most Played Artists", fontsize=14, fontweight="bold", color="white")
-    ax.tick_params(axis='x', colors="white", rotation=45)
-    ax.tick_params(axis='y', colors="white")
+# 📈 Time-series analytics, read from the rollup tables only (never from raw plays)
+def analytics_response(fn, **kwargs):
+    user_id, db_path = user_scope()
+    rollups.catch_up(db_path=db_path)  # Usually a no-op: only plays newer than the last compaction are read
+    try:
+        return jsonify(fn(**kwargs, user_id=user_id, db_path=db_path))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # 📁 Save the Chart (Transparent)
-    chart_path = "static/top_artists_chart.png"
-    plt.savefig(chart_path, dpi=300, bbox_inches="tight", transparent=True)
-    plt.close()
 
-    return jsonify({"image_url": chart_path})
+@bp.route('/listening-heatmap')
+def listening_heatmap():
+    return analytics_response(rollups.heatmap, tz_offset_minutes=request.args.get('tz_offset', 0, type=int),
+                              start_day=request.args.get('start'), end_day=request.args.get('end'),
+                              artist=request.args.get('artist'), genre=request.args.get('genre'))
 
 
+@bp.route('/listening-trends')
+def listening_trends():
+    return analytics_response(rollups.trends, bucket=request.args.get('bucket', 'month'),
+                              start_day=request.args.get('start'), end_day=request.args.get('end'),
+                              by=request.args.get('by'), limit=min(request.args.get('limit', 5, type=int), 20))
 
 
+@bp.route('/listening-streaks')
+def listening_streaks():
+    return analytics_response(rollups.streaks)
 
-@app.route('/spotify-top-artists')
-def spotify_top_artists():
-    print(f"🔍 DEBUG: Token Info in Session BEFORE GETTING: {session.get('token_info')}")  
 
+@bp.route('/spotify-top-artists')
+def spotify_top_artists():
     access_token = get_token()
     if not access_token:
         return jsonify({"error": "User not authenticated. Please log in."})
 
     try:
-        sp = spotipy.Spotify(auth=access_token)
-        results = sp.current_user_top_artists(limit=10, time_range="long_term") 
-
-
-        print(f"✅ DEBUG: Raw Spotify Response: {results}")  # 🔥 Print full response for debugging
+        sp = get_spotify().for_token(access_token)
+        # 🗃️ long_term top artists are cached for hours (see response_cache.py)
+        results = sp.current_user_top_artists(limit=10, time_range="long_term")
 
         if "items" not in results or not results["items"]:
             return jsonify({"error": "No top artists found in your Spotify account."})
@@ -598,7 +1051,7 @@ def spotify_top_artists():
         return jsonify(top_artists)
 
     except Exception as e:
-        print(f"❌ ERROR: Failed to fetch top artists - {e}")
+        log.error("❌ Failed to fetch top artists - %s", e)
         return jsonify({"error": "Failed to fetch top artists", "details": str(e)})
 
 
@@ -606,64 +1059,64 @@ def spotify_top_artists():
 
 
 # 🔥 Spotify Login
-@app.route('/spotify-login')
+@bp.route('/spotify-login')
 def spotify_login():
-    return redirect(sp_oauth.get_authorize_url())
+    return redirect(get_sp_oauth().get_authorize_url())
 
 
 # 🔄 Spotify OAuth Callback
-@app.route('/callback')
+@bp.route('/callback')
 def spotify_callback():
     code = request.args.get('code')
 
     if not code:
-        print("❌ DEBUG: No authorization code received")
+        log.warning("❌ No authorization code received")
         return "No authorization code received", 400
 
-    print(f"✅ DEBUG: Received auth code: {code}")
-
     try:
         # 🔥 Retrieve the token
-        token_info = sp_oauth.get_access_token(code, as_dict=True)
+        with EXTERNAL_LATENCY.time(service="spotify", operation="oauth_token"):
+            # check_cache=False: spotipy's token file is shared, so it would hand every login the first user's token
+            token_info = get_sp_oauth().get_access_token(code, as_dict=True, check_cache=False)
         if not token_info:
-            print("❌ DEBUG: Failed to retrieve access token")
+            log.warning("❌ Failed to retrieve access token")
             return "Failed to retrieve access token", 400
 
         # 🔥 Store token in session correctly
         session["token_info"] = token_info
         session.modified = True  # ✅ Force Flask to save session
-        print(f"✅ DEBUG: Stored token in session: {session.get('token_info')}")
+        log.debug("✅ Stored token in session")
 
     except Exception as e:
-        print(f"❌ DEBUG: Error getting token: {str(e)}")
+        log.error("❌ Error getting token: %s", e)
         return "Error getting token", 500
 
     # After storing token, fetch and save user's listening history immediately
     try:
         response = spotify_listening_history()
-        print(f"✅ DEBUG: Auto-fetched listening history: {response}")
+        log.debug("✅ Auto-fetched listening history (%s)", response.status)
     except Exception as e:
-        print(f"❌ ERROR: Failed to auto-fetch listening history - {e}")
+        log.error("❌ Failed to auto-fetch listening history - %s", e)
 
     # ✅ After fetching history, update missing genres
     try:
         update_missing_genres()
-        print("✅ DEBUG: Successfully updated missing genres!")
+        log.debug("✅ Successfully updated missing genres!")
     except Exception as e:
-        print(f"⚠️ WARNING: Could not update genres - {e}")
+        log.warning("⚠️ Could not update genres - %s", e)
 
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 
 
 # Get Song Recommendations Using Spotify
-@app.route('/spotify-recommendations')
+@bp.route('/spotify-recommendations')
 def spotify_recommendations():
     token_info = get_token()
     if not token_info:
-        return redirect(url_for('spotify_login'))
+        return redirect(url_for('main.spotify_login'))
 
-    sp = spotipy.Spotify(auth=token_info)
+    sp = get_spotify().for_token(token_info)
     top_artists = sp.current_user_top_artists(limit=5)  
 
     if not top_artists["items"]:
@@ -671,43 +1124,135 @@ def spotify_recommendations():
 
     seed_artists = [artist["id"] for artist in top_artists["items"][:3]]  # Use up to 3 artists
 
-    recommendations = sp.recommendations(seed_artists=seed_artists, limit=10)  
+    import spotipy
+
+    try:
+        recommendations = sp.recommendations(seed_artists=seed_artists, limit=10)
+    except spotipy.SpotifyException as e:
+        # Spotify no longer serves /recommendations to every app: fall back to the local engine
+        log.warning("⚠️ Spotify recommendations unavailable (%s), using local recommender", e.http_status)
+        return jsonify(history_recommendations(k=10))
 
     song_list = [{"name": track["name"], "artist": track["artists"][0]["name"]} for track in recommendations["tracks"]]
     return jsonify(song_list)
 
 
-@app.route('/download-history', methods=['GET'])
-def download_history():
-    conn = sqlite3.connect("spotify_data.db")
-    df = pd.read_sql_query("SELECT * FROM listening_history", conn)
-    conn.close()
+# 🧭 Offline recommendations from the listening history (no Spotify calls)
+@bp.route('/local-recommendations', methods=['GET'])
+def local_recommendations():
+    k = min(request.args.get('k', 10, type=int), 100)
+    songs = history_recommendations(request.args.get('track'), request.args.get('artist'), k=k)
+    if not songs:
+        return jsonify({"error": "No listening history to recommend from yet."})
+    return jsonify(songs)
+
+
+@bp.route('/recommender-stats', methods=['GET'])
+def recommender_stats():
+    return jsonify(get_recommenders().stats())
+
 
-    if df.empty:
+# ⬇️ Exports stream straight from the rows: ?format=csv|ndjson|parquet&gzip=1&columns=a,b(&start=&end= for history)
+def export_response(name, columns, batches, types):
+    """Chunked download of `batches`; format and gzip come from the query string."""
+    fmt = request.args.get('format', 'csv')
+    exports.check_format(fmt)
+    chunks, mimetype, extension = exports.stream(fmt, columns, batches, request.args.get('gzip') == '1', types)
+    response = current_app.response_class(chunks, mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{name}.{extension}"'
+    return response
+
+
+@bp.route('/download-history', methods=['GET'])
+def download_history():
+    user_id, db_path = user_scope()
+    if queries.data_version(user_id, db_path) is None:
         return jsonify({"error": "No listening history available."})
 
-    csv_path = os.path.join("uploads", "spotify_history.csv")
-    df.to_csv(csv_path, index=False)
-    return send_file(csv_path, as_attachment=True)
+    try:
+        columns = exports.parse_columns(request.args.get('columns'), exports.HISTORY_COLUMNS)
+        batches = exports.history_batches(user_id, columns, request.args.get('start'), request.args.get('end'), db_path)
+        return export_response("spotify_history", columns, batches,
+                               {column: exports.HISTORY_COLUMNS[column][1] for column in columns})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 
 
-# 📂 Download Processed CSV
-@app.route('/download', methods=['GET'])
+# 📂 Download the uploaded dataset
+@bp.route('/download', methods=['GET'])
 def download_csv():
-    global music_data
+    music_data, _ = load_music_data()
     if music_data is None:
         return jsonify({'error': '⚠️ No data uploaded'})
 
-    csv_path = os.path.join(app.config['UPLOAD_FOLDER'], "exported_data.csv")
-    music_data.to_csv(csv_path, index=False)
-    return send_file(csv_path, as_attachment=True)
+    try:
+        columns = exports.parse_columns(request.args.get('columns'), music_data.columns)
+        return export_response("exported_data", columns, exports.frame_batches(music_data, columns),
+                               exports.frame_types(music_data, columns))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 
-@app.route('/static/<path:filename>')
+@bp.route('/static/<path:filename>')
 def serve_static(filename):
     return send_file(os.path.join('static', filename))
 
 
 
+def warm_up():
+    """Imports the heavy dependencies and builds the lazy services before a request needs them."""
+    start = time.perf_counter()
+    import pandas, numpy, openai  # noqa: F401
+    for service in (get_dataset_store, get_search_indexes, get_recommenders, get_spotify, get_sp_oauth):
+        service()
+    if not chart_renderer.processes:
+        from matplotlib.figure import Figure  # noqa: F401 (charts render in this process)
+    log.info("🔥 Warm-up finished in %.2fs", time.perf_counter() - start)
+
+
+# 🏭 Application factory: `flask run` finds it on its own (Dockerfile: FLASK_APP=app.py)
+def create_app(config=None, warm=None):
+    """Builds the Flask app, prepares the database and starts the job runners.
+
+    `warm` (default: WARM_UP=1) runs warm_up() on a background thread, so the
+    first requests are served at once while the heavy imports load behind them.
+    """
+    app = Flask(__name__)
+    CORS(app)
+
+    app.secret_key = os.urandom(24)  # Required for session
+    app.config["SESSION_PERMANENT"] = True  
+    app.config["SESSION_TYPE"] = "filesystem"  # 🔥 Store session data properly
+    app.config["SESSION_FILE_DIR"] = "/tmp/flask_session/"  # 🔥 Store it somewhere real
+    app.config["SESSION_USE_SIGNER"] = True
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    app.config["PROFILE_HEADER"] = os.getenv("PROFILE_HEADER") == "1"  # 🔬 Honour `X-Profile: 1` request headers
+    app.config["PROFILE_SAMPLE_RATE"] = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # e.g. 0.01 = 1% of requests
+    app.config.update(config or {})
+    logs.setup()
+    Session(app)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    app.register_blueprint(bp)
+
+    # Run when the app starts
+    init_db()
+    init_sync_state()
+    genre_cache.ensure_table()
+
+    # 🔄 Start the job runner; scheduled maintenance runs in the background so startup stays fast
+    job_runner.start()
+    ingest_runner.start()
+    if os.getenv("DISABLE_BACKGROUND_JOBS") != "1":
+        job_runner.schedule("reset_invalid_genres", interval=MAINTENANCE_INTERVAL, delay=5)
+        job_runner.schedule("compact_rollups", interval=ROLLUP_INTERVAL, delay=1)
+
+    if warm is None:
+        warm = os.getenv("WARM_UP") == "1"
+    if warm:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    return app
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
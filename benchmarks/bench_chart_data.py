@@ -0,0 +1,106 @@
+"""Server CPU and bytes per chart view: PNG routes (/visualize-*) vs JSON chart data (/chart-data/*).
+
+Runs the real Flask app through its test client against a generated history
+database, rendering in-process so the request thread's CPU time includes the
+matplotlib work. For each chart it measures:
+  cold       - first view after the data changed (PNG render / JSON aggregation)
+  warm       - another client, same data (cached PNG / cached JSON body)
+  revalidate - same client again with its ETag (JSON only; the 304 has no body)
+PNG bytes are the route's JSON plus the image it points to.
+
+Usage: python benchmarks/bench_chart_data.py [--plays 200000] [--views 5]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_chart_queries import make_db  # noqa: E402
+
+CHARTS = {
+    "top_artists": ("/visualize-history", "/chart-data/top-artists?limit=10"),
+    "genres": ("/visualize-genres", "/chart-data/genres"),
+}
+
+
+def measure(fn, views, reset=None):
+    """Median request-thread CPU ms and bytes over `views` calls of fn() -> bytes sent."""
+    cpu, sent = [], []
+    for _ in range(views):
+        if reset:
+            reset()
+        start = time.thread_time()
+        sent.append(fn())
+        cpu.append(time.thread_time() - start)
+    return {"cpu_ms": round(statistics.median(cpu) * 1000, 2), "bytes": int(statistics.median(sent))}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plays", type=int, default=200_000)
+    parser.add_argument("--views", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.chdir(ROOT)  # Chart styles use repo-relative font paths
+    os.environ.update({"SPOTIFY_DB_PATH": os.path.join(tmp, "bench.db"), "DISABLE_BACKGROUND_JOBS": "1",
+                       "CHART_RENDER_PROCESSES": "0", "SPOTIFY_CLIENT_ID": "bench",
+                       "SPOTIFY_CLIENT_SECRET": "bench", "SPOTIFY_REDIRECT_URI": "http://localhost/callback"})
+    make_db(os.environ["SPOTIFY_DB_PATH"], args.plays)
+
+    import app  # noqa: E402
+    from chart_cache import ChartCache  # noqa: E402
+
+    app.chart_cache = ChartCache(os.path.join(tmp, "charts"))
+    client = app.create_app().test_client()
+
+    def reset_png():
+        shutil.rmtree(app.chart_cache.directory, ignore_errors=True)  # Only created by the first put()
+        app.chart_cache = ChartCache(app.chart_cache.directory)
+
+    results = {"plays": args.plays, "views": args.views}
+    for name, (png_route, json_route) in CHARTS.items():
+        def png_view():
+            response = client.get(png_route)
+            image = client.get(response.json["image_url"])
+            return len(response.data) + len(image.data)
+
+        def json_view():
+            return len(client.get(json_route, headers={"Accept-Encoding": "gzip"}).data)
+
+        etag = client.get(json_route).headers["ETag"]
+
+        def json_revalidate():
+            response = client.get(json_route, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+            assert response.status_code == 304
+            return len(response.data)
+
+        plain = client.get(json_route).data
+        results[name] = {
+            "png_cold": measure(png_view, args.views, reset=reset_png),
+            "png_warm": measure(png_view, args.views),
+            "json_cold": measure(json_view, args.views, reset=app.chart_data_cache.entries.clear),
+            "json_warm": measure(json_view, args.views),
+            "json_revalidate": measure(json_revalidate, args.views),
+            "json_uncompressed_bytes": len(plain),
+        }
+        row = results[name]
+        row["cold_cpu_ratio"] = round(row["png_cold"]["cpu_ms"] / max(row["json_cold"]["cpu_ms"], 0.01), 1)
+        row["warm_bytes_ratio"] = round(row["png_warm"]["bytes"] / max(row["json_warm"]["bytes"], 1), 1)
+        print(f"✅ {name} done", file=sys.stderr)
+
+    app.db.get_pool(os.environ["SPOTIFY_DB_PATH"]).close_all()
+    shutil.rmtree(tmp)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
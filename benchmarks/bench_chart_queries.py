@@ -0,0 +1,115 @@
+"""Peak RSS and latency of the chart aggregations: pandas over every row vs queries.py.
+
+Each measurement runs in a fresh process so ru_maxrss reflects only that approach.
+
+Usage: python benchmarks/bench_chart_queries.py [--sizes 100000 1000000]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+import schema  # noqa: E402
+
+
+def make_db(path, n_plays, n_artists=5000, seed=42):
+    """Normalized database with a long-tailed artist distribution."""
+    schema.migrate(path)
+    db.get_pool(path).close_all()
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO artists (id, name, genre) VALUES (?, ?, ?)",
+                     ((i, f"Artist {i}", f"genre-{i % 40}") for i in range(n_artists)))
+    conn.executemany("INSERT INTO tracks (id, artist_id, name) VALUES (?, ?, ?)",
+                     ((i, i % n_artists, f"Track {i}") for i in range(n_artists * 10)))
+
+    def plays():
+        for i in range(n_plays):
+            artist = min(int(rng.paretovariate(1.2)), n_artists) - 1
+            yield (artist + n_artists * rng.randrange(10), artist, 1_600_000_000_000 + i * 1000)
+
+    conn.executemany("INSERT INTO plays (track_id, artist_id, played_at) VALUES (?, ?, ?)", plays())
+    conn.commit()
+    conn.close()
+
+
+def pandas_top_artists(path):
+    import pandas as pd
+    with db.connection(path) as conn:
+        df = pd.read_sql_query("SELECT * FROM listening_history", conn)
+    return df["artist"].value_counts().head(10)
+
+
+def pandas_genres(path):
+    import pandas as pd
+    with db.connection(path) as conn:
+        df = pd.read_sql_query("SELECT genre FROM listening_history", conn)
+    return df["genre"].value_counts()
+
+
+def sql_top_artists(path):
+    import queries
+    return queries.top_artists(10, db_path=path)
+
+
+def sql_genres(path):
+    import queries
+    return queries.genre_distribution(db_path=path)
+
+
+def sql_daily(path):
+    import queries
+    return queries.plays_per_bucket("day", db_path=path)
+
+
+APPROACHES = {
+    "pandas_top_artists": pandas_top_artists,
+    "pandas_genres": pandas_genres,
+    "sql_top_artists": sql_top_artists,
+    "sql_genres": sql_genres,
+    "sql_plays_per_day": sql_daily,
+}
+
+
+def measure(name, path):
+    import pandas  # noqa: F401  Import up front so every approach pays the same baseline RSS
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    APPROACHES[name](path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"latency_ms": round(elapsed * 1000, 1), "peak_rss_mb": round(peak / 1024, 1),
+            "rss_growth_mb": round((peak - baseline) / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = os.path.join(tmp, f"plays_{size}.db")
+            make_db(path, size)
+            results[size] = {}
+            for name in APPROACHES:
+                with ctx.Pool(1) as pool:
+                    results[size][name] = pool.apply(measure, (name, path))
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Plain pd.read_csv vs chunked ingest_csv on a synthetic listening-history CSV.
+
+Also times reopening the ingested dataset from DatasetStore's memory-mapped
+column files, which is what every later request does. Each measurement runs
+in a fresh process so ru_maxrss reflects only that step.
+
+Usage: python benchmarks/bench_csv_ingest.py [--rows 5000000] [--chunk-rows 250000]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_csv(path, n_rows, n_artists=20000, seed=42):
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write("track_name,artist,album,duration_ms,popularity,played_at\n")
+        lines = []
+        for i in range(n_rows):
+            artist = min(int(rng.paretovariate(1.1)), n_artists)
+            track = rng.randrange(25)
+            lines.append(f"Track {artist}-{track},Artist {artist},Album {artist}-{track % 3},"
+                         f"{120000 + (artist * 7919 + track) % 240000},{(artist + track) % 101},"
+                         f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(1_600_000_000 + i * 30))}Z\n")
+            if len(lines) == 100_000:
+                f.writelines(lines)
+                lines = []
+        f.writelines(lines)
+
+
+def read_plain(csv_path, store_dir, chunk_rows):
+    import pandas as pd
+    df = pd.read_csv(csv_path)
+    return len(df), int(df.memory_usage(deep=True).sum())
+
+
+def read_chunked(csv_path, store_dir, chunk_rows):
+    from csv_ingest import ingest_csv
+    from dataset_store import DatasetStore
+    df = ingest_csv(csv_path, chunk_rows=chunk_rows)
+    DatasetStore(store_dir).save("bench", df, "v1")
+    return len(df), int(df.memory_usage(deep=True).sum())
+
+
+def reopen(csv_path, store_dir, chunk_rows):
+    from dataset_store import DatasetStore
+    df, _ = DatasetStore(store_dir).load("bench")
+    return len(df), int(df.memory_usage(deep=True).sum())
+
+
+STEPS = {"pandas_read_csv": read_plain, "ingest_csv_and_save": read_chunked, "reopen_from_store": reopen}
+
+
+def measure(name, csv_path, store_dir, chunk_rows):
+    import numpy  # noqa: F401  Import up front so every step pays the same baseline RSS
+    import pandas  # noqa: F401
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    rows, frame_bytes = STEPS[name](csv_path, store_dir, chunk_rows)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"rows": rows, "elapsed_sec": round(elapsed, 3), "rows_per_sec": round(rows / elapsed),
+            "frame_mb": round(frame_bytes / 2 ** 20, 1), "rss_growth_mb": round((peak - baseline) / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--chunk-rows", type=int, default=250_000)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "history.csv")
+        make_csv(csv_path, args.rows)
+        results = {"rows": args.rows, "csv_mb": round(os.path.getsize(csv_path) / 2 ** 20, 1)}
+        for name in STEPS:
+            with ctx.Pool(1) as pool:
+                results[name] = pool.apply(measure, (name, csv_path, os.path.join(tmp, "store"), args.chunk_rows))
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
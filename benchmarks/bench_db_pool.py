@@ -0,0 +1,120 @@
+"""Connect/query overhead of per-call sqlite3.connect vs the pooled WAL connections in db.py.
+
+Usage: python benchmarks/bench_db_pool.py [--rows 50000] [--queries 2000] [--threads 8]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+QUERY = "SELECT genre, COUNT(*) FROM listening_history WHERE artist = ? GROUP BY genre"
+
+
+def make_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+    CREATE TABLE listening_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        track_name TEXT,
+        artist TEXT,
+        played_at TEXT UNIQUE,
+        genre TEXT,
+        artist_id TEXT
+    )
+    """)
+    conn.executemany(
+        "INSERT INTO listening_history (track_name, artist, played_at, genre) VALUES (?, ?, ?, ?)",
+        ((f"Track {i}", f"Artist {i % 500}", f"ts-{i}", f"genre-{i % 20}") for i in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+def unpooled_query(path, i):
+    conn = sqlite3.connect(path)
+    conn.execute(QUERY, (f"Artist {i % 500}",)).fetchall()
+    conn.close()
+
+
+def unpooled_write(path, i):
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE listening_history SET genre = ? WHERE artist = ?", (f"genre-{i % 20}", f"Artist {i % 500}"))
+    conn.commit()
+    conn.close()
+
+
+def pooled_query(path, i):
+    with db.connection(path) as conn:
+        conn.execute(QUERY, (f"Artist {i % 500}",)).fetchall()
+
+
+def pooled_write(path, i):
+    with db.transaction(path) as conn:
+        conn.execute("UPDATE listening_history SET genre = ? WHERE artist = ?", (f"genre-{i % 20}", f"Artist {i % 500}"))
+
+
+def sequential(query, path, n):
+    start = time.perf_counter()
+    for i in range(n):
+        query(path, i)
+    elapsed = time.perf_counter() - start
+    return {"total_sec": round(elapsed, 3), "us_per_query": round(elapsed / n * 1e6, 1)}
+
+
+def concurrent(query, write, path, n, threads):
+    """Each thread mixes 9 reads to 1 write; counts 'database is locked' failures."""
+    errors = []
+
+    def worker(offset):
+        for i in range(offset, n, threads):
+            try:
+                (write if i % 10 == 0 else query)(path, i)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return {"total_sec": round(time.perf_counter() - start, 3), "locked_errors": len(errors)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        before = os.path.join(tmp, "before.db")
+        after = os.path.join(tmp, "after.db")
+        make_db(before, args.rows)
+        make_db(after, args.rows)
+
+        results["sequential"] = {
+            "connect_per_call": sequential(unpooled_query, before, args.queries),
+            "pooled": sequential(pooled_query, after, args.queries),
+        }
+        results["concurrent"] = {
+            "connect_per_call": concurrent(unpooled_query, unpooled_write, before, args.queries, args.threads),
+            "pooled": concurrent(pooled_query, pooled_write, after, args.queries, args.threads),
+        }
+        db.get_pool(after).close_all()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
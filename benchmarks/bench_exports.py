@@ -0,0 +1,110 @@
+"""Peak RSS and time to first byte of /download-history: the old pandas export vs streamed exports.
+
+Each case runs in a fresh interpreter against the same generated database
+(bench_chart_queries.make_db), after importing the app and pandas, so
+baseline_rss_mb is the same for every case and peak_rss_mb - baseline_rss_mb
+is what the export itself cost. Measured per case:
+  ttfb_sec       - until the first byte (for streamed CSV that's the header)
+  first_rows_sec - until the first chunk that carries rows
+  total_sec      - until the last byte
+RSS includes the database pages SQLite memory-maps (mmap_size in db.py);
+end_rss_anon_mb vs end_rss_file_mb tells heap from those mapped pages.
+The legacy case is the previous route body: read_sql of the whole view,
+to_csv into uploads/, then the file read back the way send_file does.
+
+Usage: python benchmarks/bench_exports.py [--plays 1000000]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_chart_queries import make_db  # noqa: E402
+
+CASE = """
+import json, os, resource, sys, time
+import pandas
+import app, db
+
+flask_app = app.create_app()
+client = flask_app.test_client()
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+case = sys.argv[1]
+
+
+def legacy_chunks():
+    df = db.read_sql("SELECT * FROM listening_history")
+    csv_path = os.path.join(os.environ["BENCH_TMP"], "spotify_history.csv")
+    df.to_csv(csv_path, index=False)
+    with open(csv_path, "rb") as f:
+        yield from iter(lambda: f.read(64 * 1024), b"")
+
+
+start = time.perf_counter()
+if case == "legacy_csv":
+    chunks = legacy_chunks()
+else:
+    query = {"csv": "", "csv_gzip": "?gzip=1", "ndjson": "?format=ndjson", "parquet": "?format=parquet"}[case]
+    response = client.get("/download-history" + query, buffered=False)
+    assert response.status_code == 200, response.status_code
+    chunks = response.response
+
+header_chunks = 1 if case in ("csv", "csv_gzip") else 0  # Streamed CSV sends its header on its own
+ttfb = first_rows = None
+sent = seen = 0
+for chunk in chunks:
+    if chunk:
+        now = time.perf_counter()
+        ttfb = ttfb or now - start
+        if first_rows is None and seen >= header_chunks:
+            first_rows = now - start
+        seen += 1
+        sent += len(chunk)
+total = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+with open("/proc/self/status") as f:  # Linux: split the end RSS into heap vs mapped database pages
+    status = dict(line.split(":", 1) for line in f if ":" in line)
+print(json.dumps({"ttfb_sec": round(ttfb, 4), "first_rows_sec": round(first_rows, 4), "total_sec": round(total, 3),
+                  "bytes": sent, "baseline_rss_mb": round(baseline / 1024, 1), "peak_rss_mb": round(peak / 1024, 1),
+                  "export_rss_mb": round((peak - baseline) / 1024, 1),
+                  "end_rss_anon_mb": round(int(status["RssAnon"].split()[0]) / 1024, 1),
+                  "end_rss_file_mb": round(int(status["RssFile"].split()[0]) / 1024, 1)}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plays", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    cases = ["legacy_csv", "csv", "csv_gzip", "ndjson"]
+    if importlib.util.find_spec("pyarrow") is not None:
+        cases.append("parquet")
+
+    tmp = tempfile.mkdtemp()
+    try:
+        env = dict(os.environ, SPOTIFY_DB_PATH=os.path.join(tmp, "bench.db"), DISABLE_BACKGROUND_JOBS="1",
+                   BENCH_TMP=tmp, SPOTIFY_CLIENT_ID="bench", SPOTIFY_CLIENT_SECRET="bench",
+                   SPOTIFY_REDIRECT_URI="http://localhost/callback")
+        make_db(env["SPOTIFY_DB_PATH"], args.plays)
+        results = {"plays": args.plays}
+        for case in cases:
+            output = subprocess.run([sys.executable, "-c", CASE, case], cwd=ROOT, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            results[case] = json.loads(output.strip().splitlines()[-1])
+            print(f"✅ {case} done", file=sys.stderr)
+    finally:
+        shutil.rmtree(tmp)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
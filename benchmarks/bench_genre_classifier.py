@@ -0,0 +1,52 @@
+"""Compares one LLM call per artist with BatchGenreClassifier, fully offline.
+
+Usage: python benchmarks/bench_genre_classifier.py [--artists 2000] [--batch-size 25] [--latency 0.05]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from genre_classifier import BatchGenreClassifier, FakeLLMBackend  # noqa: E402
+
+
+def run(artists, batch_size, latency, invalid_rate, workers):
+    backend = FakeLLMBackend(latency=latency, invalid_rate=invalid_rate)
+    classifier = BatchGenreClassifier(backend, batch_size=batch_size, max_workers=workers, tokens_per_minute=None)
+    start = time.perf_counter()
+    genres = classifier.classify(artists)
+    elapsed = time.perf_counter() - start
+    return {
+        "batch_size": batch_size,
+        "elapsed_sec": round(elapsed, 3),
+        "llm_calls": classifier.stats["llm_calls"],
+        "retried": classifier.stats["retried"],
+        "estimated_tokens": classifier.stats["tokens"],
+        "unknown": sum(1 for genre in genres.values() if genre == "Unknown"),
+        "artists_per_sec": round(len(artists) / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--artists", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency per call (s)")
+    parser.add_argument("--invalid-rate", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    artists = [f"Artist {i}" for i in range(args.artists)]
+    results = {
+        "per_artist": run(artists, 1, args.latency, args.invalid_rate, 1),
+        "batched": run(artists, args.batch_size, args.latency, args.invalid_rate, args.workers),
+    }
+    results["speedup"] = round(results["per_artist"]["elapsed_sec"] / results["batched"]["elapsed_sec"], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Compares the old per-artist genre loop with GenreEnrichmentPipeline.
+
+Usage: python benchmarks/bench_genre_enrichment.py [--artists 500] [--latency 0.02]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schema  # noqa: E402
+from genre_pipeline import GenreEnrichmentPipeline  # noqa: E402
+from stub_servers import start_stub_server, stub_llm, stub_spotify  # noqa: E402
+
+
+def make_db(path, n_artists):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+    CREATE TABLE listening_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        track_name TEXT,
+        artist TEXT,
+        played_at TEXT UNIQUE,
+        genre TEXT,
+        artist_id TEXT
+    )
+    """)
+    rows = []
+    for i in range(n_artists * 3):
+        a = i % n_artists
+        # Half the artists have an ID stored, like rows written by save_to_db
+        artist_id = f"artist{a}" if a % 2 == 0 else None
+        rows.append((f"Track {i}", f"Artist {a}", f"2024-01-01T00:00:{i:09d}Z", "Unknown", artist_id))
+    conn.executemany(
+        "INSERT INTO listening_history (track_name, artist, played_at, genre, artist_id) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    conn.commit()
+    conn.close()
+
+
+def missing_artists(path):
+    """Legacy single-table query the old loop ran."""
+    conn = sqlite3.connect(path)
+    rows = conn.execute("""
+        SELECT artist, MAX(artist_id) FROM listening_history
+        WHERE genre IS NULL OR genre = 'Unknown'
+        GROUP BY artist
+    """).fetchall()
+    conn.close()
+    return rows
+
+
+def missing_artists_normalized(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT name, spotify_id FROM artists WHERE genre IS NULL OR genre = 'Unknown'").fetchall()
+    conn.close()
+    return rows
+
+
+def legacy_loop(path, sp, llm):
+    """The serial loop update_missing_genres used before the pipeline."""
+    for artist_name, _ in missing_artists(path):
+        genre = "Unknown"
+        try:
+            results = sp.search(q=artist_name, type="artist", limit=1)
+            if "artists" in results and results["artists"]["items"]:
+                genres = results["artists"]["items"][0].get("genres", [])
+                genre = genres[0] if genres else "Unknown"
+        except Exception:
+            pass
+        if genre == "Unknown":
+            genre = llm(artist_name)
+        conn = sqlite3.connect(path)
+        cursor = conn.cursor()
+        cursor.execute("UPDATE listening_history SET genre = ? WHERE artist = ?", (genre, artist_name))
+        conn.commit()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--artists", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="stub latency per call (s)")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency)
+    sp, llm = stub_spotify(base_url), stub_llm(base_url)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, "legacy.db")
+        make_db(legacy_db, args.artists)
+        start = time.perf_counter()
+        legacy_loop(legacy_db, sp, llm)
+        elapsed = time.perf_counter() - start
+        results["legacy"] = {"elapsed_sec": round(elapsed, 3), "artists_per_sec": round(args.artists / elapsed, 1)}
+
+        pipeline_db = os.path.join(tmp, "pipeline.db")
+        make_db(pipeline_db, args.artists)
+        schema.migrate(pipeline_db)
+        pipeline = GenreEnrichmentPipeline(sp, llm, db_path=pipeline_db, max_workers=args.workers,
+                                           spotify_rate=None, llm_rate=None)
+        results["pipeline"] = pipeline.run(missing_artists_normalized(pipeline_db))
+
+    server.shutdown()
+    results["speedup"] = round(results["legacy"]["elapsed_sec"] / results["pipeline"]["elapsed_sec"], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
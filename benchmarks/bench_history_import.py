@@ -0,0 +1,114 @@
+"""Throughput of the extended streaming history importer on a synthetic export zip.
+
+Runs the import inline and with a process pool into fresh databases, then
+re-imports the same zip to show deduplication. Also checks the streaming JSON
+parser against json.load on one file.
+
+Usage: python benchmarks/bench_history_import.py [--rows 500000] [--rows-per-file 16000] [--processes 4]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import schema  # noqa: E402
+from history_import import import_streaming_history, iter_json_array  # noqa: E402
+
+PLATFORMS = ["android", "ios", "osx", "windows", "web_player", "cast_to_device"]
+REASONS_START = ["trackdone", "clickrow", "fwdbtn", "backbtn", "playbtn"]
+REASONS_END = ["trackdone", "endplay", "fwdbtn", "logout", "unexpected-exit"]
+
+
+def make_entry(rng, i, n_artists=3000):
+    ts = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1_500_000_000 + i * 37))
+    if rng.random() < 0.03:
+        # Podcast episode: no track metadata
+        return {"ts": ts, "platform": "android", "ms_played": 600000, "master_metadata_track_name": None,
+                "master_metadata_album_artist_name": None, "episode_name": f"Episode {i}",
+                "episode_show_name": "Some Show", "spotify_episode_uri": f"spotify:episode:{i}"}
+    artist = min(int(rng.paretovariate(1.1)), n_artists)
+    skipped = rng.random() < 0.2
+    return {
+        "ts": ts,
+        "platform": rng.choice(PLATFORMS),
+        "ms_played": rng.randint(1000, 30000) if skipped else rng.randint(90000, 300000),
+        "conn_country": "US",
+        "ip_addr": "192.0.2.1",
+        "master_metadata_track_name": f"Track {artist}-{rng.randrange(30)}",
+        "master_metadata_album_artist_name": f"Artist {artist} ✨",
+        "master_metadata_album_album_name": f"Album {artist}",
+        "spotify_track_uri": f"spotify:track:{artist:022d}",
+        "episode_name": None,
+        "episode_show_name": None,
+        "spotify_episode_uri": None,
+        "reason_start": rng.choice(REASONS_START),
+        "reason_end": "fwdbtn" if skipped else rng.choice(REASONS_END),
+        "shuffle": rng.random() < 0.5,
+        "skipped": skipped if rng.random() < 0.9 else None,
+        "offline": False,
+        "offline_timestamp": 0,
+        "incognito_mode": False,
+    }
+
+
+def make_export(path, n_rows, rows_per_file=16000, seed=42):
+    """Writes a zip laid out like Spotify's extended history download."""
+    rng = random.Random(seed)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for file_index, first in enumerate(range(0, n_rows, rows_per_file)):
+            entries = [make_entry(rng, i) for i in range(first, min(first + rows_per_file, n_rows))]
+            name = f"Spotify Extended Streaming History/Streaming_History_Audio_{file_index}.json"
+            archive.writestr(name, json.dumps(entries, indent=2))
+        archive.writestr("Spotify Extended Streaming History/ReadMeFirst_ExtendedStreamingHistory.pdf", b"%PDF")
+
+
+def fresh_db(path):
+    schema.migrate(path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--rows-per-file", type=int, default=16_000)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, "my_spotify_data.zip")
+        make_export(zip_path, args.rows, args.rows_per_file)
+        results["zip_mb"] = round(os.path.getsize(zip_path) / 2 ** 20, 1)
+
+        with zipfile.ZipFile(zip_path) as archive:
+            member = next(name for name in archive.namelist() if name.endswith(".json"))
+            expected = json.loads(archive.read(member))
+            with archive.open(member) as raw:
+                streamed = list(iter_json_array(io.TextIOWrapper(raw, encoding="utf-8"), chunk_chars=997))
+        results["parser_matches_json_load"] = streamed == expected
+
+        inline_db = fresh_db(os.path.join(tmp, "inline.db"))
+        results["inline"] = import_streaming_history(zip_path, processes=0, db_path=inline_db)
+
+        pool_db = fresh_db(os.path.join(tmp, "pool.db"))
+        results["process_pool"] = import_streaming_history(zip_path, processes=args.processes, db_path=pool_db)
+        results["reimport_same_zip"] = import_streaming_history(zip_path, processes=args.processes, db_path=pool_db)
+
+        with db.connection(pool_db) as conn:
+            results["plays_in_db"] = conn.execute("SELECT COUNT(*) FROM plays").fetchone()[0]
+        for path in (inline_db, pool_db):
+            db.get_pool(path).close_all()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
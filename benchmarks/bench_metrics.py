@@ -0,0 +1,115 @@
+"""Cost of the instrumentation: metric updates, per-request hooks and the sampling profiler.
+
+  observe_us          - Histogram.observe, single thread and with --threads contending
+  render_ms           - building /metrics with --series label sets per histogram
+  request_overhead_us - GET /shard-stats through the test client with and
+                        without the timing hooks, difference of medians
+  profiler_overhead   - a CPU-bound function timed bare and under SamplingProfiler
+
+Usage: python benchmarks/bench_metrics.py [--threads 8] [--series 200] [--requests 2000]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import metrics  # noqa: E402
+from profiling import SamplingProfiler  # noqa: E402
+
+
+def observe_us(histogram, n, threads):
+    def work():
+        for i in range(n):
+            histogram.observe(i * 1e-5, route="/bench", method="GET", status=200)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return round((time.perf_counter() - start) / (n * threads) * 1e6, 3)
+
+
+def request_us(client, route, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        client.get(route)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+
+def busy(n):
+    total = 0
+    for i in range(n):
+        total += i * i % 7
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--series", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    histogram = metrics.Histogram("bench_seconds", "bench", ["route", "method", "status"])
+    results = {"observe_us": {"single_thread": observe_us(histogram, 200_000, 1),
+                              f"{args.threads}_threads": observe_us(histogram, 50_000, args.threads)}}
+
+    registry = metrics.Registry()
+    for name in ("a", "b", "c"):
+        series = registry.histogram(f"bench_{name}_seconds", "bench", ["route"])
+        for i in range(args.series):
+            series.observe(0.01, route=f"/route/{i}")
+    start = time.perf_counter()
+    body = registry.render()
+    results["render_ms"] = {"series": args.series * 3, "ms": round((time.perf_counter() - start) * 1000, 2),
+                            "bytes": len(body)}
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update({"SPOTIFY_DB_PATH": os.path.join(tmp, "bench.db"), "DISABLE_BACKGROUND_JOBS": "1",
+                       "SPOTIFY_CLIENT_ID": "bench", "SPOTIFY_CLIENT_SECRET": "bench",
+                       "SPOTIFY_REDIRECT_URI": "http://localhost/callback", "LOG_LEVEL": "WARNING"})
+    import app  # noqa: E402
+
+    flask_app = app.create_app()
+    client = flask_app.test_client()
+    request_us(client, "/shard-stats", 200)  # Warm up
+    timed = request_us(client, "/shard-stats", args.requests)
+    before, after = flask_app.before_request_funcs[None], flask_app.after_request_funcs[None]
+    flask_app.before_request_funcs[None] = [f for f in before if f is not app.start_request_timer]
+    flask_app.after_request_funcs[None] = [f for f in after if f is not app.record_request_timing]
+    bare = request_us(client, "/shard-stats", args.requests)
+    flask_app.before_request_funcs[None], flask_app.after_request_funcs[None] = before, after
+    results["request_overhead_us"] = {"with_hooks": round(timed, 1), "without_hooks": round(bare, 1),
+                                      "overhead": round(timed - bare, 1)}
+
+    n = 3_000_000
+    start = time.perf_counter()
+    busy(n)
+    plain = time.perf_counter() - start
+    profiler = SamplingProfiler().start()
+    start = time.perf_counter()
+    busy(n)
+    profiled = time.perf_counter() - start
+    profiler.stop()
+    results["profiler_overhead"] = {"plain_sec": round(plain, 3), "profiled_sec": round(profiled, 3),
+                                    "slowdown_pct": round((profiled / plain - 1) * 100, 1),
+                                    "samples": profiler.samples}
+    app.db.get_pool(os.environ["SPOTIFY_DB_PATH"]).close_all()
+    shutil.rmtree(tmp)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
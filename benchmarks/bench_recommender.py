@@ -0,0 +1,113 @@
+"""Build and query latency of the local recommender on a synthetic listening history.
+
+Tracks belong to artists and genres; plays come in sessions that mostly stay
+within one genre, so co-listening carries real signal. Builds the exact and
+IVF indexes over the same vectors and reports query percentiles (single and
+batched) plus the IVF's recall@k against exact search.
+
+Usage: python benchmarks/bench_recommender.py [--tracks 300000] [--plays 2000000] [--queries 500]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recommender import Recommender, VectorIndex  # noqa: E402
+
+
+def make_history(n_tracks, n_plays, n_artists, n_genres=60, session_length=20, seed=42):
+    rng = np.random.default_rng(seed)
+    artist_genre = rng.integers(0, n_genres, n_artists)
+    track_artist = np.minimum(rng.pareto(1.1, n_tracks).astype(np.int64), n_artists - 1)
+    tracks = pd.DataFrame({
+        "artist": pd.Categorical.from_codes(track_artist, [f"Artist {i}" for i in range(n_artists)]),
+        "genre": pd.Categorical.from_codes(artist_genre[track_artist], [f"genre {i}" for i in range(n_genres)]),
+        "duration_ms": rng.normal(210_000, 40_000, n_tracks).astype(np.int32),
+        "popularity": rng.integers(0, 100, n_tracks).astype(np.int32),
+    })
+
+    # Each session sticks to one genre 80% of the time
+    by_genre = np.argsort(tracks["genre"].cat.codes.to_numpy(), kind="stable")
+    offsets = np.searchsorted(tracks["genre"].cat.codes.to_numpy()[by_genre], np.arange(n_genres + 1))
+    session = np.arange(n_plays) // session_length
+    genre = rng.integers(0, n_genres, session[-1] + 1)[session]
+    size = np.maximum(offsets[genre + 1] - offsets[genre], 1)
+    in_genre = by_genre[np.minimum(offsets[genre] + (rng.random(n_plays) * size).astype(np.int64), n_tracks - 1)]
+    play_ids = np.where(rng.random(n_plays) < 0.8, in_genre, rng.integers(0, n_tracks, n_plays))
+    played_at_ms = 1_500_000_000_000 + session * 2 * 3600 * 1000 + (np.arange(n_plays) % session_length) * 180_000
+    return tracks, play_ids, played_at_ms
+
+
+def percentiles(samples):
+    values = np.array(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(values, 50)), 3), "p95_ms": round(float(np.percentile(values, 95)), 3),
+            "p99_ms": round(float(np.percentile(values, 99)), 3)}
+
+
+def time_queries(index, queries, k, batch):
+    single = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k=k)
+        single.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    for first in range(0, len(queries), batch):
+        index.search(queries[first:first + batch], k=k)
+    batched = (time.perf_counter() - start) / len(queries)
+    return {**percentiles(single), f"batched_{batch}_per_query_ms": round(batched * 1000, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracks", type=int, default=300_000)
+    parser.add_argument("--plays", type=int, default=2_000_000)
+    parser.add_argument("--artists", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=64)
+    args = parser.parse_args()
+
+    tracks, play_ids, played_at_ms = make_history(args.tracks, args.plays, args.artists)
+    ids = np.arange(args.tracks)
+    results = {"tracks": args.tracks, "plays": args.plays}
+
+    start = time.perf_counter()
+    exact = Recommender.build(tracks, ids, play_ids, played_at_ms, approximate=False)
+    results["vectors_build_sec"] = round(time.perf_counter() - start, 2)
+    results["dimensions"] = exact.index.vectors.shape[1]
+    results["matrix_mb"] = round(exact.index.vectors.nbytes / 2 ** 20, 1)
+
+    start = time.perf_counter()
+    ivf = VectorIndex.build(exact.index.vectors, approximate=True)
+    results["ivf_build_sec"] = round(time.perf_counter() - start, 2)
+    results["ivf_lists"] = len(ivf.centroids)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Recommender(ids, ivf).save(os.path.join(tmp, "recommender"))
+        start = time.perf_counter()
+        Recommender.load(os.path.join(tmp, "recommender"))
+        results["load_sec"] = round(time.perf_counter() - start, 3)
+
+    # Queries are the profiles of played tracks, like a "more like this" request
+    rng = np.random.default_rng(7)
+    queries = exact.index.vectors[rng.choice(play_ids, args.queries)]
+    results["exact"] = time_queries(exact.index, queries, args.k, args.batch)
+    results["ivf"] = time_queries(ivf, queries, args.k, args.batch)
+
+    truth = exact.index.search(queries, k=args.k)
+    approx = ivf.search(queries, k=args.k)
+    results["ivf"]["recall_at_k"] = round(float(np.mean(
+        [len({row for row, _ in a} & {row for row, _ in b}) / args.k for a, b in zip(truth, approx)])), 3)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
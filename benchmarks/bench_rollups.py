@@ -0,0 +1,126 @@
+"""Analytics latency from the rollup tables vs aggregating raw plays, as history grows.
+
+Every size spans the same three years, so more plays means denser history.
+For each size: full backfill time, incremental catch-up of 1000 new plays,
+and the median latency of heatmap / trends / streaks read from the rollups
+next to the same aggregation over raw plays.
+
+Usage: python benchmarks/bench_rollups.py [--sizes 200000 1000000 3000000]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import rollups  # noqa: E402
+import schema  # noqa: E402
+
+SPAN_MS = 3 * 365 * 86_400_000
+START_MS = 1_600_000_000_000
+
+
+def make_db(path, n_plays, n_artists=5000, seed=42):
+    schema.migrate(path)
+    db.get_pool(path).close_all()
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO artists (id, name, genre) VALUES (?, ?, ?)",
+                     ((i, f"Artist {i}", f"genre-{i % 40}") for i in range(n_artists)))
+    conn.executemany("INSERT INTO tracks (id, artist_id, name) VALUES (?, ?, ?)",
+                     ((i, i % n_artists, f"Track {i}") for i in range(n_artists * 10)))
+    add_plays(conn, rng, 0, n_plays, n_plays, n_artists)
+    conn.commit()
+    conn.close()
+
+
+def add_plays(conn, rng, first, count, n_plays, n_artists):
+    def plays():
+        for i in range(first, first + count):
+            artist = min(int(rng.paretovariate(1.2)), n_artists) - 1
+            yield artist + n_artists * rng.randrange(10), artist, START_MS + i * SPAN_MS // n_plays + rng.randrange(1000)
+
+    conn.executemany("INSERT OR IGNORE INTO plays (track_id, artist_id, played_at) VALUES (?, ?, ?)", plays())
+
+
+def raw_heatmap(path):
+    with db.connection(path) as conn:
+        return conn.execute("""
+            SELECT strftime('%w', played_at / 1000, 'unixepoch'), strftime('%H', played_at / 1000, 'unixepoch'), COUNT(*)
+            FROM plays GROUP BY 1, 2
+        """).fetchall()
+
+
+def raw_trends(path):
+    with db.connection(path) as conn:
+        return conn.execute("""
+            SELECT strftime('%Y-%m', p.played_at / 1000, 'unixepoch') AS bucket, a.genre, COUNT(*)
+            FROM plays p JOIN artists a ON a.id = p.artist_id GROUP BY 1, 2
+        """).fetchall()
+
+
+def raw_streak_days(path):
+    with db.connection(path) as conn:
+        return conn.execute("SELECT DISTINCT played_at / 86400000 FROM plays ORDER BY 1").fetchall()
+
+
+def median_ms(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200_000, 1_000_000, 3_000_000])
+    args = parser.parse_args()
+
+    results = []
+    for n_plays in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            make_db(path, n_plays)
+            row = {"plays": n_plays}
+
+            start = time.perf_counter()
+            rollups.catch_up(db_path=path)
+            row["backfill_sec"] = round(time.perf_counter() - start, 2)
+            with db.connection(path) as conn:
+                row["hourly_rows"] = conn.execute("SELECT COUNT(*) FROM rollup_hourly").fetchone()[0]
+                row["daily_rows"] = conn.execute("SELECT COUNT(*) FROM rollup_daily").fetchone()[0]
+
+            with db.transaction(path) as conn:
+                add_plays(conn, random.Random(1), n_plays, 1000, n_plays, 5000)
+            start = time.perf_counter()
+            row["incremental_plays"] = rollups.catch_up(db_path=path)
+            row["incremental_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+            row["rollup_ms"] = {
+                "heatmap": median_ms(lambda: rollups.heatmap(db_path=path)),
+                "trends_month_by_genre": median_ms(lambda: rollups.trends("month", by="genre", db_path=path)),
+                "streaks": median_ms(lambda: rollups.streaks(db_path=path)),
+            }
+            row["raw_plays_ms"] = {
+                "heatmap": median_ms(lambda: raw_heatmap(path), repeat=3),
+                "trends_month_by_genre": median_ms(lambda: raw_trends(path), repeat=3),
+                "streak_days": median_ms(lambda: raw_streak_days(path), repeat=3),
+            }
+            db.get_pool(path).close_all()
+            results.append(row)
+            print(f"✅ {n_plays} plays done", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""The old per-track save_to_db loop vs the staged history_sync.save_plays, with a fake Spotify client.
+
+Each sync batch is `--batch` plays spread over `--artists-per-batch` artists,
+drawn from a pool so later batches mostly hit artists already stored. The fake
+client sleeps `--latency` per call and counts calls; every 5th artist has no
+Spotify genre, so the LLM fallback is exercised too.
+
+Usage: python benchmarks/bench_save_plays.py [--batches 40] [--batch 50] [--artists-per-batch 5] [--latency 0.02]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import schema  # noqa: E402
+from genre_pipeline import GenreEnrichmentPipeline  # noqa: E402
+from history_sync import save_plays  # noqa: E402
+
+GENRES = ["pop", "rap", "rock", "indie", "jazz"]
+
+
+class FakeSpotify:
+    """Just the spotipy methods save_to_db uses, with a fixed latency per call."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = {"artist": 0, "artists": 0, "search": 0}
+        self.lock = threading.Lock()
+
+    def _call(self, name):
+        with self.lock:
+            self.calls[name] += 1
+        time.sleep(self.latency)
+
+    @staticmethod
+    def _artist(artist_id):
+        n = int(artist_id.rsplit("-", 1)[1])
+        return {"id": artist_id, "genres": [] if n % 5 == 0 else [GENRES[n % len(GENRES)]]}
+
+    def artist(self, artist_id):
+        self._call("artist")
+        return self._artist(artist_id)
+
+    def artists(self, artist_ids):
+        self._call("artists")
+        return {"artists": [self._artist(artist_id) for artist_id in artist_ids]}
+
+    def search(self, q, type="artist", limit=1):
+        self._call("search")
+        return {"artists": {"items": []}}
+
+
+class FakeLLM:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, artist_name):
+        self.calls += 1
+        time.sleep(self.latency)
+        return "Electronic"
+
+
+def make_batches(n_batches, batch_size, artists_per_batch, pool_size=60, seed=5):
+    rng = random.Random(seed)
+    batches, played_at = [], 1_700_000_000
+    for _ in range(n_batches):
+        artists = rng.sample(range(pool_size), artists_per_batch)
+        batch = []
+        for _ in range(batch_size):
+            artist = rng.choice(artists)
+            played_at += 180
+            batch.append({"track_name": f"Track {artist}-{rng.randrange(20)}", "artist": f"Artist {artist}",
+                          "artist_id": f"artist-{artist}",
+                          "played_at": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(played_at))})
+        batches.append(batch)
+    return batches
+
+
+def legacy_save(tracks, sp, llm, db_path):
+    """save_to_db before the staged pipeline: one sp.artist (and maybe one LLM call) per play."""
+    rows = []
+    for track in tracks:
+        try:
+            genre_list = sp.artist(track["artist_id"]).get("genres", [])
+            genre = genre_list[0] if genre_list else "Unknown"
+        except Exception:
+            genre = "Unknown"
+        if genre == "Unknown":
+            genre = llm(track["artist"])
+        rows.append((track["track_name"], track["artist"], track["played_at"], genre, track["artist_id"]))
+    with db.transaction(db_path) as conn:
+        return schema.insert_plays(conn, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=40)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--artists-per-batch", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    batches = make_batches(args.batches, args.batch, args.artists_per_batch)
+    results = {"batches": args.batches, "plays": args.batches * args.batch}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db, staged_db = os.path.join(tmp, "legacy.db"), os.path.join(tmp, "staged.db")
+        for path in (legacy_db, staged_db):
+            schema.migrate(path)
+
+        sp, llm = FakeSpotify(args.latency), FakeLLM(args.latency)
+        start = time.perf_counter()
+        inserted = sum(legacy_save(batch, sp, llm, legacy_db) for batch in batches)
+        results["legacy"] = {"elapsed_sec": round(time.perf_counter() - start, 3), "rows_inserted": inserted,
+                             "spotify_calls": sum(sp.calls.values()), "llm_calls": llm.calls}
+
+        sp, llm = FakeSpotify(args.latency), FakeLLM(args.latency)
+        stages, first_batch = {}, None
+        start = time.perf_counter()
+        inserted = 0
+        for batch in batches:
+            pipeline = GenreEnrichmentPipeline(sp, llm, db_path=staged_db, spotify_rate=None, llm_rate=None)
+            batch_inserted, stats = save_plays(batch, pipeline, db_path=staged_db)
+            inserted += batch_inserted
+            first_batch = first_batch or stats
+            for key, value in stats.items():
+                if key.endswith("_sec"):
+                    stages[key] = round(stages.get(key, 0) + value, 4)
+        results["staged"] = {"elapsed_sec": round(time.perf_counter() - start, 3), "rows_inserted": inserted,
+                             "spotify_calls": sum(sp.calls.values()), "llm_calls": llm.calls,
+                             "stage_totals": stages, "first_batch": first_batch}
+
+        for path in (legacy_db, staged_db):
+            db.get_pool(path).close_all()
+
+    results["speedup"] = round(results["legacy"]["elapsed_sec"] / results["staged"]["elapsed_sec"], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Legacy single-table listening_history vs the normalized artists/tracks/plays schema.
+
+Builds a legacy database with --plays rows, times the genre-update and chart
+queries, runs the v2 migration, then times the same operations again.
+
+Usage: python benchmarks/bench_schema.py [--plays 1000000] [--artists 5000]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import schema  # noqa: E402
+
+LEGACY_QUERIES = {
+    "unknown_artists": "SELECT DISTINCT artist FROM listening_history WHERE genre = 'Unknown'",
+    "top_artists": "SELECT artist, COUNT(*) AS plays FROM listening_history GROUP BY artist ORDER BY plays DESC LIMIT 10",
+    "genre_counts": "SELECT genre, COUNT(*) FROM listening_history GROUP BY genre",
+}
+NORMALIZED_QUERIES = {
+    "unknown_artists": "SELECT name FROM artists WHERE genre = 'Unknown'",
+    "top_artists": """SELECT a.name, COUNT(*) AS plays FROM plays p JOIN artists a ON a.id = p.artist_id
+                      GROUP BY p.artist_id ORDER BY plays DESC LIMIT 10""",
+    "genre_counts": "SELECT a.genre, COUNT(*) FROM plays p JOIN artists a ON a.id = p.artist_id GROUP BY a.genre",
+}
+
+
+def make_legacy_db(path, n_plays, n_artists):
+    rng = random.Random(42)
+    conn = sqlite3.connect(path)
+    schema._v1_listening_history(conn)
+    conn.execute("PRAGMA user_version = 1")
+    start_ms = 1_600_000_000_000
+
+    def rows():
+        for i in range(n_plays):
+            artist = min(int(rng.paretovariate(1.2)), n_artists) - 1  # A few artists get most plays
+            genre = "Unknown" if artist % 10 == 0 else f"genre-{artist % 40}"
+            played_at = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime((start_ms + i * 1000) / 1000)) + ".000Z"
+            yield (f"Track {artist}-{rng.randrange(30)}", f"Artist {artist}", played_at, genre, f"id{artist}")
+
+    conn.executemany(
+        "INSERT INTO listening_history (track_name, artist, played_at, genre, artist_id) VALUES (?, ?, ?, ?, ?)",
+        rows()
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(conn, sql, params=()):
+    start = time.perf_counter()
+    conn.execute(sql, params).fetchall()
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def time_genre_updates(conn, table_sql, n=100):
+    start = time.perf_counter()
+    with conn:
+        conn.executemany(table_sql, [(f"genre-{i % 40}", f"Artist {i}") for i in range(n)])
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plays", type=int, default=1_000_000)
+    parser.add_argument("--artists", type=int, default=5000)
+    args = parser.parse_args()
+
+    results = {"plays": args.plays}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        make_legacy_db(path, args.plays, args.artists)
+
+        conn = sqlite3.connect(path)
+        results["legacy_ms"] = {name: timed(conn, sql) for name, sql in LEGACY_QUERIES.items()}
+        results["legacy_ms"]["update_100_artist_genres"] = time_genre_updates(
+            conn, "UPDATE listening_history SET genre = ? WHERE artist = ?")
+        conn.close()
+
+        start = time.perf_counter()
+        schema.migrate(path)
+        results["migration_sec"] = round(time.perf_counter() - start, 2)
+        db.get_pool(path).close_all()
+
+        conn = sqlite3.connect(path)
+        results["normalized_ms"] = {name: timed(conn, sql) for name, sql in NORMALIZED_QUERIES.items()}
+        results["normalized_ms"]["update_100_artist_genres"] = time_genre_updates(
+            conn, "UPDATE artists SET genre = ? WHERE name = ?")
+        conn.close()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Latency of SearchIndex vs the old str.contains scan on a synthetic catalog.
+
+Queries mix whole words, typeahead prefixes, misspellings and two-word
+queries drawn from the catalog. Reports build/load time and p50/p95/p99.
+
+Usage: python benchmarks/bench_search.py [--tracks 1000000] [--queries 2000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndex, tokenize  # noqa: E402
+
+SYLLABLES = ["ka", "lo", "mi", "ré", "so", "na", "vé", "tu", "bel", "dor", "ström", "ño", "zé", "gar",
+             "lin", "ma", "ri", "el", "on", "ska", "ja", "fel", "us", "quë", "thor", "ai", "ben", "cy"]
+
+
+def make_word(rng, parts):
+    return "".join(rng.choice(SYLLABLES) for _ in range(parts))
+
+
+def make_catalog(n_tracks, n_artists, seed=42):
+    rng = random.Random(seed)
+    artists = [" ".join(make_word(rng, rng.randint(2, 3)).capitalize() for _ in range(rng.randint(1, 2)))
+               for _ in range(n_artists)]
+    rows_artist, rows_track = [], []
+    for i in range(n_tracks):
+        rows_artist.append(artists[min(int(rng.paretovariate(1.1)), n_artists) - 1])
+        rows_track.append(" ".join(make_word(rng, rng.randint(1, 3)) for _ in range(rng.randint(1, 4))).title())
+    return pd.DataFrame({"artist": pd.Categorical(rows_artist), "track_name": pd.Categorical(rows_track)})
+
+
+def misspell(rng, word):
+    i = rng.randrange(len(word))
+    return word[:i] + rng.choice("aeiouxz") + word[i + 1:]
+
+
+def make_queries(df, n, seed=7):
+    rng = random.Random(seed)
+    queries = []
+    for i in range(n):
+        row = rng.randrange(len(df))
+        words = tokenize(f"{df['artist'].iat[row]} {df['track_name'].iat[row]}")
+        word = rng.choice(words)
+        kind = i % 4
+        if kind == 0:
+            queries.append(("word", word))
+        elif kind == 1:
+            queries.append(("prefix", word[:rng.randint(2, max(2, len(word) - 1))]))
+        elif kind == 2:
+            queries.append(("misspelled", misspell(rng, word) if len(word) > 4 else word))
+        else:
+            queries.append(("two_words", " ".join(rng.sample(words, 2)) if len(words) > 1 else word))
+    return queries
+
+
+def percentiles(samples):
+    values = np.array(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(values, 50)), 3), "p95_ms": round(float(np.percentile(values, 95)), 3),
+            "p99_ms": round(float(np.percentile(values, 99)), 3), "max_ms": round(float(values.max()), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracks", type=int, default=1_000_000)
+    parser.add_argument("--artists", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--scan-queries", type=int, default=20)
+    args = parser.parse_args()
+
+    df = make_catalog(args.tracks, args.artists)
+    results = {"rows": len(df)}
+
+    start = time.perf_counter()
+    index = SearchIndex.from_frame(df)
+    results["build_sec"] = round(time.perf_counter() - start, 2)
+    results["documents"] = index.doc_count
+    results["terms"] = len(index.terms)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index.save(os.path.join(tmp, "search"))
+        start = time.perf_counter()
+        index = SearchIndex.load(os.path.join(tmp, "search"))
+        results["load_sec"] = round(time.perf_counter() - start, 3)
+
+        queries = make_queries(df, args.queries)
+        timings = {}
+        empty = 0
+        for kind, query in queries:
+            start = time.perf_counter()
+            matches = index.search(query, limit=10)
+            timings.setdefault(kind, []).append(time.perf_counter() - start)
+            empty += not matches
+        results["index"] = {kind: percentiles(samples) for kind, samples in timings.items()}
+        results["index"]["all"] = percentiles([t for samples in timings.values() for t in samples])
+        results["index"]["queries_without_results"] = empty
+
+    scan = []
+    for _, query in queries[:args.scan_queries]:
+        start = time.perf_counter()
+        q = query.lower()
+        df[df["artist"].str.lower().str.contains(q, na=False, regex=False) |
+           df["track_name"].str.lower().str.contains(q, na=False, regex=False)]
+        scan.append(time.perf_counter() - start)
+    results["str_contains_scan"] = percentiles(scan)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Shared SpotifyClient vs a fresh spotipy.Spotify per call, against the local stub server.
+
+The stub answers every `--throttle-every`th request with 429 + Retry-After.
+Measures the same artist lookups done sequentially with a new spotipy client
+each time (the old per-route pattern), sequentially through the shared client,
+and as one async fan-out; then fires identical concurrent requests to show
+coalescing. Finally replays page views (top artists + artist lookups for a
+few users) without and with the ResponseCache. Prints wall time, failures,
+stub hits and per-endpoint metrics.
+
+Usage: python benchmarks/bench_spotify_client.py [--calls 200] [--latency 0.02] [--throttle-every 25]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import spotipy  # noqa: E402
+
+from response_cache import ResponseCache  # noqa: E402
+from stub_servers import start_stub_server, stub_spotify_client  # noqa: E402
+
+ARTIST_ID = "{:022d}"
+
+
+def run(server, fn):
+    before = dict(server.hits)
+    start = time.perf_counter()
+    failures = fn()
+    return {"elapsed_sec": round(time.perf_counter() - start, 3), "failures": failures,
+            "stub_requests": server.hits["requests"] - before["requests"],
+            "stub_429s": server.hits["throttled"] - before["throttled"]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--throttle-every", type=int, default=25)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=200, help="Client token bucket, requests/sec")
+    parser.add_argument("--concurrent-duplicates", type=int, default=50)
+    parser.add_argument("--page-views", type=int, default=100)
+    parser.add_argument("--users", type=int, default=10)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency, throttle_every=args.throttle_every,
+                                         retry_after=args.retry_after)
+    ids = [ARTIST_ID.format(i) for i in range(args.calls)]
+    results = {"calls": args.calls, "stub_latency_ms": args.latency * 1000, "throttle_every": args.throttle_every}
+
+    def fresh_spotipy():
+        failures = 0
+        for artist_id in ids:
+            sp = spotipy.Spotify(auth="stub-token")  # New session (and TCP connection) per call
+            sp.prefix = f"{base_url}/v1/"
+            try:
+                sp.artist(artist_id)
+            except Exception:
+                failures += 1
+        return failures
+
+    client = stub_spotify_client(base_url, rate=args.rate)
+    sp = client.for_token("stub-token")
+
+    def shared_sequential():
+        failures = 0
+        for artist_id in ids:
+            try:
+                sp.artist(artist_id)
+            except Exception:
+                failures += 1
+        return failures
+
+    def shared_fan_out():
+        return sum(isinstance(r, Exception) for r in sp.gather([(f"artists/{artist_id}", None) for artist_id in ids]))
+
+    def duplicates():
+        with ThreadPoolExecutor(max_workers=args.concurrent_duplicates) as pool:
+            outcomes = list(pool.map(lambda _: sp.current_user_top_artists(limit=10),
+                                     range(args.concurrent_duplicates)))
+        return sum(outcome is None for outcome in outcomes)
+
+    results["fresh_spotipy_per_call"] = run(server, fresh_spotipy)
+    results["shared_client_sequential"] = run(server, shared_sequential)
+    results["shared_client_fan_out"] = run(server, shared_fan_out)
+    results["concurrent_duplicate_requests"] = {"requests": args.concurrent_duplicates, **run(server, duplicates)}
+    results["client_metrics"] = client.stats()
+    client.close()
+
+    # Page views: each loads long_term top artists, then looks up 5 artists from a small hot set
+    rng = random.Random(3)
+    views = [(f"token-{rng.randrange(args.users)}", [ARTIST_ID.format(rng.randrange(100)) for _ in range(5)])
+             for _ in range(args.page_views)]
+
+    def page_views(page_client):
+        def replay():
+            failures = 0
+            for token, artist_ids in views:
+                user_sp = page_client.for_token(token)
+                try:
+                    user_sp.current_user_top_artists(limit=10, time_range="long_term")
+                    for artist_id in artist_ids:
+                        user_sp.artist(artist_id)
+                except Exception:
+                    failures += 1
+            return failures
+        return replay
+
+    for name, cache in (("page_views_uncached", None), ("page_views_cached", ResponseCache())):
+        page_client = stub_spotify_client(base_url, rate=args.rate, cache=cache)
+        results[name] = run(server, page_views(page_client))
+        if cache:
+            results[name]["cache"] = {key: value for key, value in cache.stats().items() if key != "endpoints"}
+        page_client.close()
+
+    server.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Cold-start cost of the web app: import breakdown and time to first response.
+
+Every measurement runs in a fresh interpreter against an empty temporary
+database:
+  import_breakdown   - `python -X importtime -c "import app"`, cumulative ms for
+                       the heavy packages plus the slowest modules overall
+  in_process         - import, create_app() and the first GET / through the
+                       test client, each timed from interpreter start
+                       (the database is migrated and seeded beforehand)
+  flask_run          - `flask --app app run`, polled until GET / answers
+  first_heavy_routes - first hit of routes that need the lazy dependencies,
+                       timed in the same process after startup
+With --max-first-response SEC it exits 1 when flask_run is slower, so CI can
+run it as a startup budget check.
+
+Usage: python benchmarks/bench_startup.py [--runs 3] [--max-first-response 2.0]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_PACKAGES = ["flask", "flask_session", "pandas", "numpy", "matplotlib", "openai", "spotipy", "aiohttp", "dotenv"]
+
+IN_PROCESS = """
+import json, os, tempfile, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+client = flask_app.test_client()
+status = client.get("/").status_code
+first = time.perf_counter()
+from chart_cache import ChartCache
+app.chart_cache = ChartCache(tempfile.mkdtemp(dir=os.environ["BENCH_TMP"]))  # Never a cached PNG
+heavy = {}
+for route in ("/chart-data/genres", "/visualize-genres", "/summary", "/spotify-client-stats"):
+    route_start = time.perf_counter()
+    client.get(route)
+    heavy[route] = round((time.perf_counter() - route_start) * 1000, 1)
+print(json.dumps({"status": status, "import_sec": imported - start, "create_app_sec": created - imported,
+                  "first_response_sec": first - start, "first_heavy_routes_ms": heavy}))
+"""
+
+
+# Migrations are a one-off, not part of every start; a few plays give the chart routes real work
+SEED = """
+import db, schema
+schema.migrate()
+with db.transaction() as conn:
+    schema.insert_plays(conn, [(f"Song {i}", f"Artist {i % 7}", f"2024-03-0{1 + i % 9}T10:{i:02d}:00.000Z",
+                                ["pop", "rock", "jazz"][i % 3], f"artist-{i % 7}") for i in range(60)])
+"""
+
+
+def bench_env(tmp):
+    env = dict(os.environ)
+    env.update({"SPOTIFY_DB_PATH": os.path.join(tmp, "startup.db"), "DISABLE_BACKGROUND_JOBS": "1",
+                "CHART_RENDER_PROCESSES": "0", "BENCH_TMP": tmp})
+    for name, value in (("SPOTIFY_CLIENT_ID", "bench"), ("SPOTIFY_CLIENT_SECRET", "bench"),
+                        ("SPOTIFY_REDIRECT_URI", "http://localhost/callback")):
+        env.setdefault(name, value)
+    return env
+
+
+def import_breakdown(env, top=10):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        if cumulative_us.strip().isdigit():
+            cumulative[name.strip()] = int(cumulative_us) / 1000
+    slowest = sorted(((name, ms) for name, ms in cumulative.items() if name != "app"), key=lambda item: -item[1])
+    return {
+        "app_ms": round(cumulative.get("app", 0), 1),
+        "heavy_packages_ms": {name: round(cumulative[name], 1) for name in HEAVY_PACKAGES if name in cumulative},
+        "not_imported": [name for name in HEAVY_PACKAGES if name not in cumulative],
+        "slowest_modules_ms": {name: round(ms, 1) for name, ms in slowest[:top]},
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def flask_run_first_response(env, timeout=60):
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port)],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("flask run never answered")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-first-response", type=float, default=None,
+                        help="Fail (exit 1) if flask run takes longer than this many seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = bench_env(tmp)
+        subprocess.run([sys.executable, "-c", SEED], cwd=ROOT, env=env, capture_output=True, check=True)
+
+        in_process = []
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, "-c", IN_PROCESS], cwd=ROOT, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            in_process.append(json.loads(output.strip().splitlines()[-1]))
+        flask_run = [flask_run_first_response(env) for _ in range(args.runs)]
+        breakdown = import_breakdown(env)
+
+    results = {
+        "runs": args.runs,
+        "import_breakdown": breakdown,
+        "in_process": {key: round(statistics.median(run[key] for run in in_process), 3)
+                       for key in ("import_sec", "create_app_sec", "first_response_sec")},
+        "flask_run_first_response_sec": round(statistics.median(flask_run), 3),
+        "first_heavy_routes_ms": in_process[-1]["first_heavy_routes_ms"],
+    }
+    print(json.dumps(results, indent=2))
+    if args.max_first_response is not None and results["flask_run_first_response_sec"] > args.max_first_response:
+        print(f"❌ First response took {results['flask_run_first_response_sec']}s "
+              f"(budget {args.max_first_response}s)", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Many users syncing at once: one shared database (plays keyed by user_id) vs one SQLite shard per user.
+
+Every simulated user gets a seeded history, then threads run a shuffled mix of
+tasks, each one user's sync: a batch of new plays written in its own
+transaction, followed by that user's data_version + top-artists reads (what
+the chart routes do next). All users share the same play timestamps, so any
+row dropped by a (played_at) instead of (user_id, played_at) key shows up in
+the per-user counts. Reports per mode:
+  plays_per_sec - write throughput over the whole run
+  write         - p50 / p95 / max of a full write (wait + insert + commit)
+  lock_wait     - the wait part: pool checkout plus BEGIN IMMEDIATE
+  read          - p50 / p95 / max of the reads after each write
+  counts_ok     - every user ends up with exactly their own plays
+
+Usage: python benchmarks/bench_tenancy.py [--users 40] [--threads 16] [--batches 10] [--batch-size 50]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+import queries  # noqa: E402
+import schema  # noqa: E402
+from shards import ShardRouter  # noqa: E402
+
+ARTISTS = 300
+GENRES = ["pop", "rock", "jazz", "hip hop", "electronic", "metal", "k-pop", "classical"]
+
+
+def play_rows(user, start, count):
+    """(track_name, artist, played_at, genre, spotify_id) rows; the same timestamps for every user."""
+    rng = random.Random(f"{user}-{start}")
+    rows = []
+    for i in range(start, start + count):
+        artist = rng.randrange(ARTISTS)
+        played_at = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(1_700_000_000 + i * 180))
+        rows.append((f"Song {artist}-{rng.randrange(20)}", f"Artist {artist}", played_at,
+                     GENRES[artist % len(GENRES)], f"spotify-{artist}"))
+    return rows
+
+
+def summary(samples):
+    samples = sorted(samples)
+    # Inclusive: the default "exclusive" method extrapolates past the largest sample, so p95 could exceed max
+    cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {"p50_ms": round(cuts[49] * 1000, 2), "p95_ms": round(cuts[94] * 1000, 2),
+            "max_ms": round(samples[-1] * 1000, 2)}
+
+
+def run_mode(route, users, args):
+    """Seeds every user, then runs the concurrent sync workload through route(user) -> db_path."""
+    for user in users:
+        with db.transaction(route(user)) as conn:
+            schema.insert_plays(conn, play_rows(user, 0, args.history), user)
+
+    tasks = [(user, batch) for user in users for batch in range(args.batches)]
+    random.Random(7).shuffle(tasks)
+    writes, waits, reads = [], [], []
+
+    def sync(task):
+        user, batch = task
+        path = route(user)
+        rows = play_rows(user, args.history + batch * args.batch_size, args.batch_size)
+        start = time.perf_counter()
+        with db.connection(path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            locked = time.perf_counter()
+            schema.insert_plays(conn, rows, user)
+            conn.commit()
+        written = time.perf_counter()
+        queries.data_version(user, path)
+        queries.top_artists(10, user, path)
+        return written - start, locked - start, time.perf_counter() - written
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        for write, wait, read in pool.map(sync, tasks):
+            writes.append(write)
+            waits.append(wait)
+            reads.append(read)
+    elapsed = time.perf_counter() - start
+
+    expected = args.history + args.batches * args.batch_size
+    counts_ok = all(sum(count for _, count in queries.top_artists(ARTISTS, user, route(user))) == expected
+                    for user in users)
+    return {"elapsed_sec": round(elapsed, 3), "plays_per_sec": round(len(tasks) * args.batch_size / elapsed),
+            "write": summary(writes), "lock_wait": summary(waits), "read": summary(reads), "counts_ok": counts_ok}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--batches", type=int, default=10, help="Syncs per user")
+    parser.add_argument("--batch-size", type=int, default=50, help="New plays per sync")
+    parser.add_argument("--history", type=int, default=2000, help="Plays seeded per user beforehand")
+    args = parser.parse_args()
+
+    users = [f"user{i:04d}" for i in range(args.users)]
+    results = {"users": args.users, "threads": args.threads, "batches": args.batches,
+               "batch_size": args.batch_size, "history": args.history}
+    tmp = tempfile.mkdtemp()
+    try:
+        shared_db = os.path.join(tmp, "shared.db")
+        schema.migrate(shared_db)
+        results["shared"] = run_mode(lambda user: shared_db, users, args)
+        print("✅ shared done", file=sys.stderr)
+
+        router = ShardRouter(os.path.join(tmp, "shards"), max_open=max(args.users, 1))
+        results["sharded"] = run_mode(router.path, users, args)
+        print("✅ sharded done", file=sys.stderr)
+    finally:
+        shutil.rmtree(tmp)
+
+    results["throughput_ratio"] = round(results["sharded"]["plays_per_sec"] / results["shared"]["plays_per_sec"], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Compares two run_suite.py result files metric by metric.
+
+Numeric leaves are matched by path ("load.routes./visualize-history.p95_ms").
+The key's suffix says which way is better: *_ms / *_sec / *_us / *_mb are
+lower-is-better, *_per_sec higher-is-better; other numbers (counts, sizes)
+are listed only when they changed. A change past --threshold percent in the
+wrong direction is a regression, and the exit code is 1 if there is any.
+
+Usage: python benchmarks/compare_results.py old.json new.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+
+LOWER_IS_BETTER = ("_ms", "_sec", "_us", "_mb")
+HIGHER_IS_BETTER = ("_per_sec",)
+
+
+def flatten(tree, prefix=""):
+    values = {}
+    for key, value in tree.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+
+def direction(path):
+    """+1 if bigger is better, -1 if smaller is better, 0 if it's just a count."""
+    if path.endswith(HIGHER_IS_BETTER):
+        return 1
+    if path.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(old, new, threshold):
+    old_values, new_values = flatten(old["results"]), flatten(new["results"])
+    report = {"regressions": [], "improvements": [], "changed_counts": [], "unchanged": 0,
+              "only_in_old": sorted(old_values.keys() - new_values.keys()),
+              "only_in_new": sorted(new_values.keys() - old_values.keys()),
+              "args_differ": {key: [value, new["meta"]["args"].get(key)]
+                              for key, value in old["meta"]["args"].items()
+                              if key != "output" and new["meta"]["args"].get(key) != value}}
+    for path in sorted(old_values.keys() & new_values.keys()):
+        before, after = old_values[path], new_values[path]
+        change = (after - before) / before * 100 if before else (0.0 if after == before else float("inf"))
+        entry = {"metric": path, "old": before, "new": after, "change_pct": round(change, 1)}
+        sign = direction(path)
+        if sign == 0:
+            if after != before:
+                report["changed_counts"].append(entry)
+            else:
+                report["unchanged"] += 1
+        elif abs(change) < threshold:
+            report["unchanged"] += 1
+        elif change * sign > 0:
+            report["improvements"].append(entry)
+        else:
+            report["regressions"].append(entry)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10, help="percent change to report")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    report = compare(old, new, args.threshold)
+    report["old_commit"], report["new_commit"] = old["meta"].get("git_commit"), new["meta"].get("git_commit")
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Concurrent chart renders, each checked byte-for-byte against its own reference.
+
+Every simulated request gets different data (its own "user"), so a render that
+picked up another request's figure, or a torn PNG, shows up as a mismatch.
+References are rendered serially in this process first; the load then runs
+through ChartRenderer's process pool from many threads at once.
+
+Usage: python benchmarks/load_test_charts.py [--requests 64] [--threads 16] [--processes 4]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import charts  # noqa: E402
+from chart_cache import ChartCache  # noqa: E402
+from charts import ChartRenderer  # noqa: E402
+
+STYLES = {
+    "upload_top_artists": (charts.render_upload_top_artists, {"figsize": (10, 5), "color": "skyblue"}),
+    "history_top_artists": (charts.render_history_top_artists,
+                            {"figsize": (10, 5), "dpi": 100, "color": "purple", "facecolor": "#121212"}),
+    "genre_pie": (charts.render_genre_pie, {"figsize": (7, 7), "dpi": 100,
+                                            "font": os.path.join(ROOT, "fonts/Poppins-Regular.ttf"),
+                                            "small_slice_pct": 5}),
+}
+
+
+def make_requests(n, seed=7):
+    rng = random.Random(seed)
+    requests = []
+    for i in range(n):
+        chart = list(STYLES)[i % len(STYLES)]
+        prefix = "Genre" if chart == "genre_pie" else "Artist"
+        items = [(f"{prefix} {i}-{j}", rng.randint(1, 500)) for j in range(rng.randint(3, 10))]
+        requests.append((chart, sorted(items, key=lambda item: -item[1])))
+    return requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--cache-dir", default=None, help="also write each output through ChartCache here")
+    args = parser.parse_args()
+
+    requests = make_requests(args.requests)
+
+    start = time.perf_counter()
+    references = [STYLES[chart][0](items, STYLES[chart][1]) for chart, items in requests]
+    serial_elapsed = time.perf_counter() - start
+
+    renderer = ChartRenderer(processes=args.processes)
+    renderer.render(charts.render_upload_top_artists, [("warm-up", 1)], STYLES["upload_top_artists"][1])
+    cache = ChartCache(args.cache_dir) if args.cache_dir else None
+
+    def run(i):
+        chart, items = requests[i]
+        render_fn, style = STYLES[chart]
+        png = renderer.render(render_fn, items, style)
+        if cache is not None:
+            key = ChartCache.key(chart, {"request": i}, "load-test", style)
+            with open(cache.put(key, png), "rb") as f:
+                png = f.read()
+        return i, png
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        outputs = dict(pool.map(run, range(len(requests))))
+    concurrent_elapsed = time.perf_counter() - start
+    renderer.shutdown()
+
+    mismatches = [i for i, reference in enumerate(references) if outputs[i] != reference]
+    corrupt = [i for i, png in outputs.items() if not png.startswith(b"\x89PNG\r\n\x1a\n")]
+    print(json.dumps({
+        "requests": len(requests),
+        "threads": args.threads,
+        "processes": args.processes,
+        "serial_sec": round(serial_elapsed, 3),
+        "concurrent_sec": round(concurrent_elapsed, 3),
+        "renders_per_sec": round(len(requests) / concurrent_elapsed, 1),
+        "mismatches": mismatches,
+        "corrupt": corrupt,
+    }, indent=2))
+    sys.exit(1 if mismatches or corrupt else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""Offline benchmark suite: synthetic data, stub Spotify / OpenAI, one JSON result file.
+
+Nothing touches the real Spotify or OpenAI APIs. synthetic.py builds the
+listening history and the upload CSV, and stub_servers.py answers every
+external call with --latency and injected 429s (--throttle-every /
+--llm-throttle-every). Sections (pick with --only):
+  save_to_db            - recently-played batches through app.save_to_db
+  update_missing_genres - one pass over the synthetic artists stored as 'Unknown'
+  recommend             - POST /recommend on the uploaded CSV: the first query builds the vectors
+  visualize             - every /visualize* route: the first request renders, the rest find it cached
+  load                  - the app behind a threaded server in its own process; --users virtual
+                          users log in through /callback, then browse ROUTE_MIX for --duration
+
+Latencies are in ms (p50 / p95 / p99 / max), rates per second. The output is
+{"meta": ..., "results": ...}; compare two files with compare_results.py.
+
+Usage: python benchmarks/run_suite.py [--plays 100000] [--users 8] [--duration 20] [--output results.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic  # noqa: E402
+from stub_servers import start_stub_server, stub_env  # noqa: E402
+
+SECTIONS = ["save_to_db", "update_missing_genres", "recommend", "visualize", "load"]
+ROUTE_MIX = [("/visualize-history", 4), ("/visualize-genres", 3), ("/chart-data/top-artists", 4),
+             ("/chart-data/genres", 3), ("/chart-data/plays", 2), ("/listening-heatmap", 2),
+             ("/listening-trends", 2), ("/listening-streaks", 1), ("/spotify-top-artists", 2),
+             ("/local-recommendations", 1), ("/spotify-recommendations", 1), ("/update-data", 1)]
+
+SERVER = """
+import sys
+from werkzeug.serving import make_server
+import app
+
+server = make_server("127.0.0.1", int(sys.argv[1]), app.create_app(), threaded=True)
+print("ready", flush=True)
+server.serve_forever()
+"""
+
+
+def summarize(samples):
+    """Latency summary in ms for a list of durations in seconds."""
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2)
+
+    return {"n": len(samples), "p50_ms": round(statistics.median(ordered) * 1000, 2), "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+def stub_delta(server, before):
+    return {key: server.hits[key] - before[key] for key in server.hits}
+
+
+def logged_in(flask_app, user_id):
+    """Request context whose session holds a stub token, like after /callback."""
+    from flask import session
+
+    ctx = flask_app.test_request_context()
+    ctx.push()
+    session["token_info"] = {"access_token": f"token-{user_id}", "refresh_token": f"refresh-{user_id}",
+                             "expires_at": time.time() + 3600}
+    session["spotify_user_id"] = user_id
+    return ctx
+
+
+def bench_save_to_db(app, flask_app, server, args):
+    batches = synthetic.recently_played_batches(args.batches, args.batch_size)
+    before = dict(server.hits)
+    samples, stages = [], {"resolve_sec": 0.0, "insert_sec": 0.0, "rows_inserted": 0}
+    ctx = logged_in(flask_app, "bench-sync")
+    try:
+        start = time.perf_counter()
+        for batch in batches:
+            batch_start = time.perf_counter()
+            _, stats = app.save_to_db(batch)
+            samples.append(time.perf_counter() - batch_start)
+            for key in stages:
+                stages[key] += stats.get(key, 0)
+        elapsed = time.perf_counter() - start
+    finally:
+        ctx.pop()
+    return {"batches": len(batches), "batch_size": args.batch_size, **summarize(samples),
+            "plays_per_sec": round(len(batches) * args.batch_size / elapsed, 1),
+            "resolve_sec": round(stages["resolve_sec"], 3), "insert_sec": round(stages["insert_sec"], 3),
+            "rows_inserted": stages["rows_inserted"], "stub": stub_delta(server, before)}
+
+
+def bench_update_missing_genres(app, flask_app, server, args):
+    db_path = os.environ["SPOTIFY_DB_PATH"]
+
+    def missing():
+        with app.db.connection(db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM artists WHERE genre IS NULL OR genre = 'Unknown'").fetchone()[0]
+
+    artists = missing()
+    before = dict(server.hits)
+    ctx = logged_in(flask_app, "")  # The synthetic history belongs to the pre-login user
+    try:
+        start = time.perf_counter()
+        app.update_missing_genres()
+        elapsed = time.perf_counter() - start
+    finally:
+        ctx.pop()
+    return {"artists": artists, "elapsed_sec": round(elapsed, 3), "artists_per_sec": round(artists / elapsed, 1),
+            "still_missing": missing(), "stub": stub_delta(server, before)}
+
+
+def upload(app, client, csv_path):
+    start = time.perf_counter()
+    with open(csv_path, "rb") as f:
+        response = client.post("/upload", data={"file": (f, "upload.csv")}, content_type="multipart/form-data")
+    job_id = response.get_json()["job_id"]
+    while app.ingest_runner.get(job_id)["status"] not in ("done", "failed", "cancelled"):
+        time.sleep(0.05)
+    assert app.ingest_runner.get(job_id)["status"] == "done", app.ingest_runner.get(job_id)["error"]
+    return time.perf_counter() - start
+
+
+def make_queries(csv_path, n, seed=5):
+    """Artist and track names from the upload, a third of them with one letter changed."""
+    import pandas as pd
+
+    frame = pd.read_csv(csv_path, usecols=["artist", "track_name"], nrows=20_000)
+    rng = random.Random(seed)
+    queries = []
+    for i in range(n):
+        query = str(frame["artist" if i % 2 else "track_name"].iloc[rng.randrange(len(frame))])
+        if i % 3 == 0:
+            j = rng.randrange(len(query))
+            query = query[:j] + rng.choice("aeiou") + query[j + 1:]
+        queries.append(query)
+    return queries
+
+
+def bench_recommend(app, client, args, csv_path):
+    queries = make_queries(csv_path, args.queries + 1)
+    samples, empty = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        response = client.post("/recommend", json={"query": query})
+        samples.append(time.perf_counter() - start)
+        empty += not isinstance(response.get_json(), list)
+    return {"first_ms": round(samples[0] * 1000, 2), "warm": summarize(samples[1:]), "no_match": empty}
+
+
+def bench_visualize(flask_app, client, args):
+    routes = sorted(rule.rule for rule in flask_app.url_map.iter_rules() if rule.rule.startswith("/visualize"))
+    results = {}
+    for route in routes:
+        samples, errors = [], 0
+        for _ in range(args.repeat + 1):
+            start = time.perf_counter()
+            response = client.get(route)
+            samples.append(time.perf_counter() - start)
+            errors += response.status_code != 200 or "image_url" not in response.get_json()
+        results[route] = {"first_ms": round(samples[0] * 1000, 2), "warm": summarize(samples[1:]), "errors": errors}
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def external_calls(metrics_text):
+    """{"service/operation/outcome": count} from the app's /metrics."""
+    calls = {}
+    for line in metrics_text.splitlines():
+        if line.startswith("external_call_duration_seconds_count{"):
+            labels = dict(part.split("=", 1) for part in line[line.index("{") + 1:line.index("}")].split(","))
+            key = "/".join(labels[name].strip('"') for name in ("service", "operation", "outcome"))
+            calls[key] = int(float(line.rsplit(" ", 1)[1]))
+    return calls
+
+
+def virtual_user(base_url, index, deadline, seed, record):
+    import requests
+
+    rng = random.Random(seed + index)
+    routes, weights = zip(*ROUTE_MIX)
+    with requests.Session() as http:
+        start = time.perf_counter()
+        try:
+            status = http.get(f"{base_url}/callback", params={"code": f"vu-{index}"}, allow_redirects=False,
+                              timeout=120).status_code
+        except requests.RequestException:
+            status = "error"
+        record("/callback", time.perf_counter() - start, status)
+        while time.monotonic() < deadline:
+            route = rng.choices(routes, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = http.get(base_url + route, timeout=120).status_code
+            except requests.RequestException:
+                status = "error"
+            record(route, time.perf_counter() - start, status)
+
+
+def bench_load(server, args, env, workdir):
+    import requests
+
+    port = free_port()
+    process = subprocess.Popen([sys.executable, "-c", SERVER, str(port)], cwd=workdir, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        assert process.stdout.readline().strip() == "ready", "server did not start"
+        base_url = f"http://127.0.0.1:{port}"
+        samples, statuses, lock = {}, {}, threading.Lock()
+
+        def record(route, seconds, status):
+            with lock:
+                samples.setdefault(route, []).append(seconds)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        before = dict(server.hits)
+        start = time.perf_counter()
+        deadline = time.monotonic() + args.duration
+        users = [threading.Thread(target=virtual_user, args=(base_url, i, deadline, args.seed, record))
+                 for i in range(args.users)]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.perf_counter() - start
+        metrics_text = requests.get(f"{base_url}/metrics", timeout=30).text
+    finally:
+        process.terminate()
+        process.wait()
+
+    requests_made = sum(len(route_samples) for route_samples in samples.values())
+    errors = sum(count for status, count in statuses.items() if status == "error" or status.startswith("5"))
+    return {"users": args.users, "duration": round(elapsed, 2), "requests": requests_made,
+            "requests_per_sec": round(requests_made / elapsed, 1), "errors": errors, "status_counts": statuses,
+            "overall": summarize([s for route_samples in samples.values() for s in route_samples]),
+            "routes": {route: summarize(route_samples) for route, route_samples in sorted(samples.items())},
+            "stub": stub_delta(server, before), "app_external_calls": external_calls(metrics_text)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args, server, env, tmp, results):
+    """Builds the data in `tmp`, then fills `results` section by section."""
+    start = time.perf_counter()
+    results["data"] = synthetic.make_history_db(env["SPOTIFY_DB_PATH"], args.plays, seed=args.seed)
+    csv_path = os.path.join(tmp, "upload.csv")
+    synthetic.write_upload_csv(csv_path, args.csv_rows)
+    results["data"]["csv_rows"] = args.csv_rows
+    print(f"✅ Synthetic data ready in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    os.symlink(os.path.join(ROOT, "fonts"), os.path.join(tmp, "fonts"))
+    os.chdir(tmp)  # uploads/, datasets/, chart_cache/ ... stay out of the repo
+    import app
+
+    flask_app = app.create_app({"SESSION_FILE_DIR": os.path.join(tmp, "flask_session")})
+    client = flask_app.test_client()
+    for section in SECTIONS:
+        if section not in args.only:
+            continue
+        section_start = time.perf_counter()
+        if section == "save_to_db":
+            results[section] = bench_save_to_db(app, flask_app, server, args)
+        elif section == "update_missing_genres":
+            results[section] = bench_update_missing_genres(app, flask_app, server, args)
+        elif section == "recommend":
+            results[section] = {"upload_sec": round(upload(app, client, csv_path), 3),
+                                **bench_recommend(app, client, args, csv_path)}
+        elif section == "visualize":
+            if "recommend" not in args.only:
+                upload(app, client, csv_path)  # /visualize charts the upload
+            results[section] = bench_visualize(flask_app, client, args)
+        elif section == "load":
+            app.chart_renderer.shutdown()  # Free the render processes for the server's own
+            results[section] = bench_load(server, args, env, tmp)
+        print(f"✅ {section} done in {time.perf_counter() - section_start:.1f}s", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", nargs="+", choices=SECTIONS, default=SECTIONS)
+    parser.add_argument("--plays", type=int, default=100_000, help="synthetic history size (10k - 10M)")
+    parser.add_argument("--csv-rows", type=int, default=50_000, help="rows in the uploaded CSV")
+    parser.add_argument("--batches", type=int, default=20, help="save_to_db batches")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=50, help="/recommend queries")
+    parser.add_argument("--repeat", type=int, default=20, help="warm requests per /visualize* route")
+    parser.add_argument("--users", type=int, default=8, help="virtual users in the load test")
+    parser.add_argument("--duration", type=float, default=20, help="load test seconds")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub Spotify latency (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub OpenAI latency (s)")
+    parser.add_argument("--throttle-every", type=int, default=25, help="every Nth Spotify call gets a 429")
+    parser.add_argument("--llm-throttle-every", type=int, default=10, help="every Nth OpenAI call gets a 429")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the JSON here")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    server, base_url = start_stub_server(args.latency, args.throttle_every, llm_latency=args.llm_latency,
+                                         llm_throttle_every=args.llm_throttle_every, recent_plays=200)
+    env = {**os.environ, **stub_env(base_url), "SPOTIFY_DB_PATH": os.path.join(tmp, "bench.db"),
+           "DISABLE_BACKGROUND_JOBS": "1", "LOG_LEVEL": "WARNING", "SPOTIFY_CLIENT_ID": "bench",
+           "SPOTIFY_CLIENT_SECRET": "bench", "SPOTIFY_REDIRECT_URI": "http://localhost/callback",
+           "PYTHONPATH": ROOT}
+    os.environ.update(env)
+    results = {}
+    try:
+        with contextlib.redirect_stdout(sys.stderr):  # Migration messages etc.; only the JSON goes to stdout
+            run(args, server, env, tmp, results)
+    finally:
+        os.chdir(ROOT)
+        server.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    output = {"meta": {"git_commit": git_commit(), "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "cpu_count": os.cpu_count(), "args": vars(args)},
+              "results": results}
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Local stand-ins for the Spotify Web API and the OpenAI chat endpoint.
+
+Only the endpoints app.py touches are implemented, plus the OAuth token
+endpoint so /callback works offline. Responses are deterministic (derived
+from a hash of the artist name/ID) so runs are comparable. With
+`throttle_every=N` every Nth Spotify request gets a 429 with `Retry-After`;
+`llm_throttle_every` does the same for the chat endpoint. With
+`recent_plays=N` every user has N plays for recently-played to page through.
+
+Run it on its own to use the app without Spotify or OpenAI:
+  python benchmarks/stub_servers.py --port 8765 --latency 0.05 --throttle-every 20
+and export the variables it prints before starting the app.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+RECENT_PLAYS_START_MS = 1_704_067_200_000  # 2024-01-01 UTC
+RECENT_PLAY_GAP_MS = 180_000
+
+GENRES = ["pop", "rap", "rock", "r&b", "indie", "edm", "jazz", "country", "latin", "metal"]
+
+
+def _bucket(key):
+    return int(hashlib.md5(key.encode()).hexdigest(), 16)
+
+
+def fake_artist(artist_id, name=None):
+    """Every 5th artist has no Spotify genres so the LLM fallback gets exercised."""
+    h = _bucket(artist_id)
+    return {
+        "id": artist_id,
+        "name": name or f"Artist {artist_id}",
+        "genres": [] if h % 5 == 0 else [GENRES[h % len(GENRES)]],
+    }
+
+
+def fake_genre(prompt):
+    return GENRES[_bucket(prompt) % len(GENRES)].replace("&", "n").title()
+
+
+def fake_track(i):
+    artist = fake_artist(f"{_bucket(str(i)) % 500:022d}")
+    return {"id": f"{i:022d}", "name": f"Track {i}", "artists": [{"id": artist["id"], "name": artist["name"]}]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+    disable_nagle_algorithm = True  # Headers and body are separate writes; don't stall on delayed ACKs
+    latency = 0.0  # seconds added to every response
+    llm_latency = None  # chat endpoint latency (None = same as `latency`)
+    throttle_every = 0  # every Nth Spotify request answers 429 (0 = never)
+    llm_throttle_every = 0  # every Nth chat request answers 429 (0 = never)
+    retry_after = 1
+    recent_plays = 0  # plays each user has in recently-played
+    hits = None  # {"requests", "throttled", "llm_requests", "llm_throttled"}, shared by the server's handlers
+    hits_lock = None
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def _send(self, payload, status=200, headers=None, latency=None):
+        time.sleep(self.latency if latency is None else latency)
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _throttled(self, counter="requests", every=None):
+        every = self.throttle_every if every is None else every
+        with self.hits_lock:
+            self.hits[counter] += 1
+            throttle = every and self.hits[counter] % every == 0
+            self.hits[counter.replace("requests", "throttled")] += bool(throttle)
+        if throttle:
+            self._send({"error": {"status": 429, "message": "API rate limit exceeded"}}, status=429,
+                       headers={"Retry-After": str(self.retry_after)})
+        return throttle
+
+    def _user(self):
+        """Stub user ID derived from the bearer token."""
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        return f"user-{_bucket(token) % 10 ** 8:08d}"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.rstrip("/")  # spotipy requests "artists/?ids=..."
+        query = parse_qs(url.query)
+        if self._throttled():
+            return
+
+        if path == "/v1/search":
+            name = query.get("q", [""])[0]
+            self._send({"artists": {"items": [fake_artist(f"id-{name}", name)]}})
+        elif path == "/v1/artists":
+            ids = query.get("ids", [""])[0].split(",")
+            self._send({"artists": [fake_artist(artist_id) for artist_id in ids]})
+        elif path.startswith("/v1/artists/"):
+            self._send(fake_artist(path.rsplit("/", 1)[1]))
+        elif path == "/v1/me":
+            self._send({"id": self._user(), "display_name": "Stub User"})
+        elif path == "/v1/me/top/artists":
+            # Different users (tokens) get different top artists, so cache leaks would show
+            limit = int(query.get("limit", ["20"])[0])
+            user = _bucket(self._user())
+            self._send({"items": [fake_artist(f"{(user + i) % 10 ** 22:022d}") for i in range(limit)]})
+        elif path == "/v1/me/player/recently-played":
+            self._send(self._recently_played(int(query.get("limit", ["20"])[0]), query.get("after", [None])[0]))
+        elif path == "/v1/recommendations":
+            limit = int(query.get("limit", ["20"])[0])
+            self._send({"tracks": [fake_track(i) for i in range(limit)]})
+        else:
+            self._send({"error": {"status": 404, "message": "Not found"}}, status=404)
+
+    def _recently_played(self, limit, after):
+        """The user's plays newer than `after` (oldest first), else their latest; returned newest first."""
+        user = self._user()
+        times = range(RECENT_PLAYS_START_MS, RECENT_PLAYS_START_MS + self.recent_plays * RECENT_PLAY_GAP_MS,
+                      RECENT_PLAY_GAP_MS)
+        if after is None:
+            window = times[-limit:]
+        else:
+            first = max(0, (int(after) - RECENT_PLAYS_START_MS) // RECENT_PLAY_GAP_MS + 1)
+            window = times[first:first + limit]
+        items = [{"played_at": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(ms / 1000)),
+                  "track": fake_track(_bucket(f"{user}-{ms}") % 5000)} for ms in reversed(window)]
+        cursors = {"after": str(window[-1]), "before": str(window[0])} if window else None
+        return {"items": items, "cursors": cursors}
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.rstrip("/")
+        if path == "/api/token":
+            form = {key: values[0] for key, values in parse_qs(raw.decode()).items()}
+            code = form.get("code") or form.get("refresh_token", "").removeprefix("refresh-")
+            self._send({"access_token": f"token-{code}", "token_type": "Bearer", "expires_in": 3600,
+                        "refresh_token": f"refresh-{code}", "scope": "user-top-read user-read-recently-played"})
+        elif path == "/v1/chat/completions":
+            if self._throttled("llm_requests", self.llm_throttle_every):
+                return
+            prompt = json.loads(raw or b"{}")["messages"][-1]["content"]
+            if "JSON object" in prompt:
+                # BatchGenreClassifier: a JSON list of artists after the first line
+                artists = json.loads(prompt.split("\n", 1)[1])
+                content = json.dumps({artist: fake_genre(artist) for artist in artists})
+            else:
+                content = fake_genre(prompt)
+            self._send({"choices": [{"message": {"role": "assistant", "content": content}}]}, latency=self.llm_latency)
+        else:
+            self._send({"error": {"message": "Not found"}}, status=404)
+
+
+def start_stub_server(latency=0.0, throttle_every=0, retry_after=1, llm_latency=None, llm_throttle_every=0,
+                      recent_plays=0, port=0):
+    """Starts the stub server (on a free port unless `port` is given) and returns (server, base_url).
+
+    `server.hits` counts Spotify and chat requests and how many of each were answered with 429.
+    """
+    hits = {"requests": 0, "throttled": 0, "llm_requests": 0, "llm_throttled": 0}
+    handler = type("Handler", (StubHandler,), {"latency": latency, "llm_latency": llm_latency,
+                                               "throttle_every": throttle_every,
+                                               "llm_throttle_every": llm_throttle_every,
+                                               "retry_after": retry_after, "recent_plays": recent_plays,
+                                               "hits": hits, "hits_lock": threading.Lock()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.hits = hits
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def stub_spotify(base_url):
+    """Returns a spotipy client pointed at the stub server."""
+    import spotipy
+
+    sp = spotipy.Spotify(auth="stub-token", retries=0)
+    sp.prefix = f"{base_url}/v1/"
+    return sp
+
+
+def stub_spotify_client(base_url, **kwargs):
+    """Returns a SpotifyClient (the app's shared client) pointed at the stub server."""
+    from spotify_client import SpotifyClient
+
+    return SpotifyClient(base_url=f"{base_url}/v1/", **kwargs)
+
+
+def stub_llm(base_url):
+    """Returns a get_genre-style function that calls the stub chat endpoint."""
+    import openai
+
+    openai.api_key = "stub-key"
+    openai.api_base = f"{base_url}/v1"
+
+    def lookup(artist_name):
+        response = openai.ChatCompletion.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": f"Provide only the primary genre of {artist_name} in one word."}],
+            max_tokens=3,
+            temperature=0
+        )
+        return response["choices"][0]["message"]["content"].strip()
+
+    return lookup
+
+
+def stub_env(base_url):
+    """Environment that points the app (SpotifyClient, openai, and the OAuth token URL) at the stub server."""
+    return {"SPOTIFY_API_BASE": f"{base_url}/v1/", "OPENAI_API_BASE": f"{base_url}/v1",
+            "OPENAI_API_KEY": "stub-key", "SPOTIFY_ACCOUNTS_BASE": base_url}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=None)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument("--llm-throttle-every", type=int, default=0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--recent-plays", type=int, default=200)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.latency, args.throttle_every, args.retry_after, args.llm_latency,
+                                         args.llm_throttle_every, args.recent_plays, args.port)
+    for name, value in stub_env(base_url).items():
+        print(f"export {name}={value}")
+    print(f"🧪 Stub Spotify / OpenAI listening on {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
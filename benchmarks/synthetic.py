@@ -0,0 +1,250 @@
+"""Synthetic listening history for the benchmarks, from 10k to 10M plays.
+
+The distributions are shaped like real Spotify data, so caches, indexes and
+GROUP BYs see realistic skew:
+  artists  - Zipf popularity (a few artists get most plays, a long tail gets a few)
+  genres   - weighted toward pop / hip hop / rock; `missing_genre_rate` of the
+             artists are stored as 'Unknown' for update_missing_genres to fill
+  tracks   - log-normal count per artist; plays favour each artist's first tracks
+  time     - spread over `days`, weighted by hour of day, and consecutive plays
+             often repeat the artist (listening sessions)
+  details  - ms_played, skips, shuffle, platform and reasons, like extended exports
+
+Everything is derived from `seed`, so two runs with the same arguments
+produce the same database.
+
+Usage: python benchmarks/synthetic.py out.db [--plays 1000000] [--users 1] [--csv upload.csv --rows 50000]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+import rollups  # noqa: E402
+import schema  # noqa: E402
+
+GENRE_WEIGHTS = {"pop": 24, "hip hop": 18, "rock": 12, "soul": 9, "indie": 8, "electronic": 7, "latin": 6,
+                 "country": 5, "k-pop": 3, "jazz": 3, "metal": 3, "classical": 2}
+# Share of plays per UTC hour: quiet nights, a commute bump, busiest in the evening
+HOUR_WEIGHTS = [2, 1, 1, 1, 1, 2, 3, 5, 6, 5, 5, 5, 6, 5, 5, 5, 6, 7, 7, 7, 7, 6, 5, 3]
+PLATFORMS = ["android", "ios", "windows", "osx", "web_player", "cast"]
+REASONS_START = ["trackdone", "clickrow", "fwdbtn", "playbtn", "appload"]
+REASONS_END = ["trackdone", "fwdbtn", "endplay", "logout"]
+SYLLABLES = ["ka", "lo", "mi", "ra", "ven", "tor", "el", "sa", "no", "qui", "ber", "da", "fy", "zu", "an", "ge",
+             "lux", "mo", "ri", "sol"]
+START_MS = 1_577_836_800_000  # 2020-01-01 UTC
+MS_PER_DAY = 86_400_000
+CHUNK_PLAYS = 500_000
+
+
+def word(n, parts=2):
+    """A pronounceable word that is unique for each n >= 0."""
+    syllables = []
+    while n or len(syllables) < parts:
+        n, digit = divmod(n, len(SYLLABLES))
+        syllables.append(SYLLABLES[digit])
+    return "".join(syllables).capitalize()
+
+
+def artist_name(i):
+    return f"The {word(i)}s" if i % 7 == 3 else f"{word(i * 37 + 11)} {word(i)}"
+
+
+def spotify_id(i):
+    return f"{i:022d}"  # Same shape as the stub server's IDs
+
+
+class Catalog:
+    """Artists and tracks with their popularity; row i of each array is artist / track i."""
+
+    def __init__(self, n_artists, seed=42, missing_genre_rate=0.1, zipf=1.07):
+        rng = np.random.default_rng(seed)
+        self.n_artists = n_artists
+        weights = 1.0 / np.arange(1, n_artists + 1) ** zipf
+        self.artist_cum_weights = np.cumsum(weights) / weights.sum()
+
+        genres = list(GENRE_WEIGHTS)
+        genre_p = np.array(list(GENRE_WEIGHTS.values()), dtype=float)
+        self.artist_genres = [genres[g] for g in rng.choice(len(genres), n_artists, p=genre_p / genre_p.sum())]
+        for i in np.flatnonzero(rng.random(n_artists) < missing_genre_rate):
+            self.artist_genres[i] = "Unknown"
+
+        self.tracks_per_artist = np.clip(rng.lognormal(2.2, 0.8, n_artists).astype(np.int64), 1, 200)
+        self.first_track = np.concatenate(([0], np.cumsum(self.tracks_per_artist)[:-1]))
+        self.n_tracks = int(self.tracks_per_artist.sum())
+        self.track_artist = np.repeat(np.arange(n_artists), self.tracks_per_artist)
+        self.track_duration = np.clip(rng.normal(210_000, 50_000, self.n_tracks), 30_000, 600_000).astype(np.int64)
+
+    def track_name(self, track):
+        artist = int(self.track_artist[track])
+        return word((track - int(self.first_track[artist])) * len(SYLLABLES) + artist % len(SYLLABLES), parts=3)
+
+    def artist_rows(self):
+        return ((i, artist_name(i), spotify_id(i), self.artist_genres[i]) for i in range(self.n_artists))
+
+    def track_rows(self):
+        return ((track, int(self.track_artist[track]), self.track_name(track)) for track in range(self.n_tracks))
+
+    def sample_plays(self, n, start_ms, span_ms, rng, session_repeat=0.55):
+        """n plays in [start_ms, start_ms + span_ms), sorted by time: dict of equal-length arrays."""
+        days = rng.integers(0, max(1, span_ms // MS_PER_DAY), n)
+        hour_p = np.array(HOUR_WEIGHTS, dtype=float)
+        hours = rng.choice(24, n, p=hour_p / hour_p.sum())
+        played_at = start_ms + days * MS_PER_DAY + hours * 3_600_000 + rng.integers(0, 3_600_000, n)
+        played_at = np.unique(played_at)  # Sorted; a same-millisecond collision just drops a play
+
+        n = len(played_at)
+        artists = np.searchsorted(self.artist_cum_weights, rng.random(n))
+        # Sessions: most plays keep the previous play's artist
+        new_pick = rng.random(n) >= session_repeat
+        new_pick[0] = True
+        artists = artists[np.maximum.accumulate(np.where(new_pick, np.arange(n), 0))]
+        # Within an artist, plays favour their first (best known) tracks
+        offsets = (self.tracks_per_artist[artists] * rng.random(n) ** 2.5).astype(np.int64)
+        tracks = self.first_track[artists] + offsets
+
+        skipped = rng.random(n) < 0.22
+        duration = self.track_duration[tracks]
+        ms_played = np.where(skipped, (duration * rng.uniform(0.02, 0.5, n)).astype(np.int64), duration)
+        return {"played_at": played_at, "artist": artists, "track": tracks, "ms_played": ms_played,
+                "skipped": skipped.astype(np.int64), "shuffle": (rng.random(n) < 0.5).astype(np.int64),
+                "platform": rng.integers(0, len(PLATFORMS), n), "reason_start": rng.integers(0, len(REASONS_START), n),
+                "reason_end": np.where(skipped, 1, rng.integers(0, len(REASONS_END), n))}
+
+    def play_chunks(self, n_plays, days, seed, chunk=CHUNK_PLAYS):
+        """Yields sample_plays() dicts covering `days` in consecutive windows of about `chunk` plays."""
+        rng = np.random.default_rng(seed)
+        windows = max(1, -(-n_plays // chunk))
+        span = days * MS_PER_DAY // windows
+        for w in range(windows):
+            count = n_plays // windows + (w < n_plays % windows)
+            yield self.sample_plays(count, START_MS + w * span, span, rng)
+
+
+def default_artists(n_plays):
+    """Roughly how catalog size grows with history length (~1 new artist per 40 plays, capped)."""
+    return int(min(max(200, n_plays // 40), 200_000))
+
+
+def make_history_db(path, n_plays, users=1, n_artists=None, days=3 * 365, seed=42, missing_genre_rate=0.1,
+                    build_rollups=True):
+    """Creates (or extends) a migrated database with `n_plays` split across `users`. Returns a summary dict.
+
+    User 0 is the pre-login user (LEGACY_USER_ID), so routes without a session
+    see the data; the others are "user-0001", ... The rollups are caught up
+    unless `build_rollups` is False.
+    """
+    start = time.perf_counter()
+    schema.migrate(path)
+    db.get_pool(path).close_all()
+    catalog = Catalog(n_artists or default_artists(n_plays), seed, missing_genre_rate)
+    user_ids = [schema.LEGACY_USER_ID] + [f"user-{i:04d}" for i in range(1, users)]
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")  # A generated file: if this crashes, generate again
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO artists (id, name, spotify_id, genre) VALUES (?, ?, ?, ?)",
+                         catalog.artist_rows())
+        conn.executemany("INSERT OR IGNORE INTO tracks (id, artist_id, name) VALUES (?, ?, ?)", catalog.track_rows())
+
+    inserted = 0
+    for u, user_id in enumerate(user_ids):
+        user_plays = n_plays // users + (u < n_plays % users)
+        for plays in catalog.play_chunks(user_plays, days, seed + u):
+            rows = zip([user_id] * len(plays["played_at"]), plays["track"].tolist(), plays["artist"].tolist(),
+                       plays["played_at"].tolist(), plays["ms_played"].tolist(),
+                       [PLATFORMS[i] for i in plays["platform"]], plays["skipped"].tolist(),
+                       plays["shuffle"].tolist(), [REASONS_START[i] for i in plays["reason_start"]],
+                       [REASONS_END[i] for i in plays["reason_end"]])
+            with conn:
+                before = conn.total_changes
+                conn.executemany(
+                    f"""INSERT OR IGNORE INTO plays (user_id, track_id, artist_id, played_at,
+                            {", ".join(column for column, _ in schema.PLAY_DETAIL_COLUMNS)})
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+                added = conn.total_changes - before
+                schema.bump_plays_version(conn, user_id, added)
+            inserted += added
+    conn.close()
+
+    if build_rollups:
+        rollups.catch_up(db_path=path)
+    db.get_pool(path).close_all()
+    return {"plays": inserted, "users": users, "artists": catalog.n_artists, "tracks": catalog.n_tracks,
+            "missing_genre_artists": catalog.artist_genres.count("Unknown"),
+            "seconds": round(time.perf_counter() - start, 2)}
+
+
+def write_upload_csv(path, n_rows, n_artists=None, seed=7):
+    """A CSV in the shape /upload accepts (artist, track_name, genre, duration_ms, popularity, played_at)."""
+    import pandas as pd
+
+    catalog = Catalog(n_artists or default_artists(n_rows), seed, missing_genre_rate=0.05)
+    names = [artist_name(i) for i in range(catalog.n_artists)]
+    popularity = np.clip(100 - np.log1p(np.arange(catalog.n_artists)) * 9, 0, 100).astype(np.int64)
+    header = True
+    for plays in catalog.play_chunks(n_rows, days=365, seed=seed):
+        frame = pd.DataFrame({
+            "artist": [names[a] for a in plays["artist"]],
+            "track_name": [catalog.track_name(t) for t in plays["track"]],
+            "genre": [catalog.artist_genres[a] for a in plays["artist"]],
+            "duration_ms": catalog.track_duration[plays["track"]],
+            "popularity": popularity[plays["artist"]],
+            "played_at": pd.to_datetime(plays["played_at"], unit="ms", utc=True).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        })
+        frame.to_csv(path, mode="w" if header else "a", header=header, index=False)
+        header = False
+    return catalog
+
+
+def recently_played_batches(n_batches, batch_size=50, n_artists=2000, new_artist_offset=10_000_000, seed=11):
+    """Batches of save_to_db input rows, like successive recently-played syncs.
+
+    Artists are drawn from a Zipf-popular pool, so later batches mostly repeat
+    artists already stored; their IDs start at `new_artist_offset` so they are
+    new to a database from make_history_db.
+    """
+    catalog = Catalog(n_artists, seed)
+    batches = []
+    for plays in catalog.play_chunks(n_batches * batch_size, days=max(1, n_batches), seed=seed, chunk=batch_size):
+        batches.append([{
+            "track_name": catalog.track_name(int(track)),
+            "artist": artist_name(int(artist) + new_artist_offset),
+            "played_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(played_at // 1000)) + f".{played_at % 1000:03d}Z",
+            "artist_id": spotify_id(int(artist) + new_artist_offset),
+        } for played_at, artist, track in zip(plays["played_at"].tolist(), plays["artist"], plays["track"])])
+    return batches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("db")
+    parser.add_argument("--plays", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--artists", type=int, default=None, help="default: grows with --plays")
+    parser.add_argument("--days", type=int, default=3 * 365)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-rollups", action="store_true")
+    parser.add_argument("--csv", help="also write an /upload CSV here")
+    parser.add_argument("--rows", type=int, default=50_000, help="rows in --csv")
+    args = parser.parse_args()
+
+    summary = make_history_db(args.db, args.plays, args.users, args.artists, args.days, args.seed,
+                              build_rollups=not args.no_rollups)
+    if args.csv:
+        write_upload_csv(args.csv, args.rows)
+        summary["csv_rows"] = args.rows
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
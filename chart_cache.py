@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+CHART_CACHE_DIR = "chart_cache"
+CHART_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+
+class ChartCache:
+    """Content-addressed store for rendered chart PNGs.
+
+    The key hashes everything that affects the picture: chart type, query
+    parameters, data version and style options. New plays or genre updates
+    change the data version and therefore the key, so stale charts are never
+    served; they simply stop being read and age out. Entries are evicted
+    least-recently-used first once the directory exceeds `max_bytes`.
+    """
+
+    def __init__(self, directory=CHART_CACHE_DIR, max_bytes=CHART_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def key(chart, params, data_version, style):
+        payload = json.dumps([chart, params, data_version, style], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        """Returns the cached file's path (marking it recently used), or None."""
+        path = self.path(key)
+        try:
+            stat = os.stat(path)
+            os.utime(path, (time.time(), stat.st_mtime))  # atime = last use, mtime = render time
+        except FileNotFoundError:
+            with self.lock:
+                self.counters["misses"] += 1
+            return None
+        with self.lock:
+            self.counters["hits"] += 1
+        return path
+
+    def put(self, key, png_bytes):
+        """Atomically writes a rendered PNG and evicts old entries if over budget."""
+        os.makedirs(self.directory, exist_ok=True)  # Here rather than in __init__, which runs at import
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(png_bytes)
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+        return self.path(key)
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".png"):
+                stat = entry.stat()
+                entries.append((stat.st_atime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self.lock:
+                self.counters["evictions"] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
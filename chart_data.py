@@ -0,0 +1,74 @@
+"""Chart data for client-side rendering: only the aggregated numbers, as compact JSON.
+
+static/script.js draws these as SVG in the browser, so a chart view costs the
+server one small aggregation instead of a matplotlib render and a
+multi-hundred-KB PNG. Payloads are columnar (parallel lists) to keep them
+small. Encoded bodies are cached by key (chart, params and data version, like
+ChartCache) in plain and gzipped form, and the key doubles as the ETag, so
+repeat views revalidate with a 304 and an empty body.
+"""
+import gzip
+import json
+import threading
+from collections import OrderedDict
+
+CHART_DATA_MAX_ENTRIES = 256
+MIN_GZIP_BYTES = 256  # Below this gzip's header costs more than it saves
+SMALL_SLICE_PCT = 5
+
+
+def bar_series(items):
+    """[(label, value)] -> {"labels": [...], "values": [...]}."""
+    items = list(items)  # May be a one-shot iterator, e.g. Series.items()
+    return {"labels": [label for label, _ in items], "values": [int(value) for _, value in items]}
+
+
+def genre_shares(items, small_slice_pct=SMALL_SLICE_PCT):
+    """Pie data with the same small-slice rule as charts.render_genre_pie.
+
+    Every slice is drawn, but only the first `labeled` get a label on the pie;
+    the rest (under small_slice_pct) are listed beside it. Items arrive most
+    played first, so the small slices are always a suffix.
+    """
+    total = sum(count for _, count in items)
+    pct = [round(count * 100 / total, 1) if total else 0.0 for _, count in items]
+    labeled = next((i for i, share in enumerate(pct) if share < small_slice_pct), len(pct))
+    return {"labels": [genre for genre, _ in items], "values": [int(count) for _, count in items],
+            "pct": pct, "labeled": labeled, "total": int(total)}
+
+
+class ChartDataCache:
+    """LRU of encoded chart-data bodies: key -> (json bytes, gzipped bytes or None)."""
+
+    def __init__(self, max_entries=CHART_DATA_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0, "bytes_sent": 0}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            self.counters["hits" if entry is not None else "misses"] += 1
+            return entry
+
+    def put(self, key, payload):
+        body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+        entry = (body, gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= MIN_GZIP_BYTES else None)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def record(self, not_modified=False, sent=0):
+        with self.lock:
+            self.counters["not_modified"] += not_modified
+            self.counters["bytes_sent"] += sent
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "entries": len(self.entries), "max_entries": self.max_entries}
@@ -0,0 +1,144 @@
+"""Chart rendering without pyplot's global state.
+
+Every render builds its own `Figure` and draws it with `FigureCanvasAgg`, so
+concurrent renders never share a current figure. The functions take plain
+data (lists of (label, value) pairs) and return PNG bytes, which lets
+ChartRenderer run them in a separate process pool, keeping CPU-heavy renders
+from holding the GIL against request handling. matplotlib is imported on the
+first render, so importing this module (and starting the app) stays cheap.
+"""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from metrics import EXTERNAL_LATENCY
+
+
+def _figure(figsize):
+    from matplotlib.figure import Figure
+
+    return Figure(figsize=figsize)
+
+
+def _to_png(fig, **savefig_kwargs):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    FigureCanvasAgg(fig)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", **savefig_kwargs)
+    return buffer.getvalue()
+
+
+def _bar(ax, items, color):
+    labels = [label for label, _ in items]
+    ax.bar(range(len(items)), [value for _, value in items], color=color)
+    ax.set_xticks(range(len(items)))
+    ax.set_xticklabels(labels)
+
+
+def render_upload_top_artists(items, style):
+    """Bar chart of the top artists in an uploaded CSV."""
+    fig = _figure(style["figsize"])
+    ax = fig.add_subplot()
+    _bar(ax, items, style["color"])
+    ax.set_xlabel('Artist')
+    ax.set_ylabel('Number of Songs')
+    ax.set_title('Top 10 Artists')
+    ax.tick_params(axis='x', rotation=45)
+    return _to_png(fig)
+
+
+def render_history_top_artists(items, style):
+    """Transparent bar chart of the most played artists in the listening history."""
+    fig = _figure(style["figsize"])
+    fig.patch.set_alpha(0)  # Ensure background transparency
+    ax = fig.add_subplot()
+    ax.set_facecolor(style["facecolor"])  # Match page background (dark gray)
+
+    # 🎵 Top 10 Artists Bar Chart
+    _bar(ax, items, style["color"])
+
+    # 🎨 Formatting
+    ax.set_xlabel("Artist", fontsize=12, color="white")
+    ax.set_ylabel("Times Played", fontsize=12, color="white")
+    ax.set_title("Top 10 Most Played Artists", fontsize=14, fontweight="bold", color="white")
+    ax.tick_params(axis='x', colors="white", rotation=45)
+    ax.tick_params(axis='y', colors="white")
+
+    return _to_png(fig, dpi=style["dpi"], bbox_inches="tight", transparent=True)
+
+
+def render_genre_pie(items, style):
+    """Transparent genre pie chart; slices under small_slice_pct get listed top-left instead."""
+    from matplotlib.font_manager import FontProperties
+
+    font = FontProperties(fname=style["font"])
+    labels = [genre for genre, _ in items]
+    counts = [count for _, count in items]
+
+    fig = _figure(style["figsize"])
+    fig.patch.set_alpha(0)  # Ensure background transparency
+    ax = fig.add_subplot()
+
+    wedges, texts, autotexts = ax.pie(
+        counts,
+        labels=labels,
+        autopct='%1.1f%%',
+        startangle=140,
+        pctdistance=0.85,  # Push percentage values inward
+        textprops={'fontsize': 10, 'color': 'white', 'fontproperties': font}  # Make all text white
+    )
+
+    # 🎨 Move small genre labels to the top-left
+    small_genre_texts = []
+    x_offset, y_offset = -1.8, 1.2
+    for wedge, label, percentage in zip(wedges, texts, autotexts):
+        pct = float(percentage.get_text().replace('%', ''))
+        if pct < style["small_slice_pct"]:
+            label.set_visible(False)
+            percentage.set_visible(False)
+            small_genre_texts.append((label.get_text(), pct, wedge.get_facecolor()))
+
+    for i, (genre, pct, color) in enumerate(small_genre_texts):
+        ax.text(
+            x_offset, y_offset - (i * 0.1),
+            f"{genre}: {pct:.1f}%",
+            fontsize=10,
+            color=color,
+            fontweight="bold",
+            fontproperties=font
+        )
+
+    # 🎵 Set title and remove white background
+    ax.set_title("Top Genres Played", fontsize=14, fontweight='bold', color='white')
+    fig.tight_layout()
+
+    return _to_png(fig, dpi=style["dpi"], bbox_inches="tight", transparent=True)
+
+
+class ChartRenderer:
+    """Runs render functions in a dedicated process pool (or inline when `processes` is 0)."""
+
+    def __init__(self, processes=None, timeout=60):
+        self.processes = processes if processes is not None else int(os.getenv("CHART_RENDER_PROCESSES", "2"))
+        self.timeout = timeout
+        self.pool = None
+
+    def _get_pool(self):
+        if self.pool is None:
+            # spawn: forking a multi-threaded web worker can deadlock the child
+            self.pool = ProcessPoolExecutor(max_workers=self.processes,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return self.pool
+
+    def render(self, render_fn, *args):
+        with EXTERNAL_LATENCY.time(service="matplotlib", operation=render_fn.__name__):
+            if not self.processes:
+                return render_fn(*args)
+            return self._get_pool().submit(render_fn, *args).result(timeout=self.timeout)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,119 @@
+"""Chunked CSV ingestion with dtype inference and downcasting.
+
+`pd.read_csv(path)` holds the whole file as int64/float64/object columns, which
+for a multi-GB export is several times the file size. This reads a bounded
+number of rows at a time and shrinks each chunk before keeping it: text
+columns become categoricals (combined across chunks with union_categoricals),
+ISO-8601 timestamp columns become datetime64, integers take the smallest type
+that fits, and well-known Spotify columns get fixed types. Peak memory is one
+raw chunk plus the compact result.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CHUNK_ROWS = 250_000
+
+# Columns with a known meaning get a fixed type (when they are whole numbers without gaps)
+KNOWN_INT32_COLUMNS = ("duration_ms", "popularity", "ms_played")
+CATEGORICAL_COLUMNS = ("artist", "track_name", "album", "genre")
+
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:?\d{2})?$")
+
+FLOAT32_EXACT_LIMIT = 2 ** 24  # float32 represents every integer below this exactly
+
+
+def _parse_timestamps(series):
+    """datetime64 (naive UTC) values if every non-null value is an ISO-8601 timestamp, else None."""
+    sample = series.dropna()
+    if sample.empty or not ISO_DATE.match(str(sample.iloc[0])):
+        return None
+    try:
+        return pd.to_datetime(series, format="ISO8601", utc=True).dt.tz_localize(None).to_numpy()
+    except (ValueError, TypeError):
+        return None
+
+
+def _compact_chunk(chunk):
+    """Returns {column: Categorical or ndarray} with each column in a compact form."""
+    compact = {}
+    for name in chunk.columns:
+        series = chunk[name]
+        if series.dtype.kind in "biuf" and name not in CATEGORICAL_COLUMNS:
+            compact[name] = series.to_numpy()
+            continue
+        timestamps = None if name in CATEGORICAL_COLUMNS else _parse_timestamps(series)
+        # Timestamps (e.g. played_at) are unique per row, so a categorical would only add overhead
+        compact[name] = timestamps if timestamps is not None else series.astype("category").array
+    return compact
+
+
+def _as_text(values):
+    if isinstance(values, pd.Categorical):
+        return values
+    series = pd.Series(values)
+    return series.astype(str).where(series.notna()).astype("category").array
+
+
+def _combine_column(name, parts):
+    """Joins one column's chunks and picks its final dtype."""
+    if any(isinstance(part, pd.Categorical) for part in parts):
+        # A column that was text in any chunk is text everywhere
+        return union_categoricals([_as_text(part) for part in parts], ignore_order=True)
+    return downcast(name, np.concatenate(parts))
+
+
+def downcast(name, values):
+    """Smallest numeric dtype that holds `values` without losing information."""
+    if values.dtype.kind in "bM":
+        return values
+    if values.dtype.kind == "f":
+        finite = values[np.isfinite(values)]
+        if not finite.size or not np.array_equal(finite, np.floor(finite)):
+            return values
+        if finite.size < values.size:
+            # Whole numbers with gaps: NaN needs a float, float32 is exact below 2**24
+            return values.astype(np.float32) if np.abs(finite).max() < FLOAT32_EXACT_LIMIT else values
+        values = values.astype(np.int64)
+
+    if name in KNOWN_INT32_COLUMNS and values.size and np.abs(values).max() < 2 ** 31:
+        return values.astype(np.int32)
+    return pd.to_numeric(values, downcast="integer")
+
+
+def ingest_csv(path, chunk_rows=CHUNK_ROWS, progress=None, cancelled=None):
+    """Reads `path` chunk by chunk into a compact DataFrame.
+
+    `progress(done_bytes, total_bytes, rows)` is called after every chunk;
+    `cancelled()` returning True stops the read and returns None.
+    """
+    total_bytes = os.path.getsize(path)
+    columns = None
+    parts = {}
+    rows = 0
+
+    with open(path, "rb") as f:
+        for chunk in pd.read_csv(f, chunksize=chunk_rows, low_memory=False):
+            if cancelled and cancelled():
+                return None
+            if columns is None:
+                columns = list(chunk.columns)
+                parts = {name: [] for name in columns}
+            for name, values in _compact_chunk(chunk).items():
+                parts[name].append(values)
+            rows += len(chunk)
+            del chunk
+            if progress:
+                progress(min(f.tell(), total_bytes), total_bytes, rows)
+
+    if columns is None:
+        # Header-only (or empty) file: let pandas produce the right empty frame or error
+        return pd.read_csv(path)
+
+    data = {}
+    for name in columns:
+        data[name] = _combine_column(name, parts.pop(name))
+    return pd.DataFrame(data, copy=False)
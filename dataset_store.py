@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DATASET_DIR = "datasets"
+DATASET_MEMORY_BUDGET = 256 * 1024 * 1024
+
+
+def frame_nbytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class DatasetStore:
+    """Uploaded datasets keyed by owner (user or session), kept on disk column by column.
+
+    Each dataset is a directory with one .npy file per column plus a
+    manifest.json. Text columns are stored as categorical codes with their
+    categories in the manifest, so nothing needs pickling. A small `current`
+    file per owner points at the latest version and is swapped atomically,
+    which lets any worker process serve any user.
+
+    Loaded frames stay in an in-process LRU until the resident bytes exceed
+    `memory_budget`; the least recently used are dropped first and reloaded
+    from disk on their next use.
+    """
+
+    def __init__(self, directory=DATASET_DIR, memory_budget=DATASET_MEMORY_BUDGET):
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.lock = threading.Lock()
+        self.frames = OrderedDict()  # (owner_dir, version) -> (DataFrame, nbytes)
+        self.resident_bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "saves": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def owner_dir(self, owner):
+        # Hashed so user/session IDs never become raw path components
+        return os.path.join(self.directory, hashlib.sha256(str(owner).encode()).hexdigest()[:24])
+
+    def dataset_dir(self, owner, version):
+        """Directory of one stored dataset; derived files (e.g. a search index) can live inside it."""
+        return os.path.join(self.owner_dir(owner), version)
+
+    # ✍️ Writing
+    def save(self, owner, df, version):
+        """Persists `df` as `owner`'s current dataset and returns the frame as it will be served."""
+        owner_dir = self.owner_dir(owner)
+        dataset_dir = self.dataset_dir(owner, version)
+        os.makedirs(owner_dir, exist_ok=True)
+
+        if not os.path.exists(dataset_dir):
+            tmp_dir = tempfile.mkdtemp(dir=owner_dir, prefix=".tmp-")
+            write_columns(df, tmp_dir)
+            try:
+                os.rename(tmp_dir, dataset_dir)
+            except OSError:
+                shutil.rmtree(tmp_dir, ignore_errors=True)  # Same upload saved concurrently
+
+        fd, tmp_pointer = tempfile.mkstemp(dir=owner_dir, prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            f.write(version)
+        os.replace(tmp_pointer, os.path.join(owner_dir, "current"))
+
+        frame = read_columns(dataset_dir)
+        with self.lock:
+            self.counters["saves"] += 1
+            self._remember((owner_dir, version), frame)
+        self._cleanup(owner_dir, keep=version)
+        return frame
+
+    # 📖 Reading
+    def current_version(self, owner):
+        try:
+            with open(os.path.join(self.owner_dir(owner), "current")) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def load(self, owner):
+        """Returns (DataFrame, version) for the owner's current dataset, or (None, None)."""
+        version = self.current_version(owner)
+        if version is None:
+            return None, None
+
+        key = (self.owner_dir(owner), version)
+        with self.lock:
+            if key in self.frames:
+                self.frames.move_to_end(key)
+                self.counters["hits"] += 1
+                return self.frames[key][0], version
+            self.counters["misses"] += 1
+
+        try:
+            frame = read_columns(os.path.join(*key))
+        except FileNotFoundError:
+            return None, None
+        with self.lock:
+            self.counters["loads"] += 1
+            self._remember(key, frame)
+        return frame, version
+
+    # 🧹 Memory budget
+    def _remember(self, key, frame):
+        if key in self.frames:
+            self.resident_bytes -= self.frames.pop(key)[1]
+        nbytes = frame_nbytes(frame)
+        self.frames[key] = (frame, nbytes)
+        self.resident_bytes += nbytes
+        # Always keep the newest entry, even if it alone exceeds the budget
+        while self.resident_bytes > self.memory_budget and len(self.frames) > 1:
+            _, (_, evicted_bytes) = self.frames.popitem(last=False)
+            self.resident_bytes -= evicted_bytes
+            self.counters["evictions"] += 1
+
+    def _cleanup(self, owner_dir, keep):
+        """Removes the owner's superseded versions."""
+        for entry in os.scandir(owner_dir):
+            if entry.is_dir() and entry.name != keep and not entry.name.startswith("."):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                with self.lock:
+                    stale = (owner_dir, entry.name)
+                    if stale in self.frames:
+                        self.resident_bytes -= self.frames.pop(stale)[1]
+
+    def stats(self):
+        with self.lock:
+            return {
+                **self.counters,
+                "resident_datasets": len(self.frames),
+                "resident_bytes": self.resident_bytes,
+                "memory_budget_bytes": self.memory_budget,
+            }
+
+
+def write_columns(df, directory):
+    """Writes each column as <i>.npy and describes them in manifest.json."""
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        entry = {"name": str(name), "file": f"{i}.npy"}
+
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in "biuf":
+            entry["kind"] = "numeric"
+            values = series.to_numpy()
+        elif isinstance(series.dtype, np.dtype) and series.dtype.kind == "M":
+            entry["kind"] = "datetime"
+            entry["dtype"] = str(series.dtype)
+            values = series.to_numpy().view("int64")
+        else:
+            # Text (and anything else) becomes category codes + a JSON list of strings
+            categorical = series.astype("category")
+            if not all(isinstance(value, str) for value in categorical.cat.categories):
+                categorical = series.where(series.isna(), series.astype(str)).astype("category")
+            entry["kind"] = "categorical"
+            entry["categories"] = categorical.cat.categories.tolist()
+            values = categorical.cat.codes.to_numpy()
+
+        np.save(os.path.join(directory, entry["file"]), values, allow_pickle=False)
+        columns.append(entry)
+
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump({"rows": len(df), "columns": columns}, f)
+
+
+def read_columns(directory):
+    with open(os.path.join(directory, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    data = {}
+    for entry in manifest["columns"]:
+        # Memory-mapped: pages come from the OS page cache, shared by every worker process
+        values = np.load(os.path.join(directory, entry["file"]), mmap_mode="r", allow_pickle=False)
+        if entry["kind"] == "categorical":
+            data[entry["name"]] = pd.Categorical.from_codes(values, categories=entry["categories"])
+        elif entry["kind"] == "datetime":
+            data[entry["name"]] = values.view(np.dtype(entry["dtype"]))
+        else:
+            data[entry["name"]] = values
+    return pd.DataFrame(data, index=pd.RangeIndex(manifest["rows"]), copy=False)
@@ -0,0 +1,137 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import EXTERNAL_LATENCY
+
+DEFAULT_DB_PATH = "spotify_data.db"
+
+# WAL lets readers keep going while a writer commits; NORMAL is safe in WAL mode
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -20000),  # ~20 MB page cache per connection
+    ("mmap_size", 268435456),  # 256 MB memory-mapped reads
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", 10000),
+)
+STATEMENT_CACHE_SIZE = 256  # Compiled statements kept per connection, keyed by SQL text
+
+
+class ConnectionPool:
+    """Thread-safe pool of long-lived SQLite connections to one database file.
+
+    Connections are configured once (WAL + PRAGMAS) and reused, so their
+    compiled-statement cache survives between requests: running the same SQL
+    text again skips the prepare step. At most `max_size` connections exist at
+    a time; callers block (up to `timeout`) when all are checked out.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_size=8, timeout=30):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.stats_lock = threading.Lock()
+        self.stats = {"created": 0, "checkouts": 0}
+
+    def _create(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma, value in PRAGMAS:
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        with self.stats_lock:
+            self.stats["created"] += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Checks a connection out of the pool for the duration of the `with` block.
+
+        Time spent waiting for a free slot and time the connection is held
+        are recorded as sqlite pool_wait / connection latencies.
+        """
+        start = time.perf_counter()
+        if not self.slots.acquire(timeout=self.timeout):
+            EXTERNAL_LATENCY.observe(time.perf_counter() - start, service="sqlite", operation="pool_wait",
+                                     outcome="timeout")
+            raise TimeoutError(f"No free connection to {self.db_path} after {self.timeout}s")
+
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._create()
+            except Exception:
+                self.slots.release()
+                raise
+        with self.stats_lock:
+            self.stats["checkouts"] += 1
+        checked_out = time.perf_counter()
+        EXTERNAL_LATENCY.observe(checked_out - start, service="sqlite", operation="pool_wait", outcome="ok")
+
+        outcome = "error"
+        try:
+            yield conn
+            outcome = "ok"
+        finally:
+            EXTERNAL_LATENCY.observe(time.perf_counter() - checked_out, service="sqlite", operation="connection",
+                                     outcome=outcome)
+            if conn.in_transaction:
+                conn.rollback()  # Never hand the next caller a half-finished transaction
+            conn.row_factory = None
+            self.idle.put(conn)
+            self.slots.release()
+
+    @contextmanager
+    def transaction(self):
+        """Like connection(), but commits on success and rolls back on error."""
+        with self.connection() as conn:
+            with conn:
+                yield conn
+
+    def close_all(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path=None):
+    """Returns the shared pool for `db_path` (one per database file per process)."""
+    db_path = db_path or os.getenv("SPOTIFY_DB_PATH", DEFAULT_DB_PATH)
+    with _pools_lock:
+        if db_path not in _pools:
+            _pools[db_path] = ConnectionPool(db_path)
+        return _pools[db_path]
+
+
+def connection(db_path=None):
+    return get_pool(db_path).connection()
+
+
+def transaction(db_path=None):
+    return get_pool(db_path).transaction()
+
+
+def fetch_dicts(conn, query, params=()):
+    """Runs a query and returns the rows as dicts without touching conn.row_factory."""
+    cursor = conn.execute(query, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def read_sql(query, params=(), db_path=None):
+    """pandas.read_sql_query on a pooled connection."""
+    import pandas as pd
+
+    with connection(db_path) as conn:
+        return pd.read_sql_query(query, conn, params=params)
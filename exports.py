@@ -0,0 +1,183 @@
+"""Streaming exports: rows go from the database (or an uploaded frame) to the client in chunks.
+
+Nothing is written to disk and at most EXPORT_CHUNK_ROWS rows are encoded at
+a time, so an export's memory stays flat however long the history is.
+History rows are read in keyset pages (played_at > last seen), each on a
+briefly checked-out pooled connection, so a slow download never holds a
+connection or an old read snapshot. Formats are CSV, NDJSON and, when pyarrow
+is installed, Parquet; any of them can be gzipped on the fly.
+"""
+import csv
+import importlib.util
+import io
+import json
+import zlib
+from datetime import date
+
+import db
+import schema
+
+EXPORT_CHUNK_ROWS = 5000
+DAY_MS = 86400000
+FORMATS = {  # name -> (mimetype, file extension)
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# The listening_history view's columns, read from plays directly so the user / date filter uses the
+# (user_id, played_at) index and rows come out in played_at order without a sort
+HISTORY_COLUMNS = {
+    "id": ("p.id", "INTEGER"),
+    "user_id": ("p.user_id", "TEXT"),
+    "track_name": ("t.name", "TEXT"),
+    "artist": ("a.name", "TEXT"),
+    "played_at": (schema.PLAYED_AT_ISO_SQL.format(column="p.played_at"), "TEXT"),
+    "genre": ("a.genre", "TEXT"),
+    "artist_id": ("a.spotify_id", "TEXT"),
+    **{column: (f"p.{column}", column_type) for column, column_type in schema.PLAY_DETAIL_COLUMNS},
+}
+
+
+def check_format(fmt):
+    """Raises ValueError for formats we can't produce here."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}' (expected one of: {', '.join(FORMATS)})")
+    if fmt == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+
+
+def parse_columns(value, available):
+    """'a,b' -> ['a', 'b'], or every available column when empty; unknown names raise ValueError."""
+    if not value:
+        return list(available)
+    columns = [column.strip() for column in value.split(",") if column.strip()]
+    unknown = [column for column in columns if column not in available]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    return columns
+
+
+def history_batches(user_id, columns, start_day=None, end_day=None, db_path=None, chunk=EXPORT_CHUNK_ROWS):
+    """Lists of row tuples for the user's plays, oldest first; `end_day` is inclusive.
+
+    Dates are checked here, before the first row is read, so a bad one
+    becomes a 400 rather than a broken download.
+    """
+    start_ms = (date.fromisoformat(start_day) - date(1970, 1, 1)).days * DAY_MS if start_day else None
+    end_ms = (date.fromisoformat(end_day) - date(1970, 1, 1)).days * DAY_MS + DAY_MS if end_day else None
+    query = f"""
+        SELECT {", ".join(HISTORY_COLUMNS[column][0] for column in columns)}, p.played_at
+        FROM plays p
+        JOIN tracks t ON t.id = p.track_id
+        JOIN artists a ON a.id = p.artist_id
+        WHERE p.user_id = ? AND p.played_at > ? {"AND p.played_at < ?" if end_ms is not None else ""}
+        ORDER BY p.played_at
+        LIMIT {int(chunk)}
+    """
+
+    def batches():
+        last_ms = start_ms - 1 if start_ms is not None else -1 << 62
+        while True:
+            with db.connection(db_path) as conn:
+                rows = conn.execute(query, [user_id, last_ms] + ([end_ms] if end_ms is not None else [])).fetchall()
+            if not rows:
+                return
+            last_ms = rows[-1][-1]
+            yield [row[:-1] for row in rows]
+            if len(rows) < chunk:
+                return
+
+    return batches()
+
+
+def frame_batches(df, columns, chunk=EXPORT_CHUNK_ROWS):
+    """Lists of row tuples (plain Python values, NaN as None) from a DataFrame, `chunk` rows at a time."""
+    for start in range(0, len(df), chunk):
+        part = df.iloc[start:start + chunk][columns].astype(object)
+        yield [tuple(row) for row in part.where(part.notna(), None).to_numpy().tolist()]
+
+
+def frame_types(df, columns):
+    """SQL-style type names for the frame's columns (used for the Parquet schema)."""
+    kinds = {"i": "INTEGER", "u": "INTEGER", "f": "REAL", "b": "BOOLEAN"}
+    return {column: kinds.get(df[column].dtype.kind, "TEXT") for column in columns}
+
+
+def encode_csv(columns, batches, types=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")  # Same line endings as the old pandas export
+    writer.writerow(columns)
+    yield buffer.getvalue().encode()  # Header first, so the download starts right away
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+
+
+def encode_ndjson(columns, batches, types=None):
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(columns, row)), separators=(",", ":"), ensure_ascii=False) + "\n"
+                      for row in rows).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written so far; tell() keeps counting for Parquet's offsets."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def encode_parquet(columns, batches, types=None):
+    """One row group per batch, each sent as soon as it's written; the footer goes last."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {"INTEGER": pa.int64(), "REAL": pa.float64(), "BOOLEAN": pa.bool_(), "TEXT": pa.string()}
+    arrow_schema = pa.schema([(column, arrow_types[(types or {}).get(column, "TEXT")]) for column in columns])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), arrow_schema) as writer:
+        for rows in batches:
+            writer.write_table(pa.Table.from_pylist([dict(zip(columns, row)) for row in rows], schema=arrow_schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+ENCODERS = {"csv": encode_csv, "ndjson": encode_ndjson, "parquet": encode_parquet}
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzips a byte stream on the fly; every input chunk is flushed so the client sees data as it comes."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(fmt, columns, batches, gzipped=False, types=None):
+    """(byte chunks, mimetype, file extension) for an export of `batches` in `fmt`."""
+    mimetype, extension = FORMATS[fmt]
+    chunks = ENCODERS[fmt](columns, batches, types)
+    if gzipped:
+        return gzip_chunks(chunks), "application/gzip", f"{extension}.gz"
+    return chunks, mimetype, extension
@@ -0,0 +1,163 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import db
+
+SOURCE_SPOTIFY = "spotify"
+SOURCE_LLM = "llm"
+SOURCE_UNKNOWN = "unknown"
+
+DEFAULT_TTL = 30 * 24 * 3600  # Genres rarely change, keep them a month
+NEGATIVE_TTL = 24 * 3600  # Retry "Unknown" artists after a day
+
+
+def normalize_artist_name(artist_name):
+    """Casefolds and collapses whitespace so 'The  Weeknd' and 'the weeknd' share an entry."""
+    return re.sub(r"\s+", " ", artist_name or "").strip().casefold()
+
+
+def cache_keys(artist_name, artist_id=None):
+    """Keys to look an artist up under, most specific first."""
+    keys = []
+    if artist_id:
+        keys.append(f"id:{artist_id}")
+    if artist_name:
+        keys.append(f"name:{normalize_artist_name(artist_name)}")
+    return keys
+
+
+class GenreCache:
+    """Artist → genre cache persisted in SQLite with an in-process LRU in front.
+
+    Entries are stored under the Spotify artist ID and the normalized artist
+    name; lookups use the ID when there is one and the name otherwise. They carry
+    their provenance (spotify / llm / unknown) and expire after a TTL. "Unknown"
+    results use the shorter NEGATIVE_TTL so they get retried sooner. The SQLite
+    table lives next to listening_history, so every worker and restart shares it.
+    """
+
+    def __init__(self, db_path=None, max_entries=10000,
+                 ttl=DEFAULT_TTL, negative_ttl=NEGATIVE_TTL):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lru = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "expired": 0, "stores": 0}
+        self.table_ready = False
+
+    def ensure_table(self):
+        """Creates the SQLite table once, on first use (the app's instance is built at import time)."""
+        if self.table_ready:
+            return
+        with db.transaction(self.db_path) as conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS genre_cache (
+                cache_key TEXT PRIMARY KEY,
+                genre TEXT,
+                source TEXT,
+                expires_at REAL,
+                updated_at REAL
+            )
+            """)
+        self.table_ready = True
+
+    def _count(self, key):
+        with self.lock:
+            self.counters[key] += 1
+
+    def _remember(self, key, entry):
+        with self.lock:
+            self.lru[key] = entry
+            self.lru.move_to_end(key)
+            while len(self.lru) > self.max_entries:
+                self.lru.popitem(last=False)
+
+    def lookup(self, artist_name, artist_id=None):
+        """Returns (genre, source) for a live entry, or None on a miss."""
+        now = time.time()
+        # An artist with an ID only matches on it: another artist may share the name
+        keys = cache_keys(None, artist_id) if artist_id else cache_keys(artist_name)
+
+        with self.lock:
+            for key in keys:
+                entry = self.lru.get(key)
+                if entry and entry[2] > now:
+                    self.lru.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return entry[0], entry[1]
+
+        rows = []
+        if keys:
+            self.ensure_table()
+            with db.connection(self.db_path) as conn:
+                rows = conn.execute(
+                    f"SELECT cache_key, genre, source, expires_at FROM genre_cache WHERE cache_key IN ({','.join('?' * len(keys))})",
+                    keys
+                ).fetchall()
+
+        found = {row[0]: row[1:] for row in rows}
+        for key in keys:
+            if key not in found:
+                continue
+            genre, source, expires_at = found[key]
+            if expires_at <= now:
+                self._count("expired")
+                continue
+            self._remember(key, (genre, source, expires_at))
+            self._count("db_hits")
+            return genre, source
+
+        self._count("misses")
+        return None
+
+    def get(self, artist_name, artist_id=None):
+        """Returns the cached genre, or None if we need to ask Spotify/the LLM."""
+        hit = self.lookup(artist_name, artist_id)
+        return hit[0] if hit else None
+
+    def set(self, artist_name, genre, source, artist_id=None):
+        self.set_many([(artist_name, artist_id, genre, source)])
+
+    def set_many(self, entries):
+        """Stores (artist_name, artist_id, genre, source) tuples in one transaction."""
+        now = time.time()
+        rows = []
+        for artist_name, artist_id, genre, source in entries:
+            if not genre or genre == "Unknown":
+                genre, source = "Unknown", SOURCE_UNKNOWN
+            expires_at = now + (self.negative_ttl if source == SOURCE_UNKNOWN else self.ttl)
+            for key in cache_keys(artist_name, artist_id):
+                rows.append((key, genre, source, expires_at, now))
+                self._remember(key, (genre, source, expires_at))
+
+        if not rows:
+            return
+
+        self.ensure_table()
+        with db.transaction(self.db_path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO genre_cache (cache_key, genre, source, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        with self.lock:
+            self.counters["stores"] += len(entries)
+
+    def purge_expired(self):
+        """Deletes expired rows from the SQLite table."""
+        self.ensure_table()
+        with db.transaction(self.db_path) as conn:
+            return conn.execute("DELETE FROM genre_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["lru_entries"] = len(self.lru)
+        hits = stats["memory_hits"] + stats["db_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        stats["remote_calls_saved"] = hits
+        return stats
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from genre_pipeline import RateLimiter
+from metrics import EXTERNAL_LATENCY
+
+log = logging.getLogger(__name__)
+
+BATCH_PROMPT = (
+    "Provide only the primary genre of each artist below, one word per artist. "
+    "Reply with a JSON object mapping each artist name exactly as given to its genre, "
+    "and nothing else.\n"
+)
+
+
+def is_valid_genre(artist, genre):
+    """Same rules reset_invalid_genres applies to stored genres."""
+    if not genre:
+        return False
+
+    # ✅ If genre contains full sentences, artist names, or phrases, it's invalid
+    if len(genre.split()) > 3 or not re.match(r"^[a-zA-Z\s-]+$", genre):
+        return False
+
+    # ✅ Check for artist mentions in genre (e.g., "Chase Shakur is known for R&B")
+    if artist.lower() in genre.lower():
+        return False
+
+    return True
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) for the per-minute budget."""
+    return len(text) // 4 + 1
+
+
+def parse_genre_response(content, artists):
+    """Turns the model's JSON reply into {artist: genre} for the requested artists."""
+    match = re.search(r"\{.*\}", content or "", re.DOTALL)
+    if not match:
+        return {}
+    try:
+        answer = json.loads(match.group(0))
+    except ValueError:
+        return {}
+    if not isinstance(answer, dict):
+        return {}
+
+    by_name = {str(name).strip().casefold(): genre for name, genre in answer.items()}
+    genres = {}
+    for artist in artists:
+        genre = answer.get(artist, by_name.get(artist.strip().casefold()))
+        if isinstance(genre, str):
+            genres[artist] = genre.strip()
+    return genres
+
+
+class OpenAIBackend:
+    """Sends the batch prompt to the OpenAI chat endpoint."""
+
+    def __init__(self, model="gpt-4o-mini"):
+        self.model = model
+
+    def complete(self, prompt, max_tokens):
+        import openai
+
+        with EXTERNAL_LATENCY.time(service="openai", operation="batch_genres"):
+            response = openai.ChatCompletion.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=0
+            )
+        return response["choices"][0]["message"]["content"]
+
+
+class FakeLLMBackend:
+    """Offline stand-in for OpenAIBackend used by benchmarks and local runs.
+
+    Answers deterministically from a hash of the artist name. `invalid_rate` of
+    artists get an invalid answer the first time they are asked, so the retry
+    path gets exercised.
+    """
+
+    GENRES = ["Pop", "Rap", "Rock", "Indie", "Electronic", "Jazz", "Country", "Latin", "Metal", "Soul"]
+
+    def __init__(self, latency=0.0, invalid_rate=0.0):
+        self.latency = latency
+        self.invalid_rate = invalid_rate
+        self.calls = 0
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def complete(self, prompt, max_tokens):
+        time.sleep(self.latency)
+        artists = json.loads(prompt[len(BATCH_PROMPT):])
+        answer = {}
+        with self.lock:
+            self.calls += 1
+            for artist in artists:
+                h = int(hashlib.md5(artist.encode()).hexdigest(), 16)
+                if artist not in self.seen and (h % 1000) < self.invalid_rate * 1000:
+                    answer[artist] = f"{artist} is known for pop"
+                else:
+                    answer[artist] = self.GENRES[h % len(self.GENRES)]
+                self.seen.add(artist)
+        return json.dumps(answer)
+
+
+class BatchGenreClassifier:
+    """Classifies many artists per LLM call instead of one ChatCompletion per artist.
+
+    Artists are packed `batch_size` to a prompt and batches run concurrently
+    under a tokens-per-minute budget. Answers failing `is_valid_genre` are sent
+    back (only those artists) for up to `max_retries` more rounds; anything
+    still invalid comes back as "Unknown".
+    """
+
+    def __init__(self, backend=None, batch_size=25, max_workers=4, tokens_per_minute=200000,
+                 max_retries=2, tokens_per_artist=8):
+        self.backend = backend or OpenAIBackend()
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max_workers
+        self.budget = RateLimiter(tokens_per_minute / 60 if tokens_per_minute else None,
+                                  burst=tokens_per_minute)
+        self.max_retries = max_retries
+        self.tokens_per_artist = tokens_per_artist
+        self.stats_lock = threading.Lock()
+        self.stats = {"llm_calls": 0, "retried": 0, "tokens": 0}
+
+    def _classify_batch(self, batch):
+        prompt = BATCH_PROMPT + json.dumps(batch)
+        max_tokens = self.tokens_per_artist * len(batch) + estimate_tokens(json.dumps(batch))
+        tokens = estimate_tokens(prompt) + max_tokens
+        self.budget.acquire(tokens)
+        with self.stats_lock:
+            self.stats["llm_calls"] += 1
+            self.stats["tokens"] += tokens
+
+        try:
+            return parse_genre_response(self.backend.complete(prompt, max_tokens), batch)
+        except Exception as e:
+            log.error("❌ Batch genre lookup failed for %d artists - %s", len(batch), e)
+            return {}
+
+    def classify(self, artists):
+        """Returns {artist: genre} for every artist, "Unknown" when no valid answer came back."""
+        genres = {}
+        pending = list(dict.fromkeys(artists))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for attempt in range(self.max_retries + 1):
+                if not pending:
+                    break
+                if attempt:
+                    log.info("🔁 Retrying %d artists with invalid genres...", len(pending))
+                    self.stats["retried"] += len(pending)
+
+                batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+                failed = []
+                for batch, answers in zip(batches, pool.map(self._classify_batch, batches)):
+                    for artist in batch:
+                        genre = answers.get(artist)
+                        if is_valid_genre(artist, genre):
+                            genres[artist] = genre
+                        else:
+                            failed.append(artist)
+                pending = failed
+
+        for artist in pending:
+            genres[artist] = "Unknown"
+        return genres
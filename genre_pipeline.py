@@ -0,0 +1,214 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import schema
+from genre_cache import SOURCE_LLM, SOURCE_SPOTIFY
+
+log = logging.getLogger(__name__)
+
+SPOTIFY_BATCH_SIZE = 50  # GET /v1/artists accepts at most 50 IDs per call
+
+
+class RateLimiter:
+    """Token bucket that keeps one backend under `rate` units (calls, tokens...) per second."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate or 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        if not self.rate:
+            return  # ✅ No limit configured
+
+        amount = min(amount, self.capacity)  # A single oversized request still gets through
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class GenreEnrichmentPipeline:
+    """Resolves genres for many artists at once and writes them back in one transaction.
+
+    Artists with a known Spotify ID are looked up 50 at a time with `sp.artists`,
+    the rest go through `sp.search`, and anything still "Unknown" falls back to
+    `llm_lookup` (normally `get_genre`). Calls fan out over a bounded thread pool
+    with a separate rate limit for Spotify and for the LLM; with the shared
+    SpotifyClient (`sp.gather`) the Spotify calls fan out on its event loop instead. When a `cache` is
+    given, cached artists skip the remote calls entirely. When a `classifier`
+    (BatchGenreClassifier) is given, the LLM fallback is sent in batches
+    instead of one `llm_lookup` call per artist.
+    """
+
+    def __init__(self, sp, llm_lookup, db_path=None, max_workers=8,
+                 spotify_rate=10, llm_rate=5, cache=None, classifier=None):
+        self.sp = sp
+        self.llm_lookup = llm_lookup
+        self.cache = cache
+        self.classifier = classifier
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.spotify_limiter = RateLimiter(spotify_rate)
+        self.llm_limiter = RateLimiter(llm_rate)
+        self.stats_lock = threading.Lock()
+        self.stats = {}
+
+    def _count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + amount
+
+    @staticmethod
+    def _chunk_genres(chunk, results):
+        by_id = {a["id"]: a for a in (results or {}).get("artists", []) if a}
+        genres = {}
+        for artist_name, artist_id in chunk:
+            artist_genres = by_id.get(artist_id, {}).get("genres", [])
+            genres[(artist_name, artist_id)] = artist_genres[0] if artist_genres else "Unknown"
+        return genres
+
+    @staticmethod
+    def _search_genre(results):
+        if results and "artists" in results and results["artists"]["items"]:
+            artist_genres = results["artists"]["items"][0].get("genres", [])
+            return artist_genres[0] if artist_genres else "Unknown"
+        return "Unknown"
+
+    def _lookup_ids(self, chunk):
+        """Looks up a chunk of (artist_name, artist_id) pairs with one `sp.artists` call."""
+        self.spotify_limiter.acquire()
+        self._count("spotify_calls")
+        try:
+            results = self.sp.artists([artist_id for _, artist_id in chunk])
+        except Exception as e:
+            log.error("⚠️ Batched artist lookup failed for %d artists: %s", len(chunk), e)
+            self._count("spotify_errors")
+            results = None
+        return self._chunk_genres(chunk, results)
+
+    def _search(self, artist_name):
+        """Falls back to a name search for artists we have no ID for."""
+        self.spotify_limiter.acquire()
+        self._count("spotify_calls")
+        try:
+            return self._search_genre(self.sp.search(q=artist_name, type="artist", limit=1))
+        except Exception as e:
+            log.error("⚠️ Could not fetch Spotify genre for %s: %s", artist_name, e)
+            self._count("spotify_errors")
+        return "Unknown"
+
+    def _gather(self, calls):
+        """Fans calls out on the shared Spotify client's event loop (it rate-limits and retries itself)."""
+        self._count("spotify_calls", len(calls))
+        results = self.sp.gather(calls)
+        for result in results:
+            if isinstance(result, Exception):
+                log.error("⚠️ Spotify genre lookup failed: %s", result)
+                self._count("spotify_errors")
+        return [None if isinstance(result, Exception) else result for result in results]
+
+    def _classify(self, artist_name):
+        self.llm_limiter.acquire()
+        self._count("llm_calls")
+        try:
+            return self.llm_lookup(artist_name) or "Unknown"
+        except Exception as e:
+            log.error("❌ LLM genre lookup failed for %s - %s", artist_name, e)
+            return "Unknown"
+
+    def resolve(self, artists):
+        """Returns {(artist_name, artist_id): genre} for a list of (artist_name, artist_id) pairs.
+
+        Results are keyed on the pair rather than the name: two artists can
+        share a name, and each keeps its own genre.
+        """
+        artists = list(dict.fromkeys((name, artist_id) for name, artist_id in artists))
+        genres = {}
+        if self.cache:
+            remaining = []
+            for name, artist_id in artists:
+                cached = self.cache.get(name, artist_id)
+                if cached is None:
+                    remaining.append((name, artist_id))
+                else:
+                    genres[(name, artist_id)] = cached
+            self._count("cache_hits", len(artists) - len(remaining))
+            artists = remaining
+
+        with_ids = [(name, artist_id) for name, artist_id in artists if artist_id]
+        without_ids = [(name, artist_id) for name, artist_id in artists if not artist_id]
+        chunks = [with_ids[i:i + SPOTIFY_BATCH_SIZE] for i in range(0, len(with_ids), SPOTIFY_BATCH_SIZE)]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            if hasattr(self.sp, "gather"):
+                # 🌐 Steps 1 + 2 as one async fan-out on the shared client
+                results = self._gather(
+                    [("artists", {"ids": ",".join(artist_id for _, artist_id in chunk)}) for chunk in chunks] +
+                    [("search", {"q": name, "type": "artist", "limit": 1}) for name, _ in without_ids])
+                for chunk, chunk_results in zip(chunks, results):
+                    genres.update(self._chunk_genres(chunk, chunk_results))
+                for artist, search_results in zip(without_ids, results[len(chunks):]):
+                    genres[artist] = self._search_genre(search_results)
+            else:
+                # Step 1: Batched lookups for every artist we have an ID for
+                for chunk_genres in pool.map(self._lookup_ids, chunks):
+                    genres.update(chunk_genres)
+
+                # Step 2: Name search for the rest
+                for artist, genre in zip(without_ids, pool.map(self._search, [name for name, _ in without_ids])):
+                    genres[artist] = genre
+
+            sources = {artist: SOURCE_SPOTIFY for artist in artists if genres[artist] != "Unknown"}
+
+            # Step 3: LLM fallback for anything Spotify couldn't classify (the LLM only sees names)
+            unknown = [artist for artist in artists if genres[artist] == "Unknown"]
+            names = list(dict.fromkeys(name for name, _ in unknown))
+            if self.classifier and names:
+                llm_genres = self.classifier.classify(names)
+            else:
+                llm_genres = dict(zip(names, pool.map(self._classify, names)))
+            for artist in unknown:
+                genres[artist] = llm_genres.get(artist[0], "Unknown")
+                sources[artist] = SOURCE_LLM
+
+        if self.cache:
+            self.cache.set_many([
+                (name, artist_id, genres[(name, artist_id)], sources.get((name, artist_id))) for name, artist_id in artists
+            ])
+
+        return genres
+
+    def write(self, genres):
+        """Writes all resolved genres back to the artists table in a single transaction."""
+        with db.transaction(self.db_path) as conn:
+            schema.set_artist_genres(conn, genres)
+
+    def run(self, artists):
+        """Resolves and stores genres, returning throughput stats for the run."""
+        self.stats = {"cache_hits": 0, "spotify_calls": 0, "spotify_errors": 0, "llm_calls": 0}
+        start = time.perf_counter()
+
+        genres = self.resolve(artists)
+        self.write(genres)
+
+        elapsed = time.perf_counter() - start
+        self.stats.update({
+            "artists": len(genres),
+            "resolved": sum(1 for genre in genres.values() if genre != "Unknown"),
+            "elapsed_sec": round(elapsed, 3),
+            "artists_per_sec": round(len(genres) / elapsed, 1) if elapsed else 0.0,
+        })
+        log.info("✅ Genre enrichment: %d artists in %ss (%s artists/sec)", self.stats["artists"],
+                 self.stats["elapsed_sec"], self.stats["artists_per_sec"])
+        return self.stats
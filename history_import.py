@@ -0,0 +1,166 @@
+"""Importer for Spotify's extended streaming history export (the my_spotify_data.zip download).
+
+The zip holds Streaming_History_Audio_*.json files (endsong_*.json in older
+exports), each a JSON array of plays and often tens of MB. Every file is
+parsed in a worker process, one object at a time, and the worker inserts it
+BATCH_ROWS plays per transaction, so memory stays flat however big the file
+is. Podcast episodes and other entries without a track are skipped.
+
+`ts` in the export is when playback ended, the same moment the API reports as
+`played_at`, so re-importing an export (or overlapping exports) inserts each
+play once.
+"""
+import io
+import json
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import db
+import schema
+from history_sync import played_at_to_ms
+
+EXPORT_FILE_PATTERN = re.compile(r"(Streaming_History_Audio|endsong)_.*\.json$")
+READ_CHUNK_CHARS = 1 << 16
+BATCH_ROWS = 5000  # Plays per insert transaction (and the most a worker holds at once)
+
+
+def iter_json_array(f, chunk_chars=READ_CHUNK_CHARS):
+    """Yields the elements of a top-level JSON array from a text stream, one at a time."""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_chars).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array")
+    pos, eof = 1, False
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Element split across reads (or the buffer is empty): read more and retry
+            if eof:
+                raise
+            more = f.read(chunk_chars)
+            eof = not more
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+        yield item
+        if pos > chunk_chars:
+            buffer, pos = buffer[pos:], 0
+
+
+def export_members(zip_path):
+    with zipfile.ZipFile(zip_path) as archive:
+        return sorted(name for name in archive.namelist() if EXPORT_FILE_PATTERN.search(os.path.basename(name)))
+
+
+def _flag(value):
+    return None if value is None else int(bool(value))
+
+
+def iter_export_batches(zip_path, member, batch_rows=BATCH_ROWS):
+    """Yields (rows, skipped) for one export file, at most `batch_rows` rows at a time.
+
+    Rows match schema.insert_streamed_plays.
+    """
+    rows = []
+    skipped = 0
+    with zipfile.ZipFile(zip_path) as archive, archive.open(member) as raw:
+        for entry in iter_json_array(io.TextIOWrapper(raw, encoding="utf-8")):
+            track_name = entry.get("master_metadata_track_name")
+            artist = entry.get("master_metadata_album_artist_name")
+            played_at = entry.get("ts")
+            if not track_name or not artist or not played_at:
+                skipped += 1  # Podcast episodes, audiobooks, tracks removed from Spotify
+                continue
+            rows.append((
+                track_name,
+                artist,
+                played_at_to_ms(played_at),
+                entry.get("ms_played"),
+                entry.get("platform"),
+                _flag(entry.get("skipped")),
+                _flag(entry.get("shuffle")),
+                entry.get("reason_start"),
+                entry.get("reason_end"),
+            ))
+            if len(rows) >= batch_rows:
+                yield rows, skipped
+                rows, skipped = [], 0
+    if rows or skipped:
+        yield rows, skipped
+
+
+def import_export_file(zip_path, member, user_id=schema.LEGACY_USER_ID, db_path=None, batch_rows=BATCH_ROWS,
+                       cancelled=None):
+    """Parses one export file and inserts it batch by batch. Returns {"rows_parsed", "rows_inserted", "skipped"}.
+
+    Runs in the pool's worker processes, so a file's rows never travel back to
+    the parent and at most one batch is in memory.
+    """
+    stats = {"rows_parsed": 0, "rows_inserted": 0, "skipped": 0}
+    for rows, skipped in iter_export_batches(zip_path, member, batch_rows):
+        if cancelled and cancelled():
+            break
+        with db.transaction(db_path) as conn:
+            stats["rows_inserted"] += schema.insert_streamed_plays(conn, rows, user_id)
+        stats["rows_parsed"] += len(rows)
+        stats["skipped"] += skipped
+    return stats
+
+
+def import_streaming_history(zip_path, processes=None, progress=None, cancelled=None,
+                             user_id=schema.LEGACY_USER_ID, db_path=None):
+    """Imports every history file in the export zip as `user_id`'s plays. Returns stats including rows/sec.
+
+    `processes=0` parses in the calling process. `progress(files_done, files, message)`
+    is called after each file; `cancelled()` returning True stops before the next
+    file (and, in-process, before the next batch).
+    """
+    start = time.perf_counter()
+    members = export_members(zip_path)
+    if not members:
+        raise ValueError("No Streaming_History_Audio_*.json files found in the zip")
+
+    stats = {"files": len(members), "rows_parsed": 0, "rows_inserted": 0, "skipped": 0}
+
+    def add(file_stats):
+        for key, value in file_stats.items():
+            stats[key] += value
+
+    files_done = 0
+    if processes == 0:
+        for member in members:
+            if cancelled and cancelled():
+                break
+            add(import_export_file(zip_path, member, user_id, db_path, cancelled=cancelled))
+            files_done += 1
+            if progress:
+                progress(files_done, len(members), f"{stats['rows_parsed']} plays read")
+    else:
+        pool = ProcessPoolExecutor(max_workers=processes or min(len(members), os.cpu_count() or 1),
+                                   mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = [pool.submit(import_export_file, zip_path, member, user_id, db_path) for member in members]
+            for future in as_completed(futures):
+                if cancelled and cancelled():
+                    break
+                add(future.result())
+                files_done += 1
+                if progress:
+                    progress(files_done, len(members), f"{stats['rows_parsed']} plays read")
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    stats["duplicates"] = stats["rows_parsed"] - stats["rows_inserted"]
+    stats["elapsed_sec"] = round(elapsed, 3)
+    stats["rows_per_sec"] = round(stats["rows_parsed"] / elapsed) if elapsed else None
+    return stats
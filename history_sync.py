@@ -0,0 +1,175 @@
+import logging
+import time
+from datetime import datetime, timezone
+
+import db
+import schema
+
+log = logging.getLogger(__name__)
+
+PAGE_LIMIT = 50  # Max page size for /me/player/recently-played
+MAX_PAGES = 20
+
+
+def played_at_to_ms(played_at):
+    """Converts Spotify's ISO `played_at` ("2024-01-01T12:00:00.123Z") to unix milliseconds."""
+    parsed = datetime.fromisoformat(played_at.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def init_sync_state(db_path=None):
+    with db.transaction(db_path) as conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            user_id TEXT PRIMARY KEY,
+            last_played_at_ms INTEGER,
+            last_synced_at REAL
+        )
+        """)
+
+
+def get_high_water_mark(user_id, db_path=None):
+    with db.connection(db_path) as conn:
+        row = conn.execute("SELECT last_played_at_ms FROM sync_state WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else None
+
+
+def set_high_water_mark(user_id, played_at_ms, db_path=None):
+    with db.transaction(db_path) as conn:
+        conn.execute(
+            """INSERT INTO sync_state (user_id, last_played_at_ms, last_synced_at) VALUES (?, ?, ?)
+               ON CONFLICT(user_id) DO UPDATE SET
+                   last_played_at_ms = MAX(COALESCE(last_played_at_ms, 0), excluded.last_played_at_ms),
+                   last_synced_at = excluded.last_synced_at""",
+            (user_id, played_at_ms, time.time())
+        )
+
+
+def fetch_new_plays(sp, after_ms):
+    """Pages through recently-played with `after=` cursors until we've caught up.
+
+    Without a high-water mark (first sync) we take the latest page only, since
+    the `after` cursor can't page backwards.
+    """
+    items = []
+    pages = 0
+    while pages < MAX_PAGES:
+        if after_ms is None:
+            results = sp.current_user_recently_played(limit=PAGE_LIMIT)
+        else:
+            results = sp.current_user_recently_played(limit=PAGE_LIMIT, after=after_ms)
+        pages += 1
+
+        page_items = (results or {}).get("items") or []
+        items.extend(page_items)
+        if after_ms is None or len(page_items) < PAGE_LIMIT:
+            break
+
+        cursor = ((results.get("cursors") or {}).get("after"))
+        newest = int(cursor) if cursor else max(played_at_to_ms(item["played_at"]) for item in page_items)
+        if newest <= after_ms:
+            break  # No progress, stop instead of looping forever
+        after_ms = newest
+
+    return items, pages
+
+
+def save_plays(tracks, genre_pipeline, user_id=schema.LEGACY_USER_ID, db_path=None):
+    """Stores a batch of one user's recently-played rows in stages. Returns (new_plays, stats).
+
+    1. distinct: one lookup per artist (by Spotify ID, or name when a row has none), not per play
+    2. known: artists whose genre is already stored are skipped
+    3. resolve: `genre_pipeline.resolve()` (a GenreEnrichmentPipeline) handles the
+       rest with batched `sp.artists` calls, the genre cache and the LLM fallback
+    4. insert: all plays via executemany / INSERT OR IGNORE in one transaction
+    """
+    stats = {"plays": len(tracks)}
+    stage_start = time.perf_counter()
+
+    def finish(stage):
+        nonlocal stage_start
+        now = time.perf_counter()
+        stats[f"{stage}_sec"] = round(now - stage_start, 4)
+        stage_start = now
+
+    def artist_key(track):
+        return track.get("artist_id") or track["artist"]  # Name only for rows without a Spotify ID
+
+    artists = {}
+    for track in tracks:
+        artists.setdefault(artist_key(track), (track["artist"], track.get("artist_id")))
+    stats["distinct_artists"] = len(artists)
+    finish("distinct")
+
+    spotify_ids = [artist_id for _, artist_id in artists.values() if artist_id]
+    names = [name for name, artist_id in artists.values() if not artist_id]
+    known = {}
+    with db.connection(db_path) as conn:
+        if spotify_ids:
+            known.update(conn.execute(
+                f"""SELECT spotify_id, genre FROM artists
+                    WHERE genre IS NOT NULL AND genre != 'Unknown' AND spotify_id IN ({",".join("?" * len(spotify_ids))})""",
+                spotify_ids
+            ).fetchall())
+        if names:
+            known.update(conn.execute(
+                f"""SELECT name, genre FROM artists
+                    WHERE genre IS NOT NULL AND genre != 'Unknown'
+                      AND id IN (SELECT MIN(id) FROM artists WHERE name IN ({",".join("?" * len(names))}) GROUP BY name)""",
+                names
+            ).fetchall())
+    stats["known_artists"] = len(known)
+    finish("known")
+
+    to_resolve = {key: artist for key, artist in artists.items() if key not in known}
+    resolved = genre_pipeline.resolve(list(to_resolve.values())) if to_resolve else {}
+    genres = {**known, **{key: resolved.get(artist, "Unknown") for key, artist in to_resolve.items()}}
+    stats["resolved_artists"] = len(to_resolve)
+    stats.update(genre_pipeline.stats)  # Spotify / LLM call counts and cache hits
+    finish("resolve")
+
+    rows = [(track["track_name"], track["artist"], track["played_at"], genres.get(artist_key(track), "Unknown"),
+             track.get("artist_id")) for track in tracks]
+    with db.transaction(db_path) as conn:
+        inserted = schema.insert_plays(conn, rows, user_id)
+    stats["rows_inserted"] = inserted
+    finish("insert")
+    return inserted, stats
+
+
+def sync_recently_played(sp, user_id, save_tracks, db_path=None):
+    """Fetches plays newer than the user's high-water mark and stores them.
+
+    `save_tracks(track_data)` must insert the rows (INSERT OR IGNORE, one
+    transaction) and return (new_rows, save_stats), like save_plays.
+    Returns (track_data, stats).
+    """
+    start = time.perf_counter()
+    after_ms = get_high_water_mark(user_id, db_path)
+    items, pages = fetch_new_plays(sp, after_ms)
+
+    track_data = []
+    for item in items:
+        track = item["track"]
+        track_data.append({
+            "track_name": track["name"],
+            "artist": track["artists"][0]["name"],
+            "played_at": item["played_at"],
+            "artist_id": track["artists"][0]["id"]  # Store artist ID
+        })
+
+    inserted, save_stats = save_tracks(track_data) if track_data else (0, {})
+    if track_data:
+        set_high_water_mark(user_id, max(played_at_to_ms(t["played_at"]) for t in track_data), db_path)
+
+    stats = {
+        "pages": pages,
+        "rows_fetched": len(track_data),
+        "rows_inserted": inserted,
+        "elapsed_sec": round(time.perf_counter() - start, 3),
+        "save": save_stats,
+    }
+    log.info("✅ Synced listening history for %s: %s", user_id, stats)
+    return track_data, stats
@@ -0,0 +1,209 @@
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import traceback
+
+import db
+
+log = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("done", "failed", "cancelled", "interrupted")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Job:
+    """Handle passed to a running job so it can report progress and notice cancellation."""
+
+    def __init__(self, runner, job_id, name):
+        self.runner = runner
+        self.id = job_id
+        self.name = name
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set() or self.runner.get(self.id).get("status") == "cancelling"
+
+    def progress(self, done, total=None, message=None):
+        self.runner._update(self.id, done=done, total=total, message=message)
+
+
+class JobRunner:
+    """In-process background job runner with job state persisted in SQLite.
+
+    Jobs run one at a time on a daemon thread so DB maintenance never overlaps.
+    Every job's status and progress live in the `jobs` table, so any worker can
+    report on (or cancel) a job started by another one, and scheduled jobs are
+    skipped when some worker already ran them within the interval.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.registry = {}
+        self.active = {}
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.worker = None
+
+    def _ensure_table(self):
+        with db.transaction(self.db_path) as conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                status TEXT,
+                done INTEGER DEFAULT 0,
+                total INTEGER,
+                message TEXT,
+                error TEXT,
+                owner TEXT,
+                created_at REAL,
+                started_at REAL,
+                finished_at REAL
+            )
+            """)
+
+    def _update(self, job_id, **fields):
+        fields = {key: value for key, value in fields.items() if value is not None}
+        if not fields:
+            return
+        with db.transaction(self.db_path) as conn:
+            conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{key} = ?' for key in fields)} WHERE id = ?",
+                (*fields.values(), job_id)
+            )
+
+    def register(self, name, func):
+        """Registers `func(job, **params)` under `name`."""
+        self.registry[name] = func
+        return func
+
+    def start(self):
+        """Creates the jobs table, marks jobs orphaned by dead processes and starts the worker."""
+        self._ensure_table()
+
+        host = socket.gethostname()
+        with db.transaction(self.db_path) as conn:
+            rows = conn.execute("SELECT id, owner FROM jobs WHERE status IN ('queued', 'running', 'cancelling')").fetchall()
+            for job_id, owner in rows:
+                owner_host, _, pid = (owner or "").rpartition(":")
+                if owner_host == host and pid.isdigit() and not _pid_alive(int(pid)):
+                    conn.execute("UPDATE jobs SET status = 'interrupted', finished_at = ? WHERE id = ?", (time.time(), job_id))
+
+        if not self.worker:
+            self.worker = threading.Thread(target=self._work, name="job-runner", daemon=True)
+            self.worker.start()
+
+    def _create(self, name):
+        if name not in self.registry:
+            raise KeyError(f"Unknown job: {name}")
+        with db.transaction(self.db_path) as conn:
+            return conn.execute(
+                "INSERT INTO jobs (name, status, owner, created_at) VALUES (?, 'queued', ?, ?)",
+                (name, self.owner, time.time())
+            ).lastrowid
+
+    def submit(self, name, **params):
+        """Queues a job to run in the background and returns its ID.
+
+        `params` are passed to the job function; they only live in this
+        process's queue, so jobs that take them aren't resumable elsewhere.
+        """
+        job_id = self._create(name)
+        self.queue.put((job_id, name, params))
+        return job_id
+
+    def run_now(self, name):
+        """Runs a job synchronously in the calling thread (used by the CLI)."""
+        self._ensure_table()
+        job_id = self._create(name)
+        self._run(job_id, name)
+        return self.get(job_id)
+
+    def _work(self):
+        while True:
+            job_id, name, params = self.queue.get()
+            if self.get(job_id).get("status") in ("queued", "running"):
+                self._run(job_id, name, params)
+            self.queue.task_done()
+
+    def _run(self, job_id, name, params=None):
+        job = Job(self, job_id, name)
+        with self.lock:
+            self.active[job_id] = job
+        self._update(job_id, status="running", started_at=time.time())
+        log.info("🔄 Job %d (%s) started", job_id, name)
+
+        try:
+            self.registry[name](job, **(params or {}))
+            status, error = ("cancelled" if job.cancelled else "done"), None
+        except Exception as e:
+            status, error = "failed", f"{e}\n{traceback.format_exc()}"
+            log.error("❌ Job %d (%s) failed - %s", job_id, name, e)
+
+        self._update(job_id, status=status, error=error, finished_at=time.time())
+        with self.lock:
+            self.active.pop(job_id, None)
+        log.info("✅ Job %d (%s) finished: %s", job_id, name, status)
+
+    def cancel(self, job_id):
+        """Asks a job to stop. Queued jobs never start; running jobs stop at their next checkpoint."""
+        job = self.get(job_id)
+        if not job or job["status"] in FINISHED_STATUSES:
+            return False
+
+        with self.lock:
+            active = self.active.get(job_id)
+        if active:
+            active.cancel_event.set()
+        # The owning worker may be another process, so record the request in the DB too
+        self._update(job_id, status="cancelled" if job["status"] == "queued" else "cancelling")
+        return True
+
+    def get(self, job_id):
+        with db.connection(self.db_path) as conn:
+            rows = db.fetch_dicts(conn, "SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return {}
+        job = rows[0]
+        job["percent"] = round(100 * job["done"] / job["total"], 1) if job["total"] else None
+        return job
+
+    def list(self, limit=20):
+        with db.connection(self.db_path) as conn:
+            return db.fetch_dicts(conn, "SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+
+    def _recently_run(self, name, interval):
+        with db.connection(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE name = ? AND (status IN ('queued', 'running') OR started_at > ?)",
+                (name, time.time() - interval)
+            ).fetchone()
+        return row[0] > 0
+
+    def schedule(self, name, interval, delay=0):
+        """Runs `name` every `interval` seconds, unless any worker already ran it within the interval."""
+        def loop():
+            time.sleep(delay)
+            while True:
+                try:
+                    if not self._recently_run(name, interval):
+                        self.submit(name)
+                except Exception as e:
+                    log.warning("⚠️ Could not schedule job %s - %s", name, e)
+                time.sleep(interval)
+
+        threading.Thread(target=loop, name=f"schedule-{name}", daemon=True).start()
@@ -0,0 +1,34 @@
+"""Leveled, asynchronous logging.
+
+Modules log through `logging.getLogger(__name__)` with %-style arguments, so
+a record below LOG_LEVEL (default INFO) is dropped before its arguments are
+ever formatted. setup() puts a QueueHandler on the root logger and a
+background QueueListener does the actual writing, so a request thread never
+blocks on stderr.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_listener = None
+
+
+def setup(level=None):
+    """Routes every logger through the queue (once per process); `level` defaults to LOG_LEVEL."""
+    global _listener
+    root = logging.getLogger()
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # Flushes what's still queued
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
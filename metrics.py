@@ -0,0 +1,147 @@
+"""In-process metrics, exposed in Prometheus' text format at /metrics.
+
+No client library: counters and histograms are plain dicts keyed by label
+values, updated under one lock, so an observation on a hot path costs a few
+microseconds. The stats() dicts the caches, pools and clients already keep
+are read at scrape time by collectors instead of being counted twice.
+
+Shared metrics live here so any module can time itself without importing the app:
+  HTTP_LATENCY      - per-route request latency (recorded by app.py)
+  EXTERNAL_LATENCY  - Spotify, OpenAI, SQLite and chart-render calls
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name, self.documentation, self.labels = name, documentation, tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram; buckets are upper bounds in seconds."""
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.documentation, self.labels = name, documentation, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.values = {}  # label values -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Times the block; an `outcome` label, if not given, becomes "ok" or "error"."""
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            if "outcome" in self.labels:
+                labels.setdefault("outcome", outcome)
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            values = sorted((key, list(counts), total) for key, (counts, total) in self.values.items())
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {repr(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class StatsCollector:
+    """Gauges read from stats() dicts at scrape time: name{<label>=source, stat=key} value."""
+
+    def __init__(self, name, documentation, label):
+        self.name, self.documentation, self.label = name, documentation, label
+        self.sources = {}
+
+    def add(self, source, stats_fn):
+        self.sources[source] = stats_fn
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for source, stats_fn in sorted(self.sources.items()):
+            for stat, value in sorted(stats_fn().items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"{self.name}{_format_labels((self.label, 'stat'), (source, stat))} "
+                                 f"{_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def stats(self, name, documentation, label):
+        return self.register(StatsCollector(name, documentation, label))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+HTTP_LATENCY = REGISTRY.histogram("http_request_duration_seconds",
+                                  "Time until the response is returned by the view (streamed bodies excluded)",
+                                  ["route", "method", "status"])
+EXTERNAL_LATENCY = REGISTRY.histogram("external_call_duration_seconds",
+                                      "Calls leaving the request thread's own code: Spotify, OpenAI, SQLite, chart renders",
+                                      ["service", "operation", "outcome"])
@@ -0,0 +1,102 @@
+"""Aggregations for the chart endpoints, computed inside SQLite.
+
+Each function returns only the aggregated rows (a handful of tuples) instead of
+loading every play into pandas. Everything is scoped to one user's plays and
+served by the user-leading indexes from schema._v6_per_user_plays.
+"""
+import db
+from schema import LEGACY_USER_ID
+
+# strftime formats for plays_per_bucket; played_at is unix milliseconds
+BUCKET_FORMATS = {
+    "hour": "%Y-%m-%dT%H:00",
+    "day": "%Y-%m-%d",
+    "week": "%Y-W%W",
+    "month": "%Y-%m",
+    "weekday": "%w",
+    "hour_of_day": "%H",
+}
+
+
+def data_version(user_id=LEGACY_USER_ID, db_path=None):
+    """Cheap fingerprint of a user's listening data, or None when they have no plays.
+
+    The per-user plays counter is bumped by every insert that adds plays, and
+    MAX(played_at) is a single lookup in the (user_id, played_at) index. The
+    genre counter is bumped by a trigger whenever an artist's genre changes.
+    """
+    with db.connection(db_path) as conn:
+        # Separate statements so SQLite can answer each one straight from an index
+        max_played_at = conn.execute("SELECT MAX(played_at) FROM plays WHERE user_id = ?", (user_id,)).fetchone()[0]
+        plays_version = conn.execute("SELECT version FROM data_version WHERE name = ?",
+                                     (f"plays:{user_id}",)).fetchone()
+        genre_version = conn.execute("SELECT version FROM data_version WHERE name = 'genres'").fetchone()[0]
+    if max_played_at is None:
+        return None
+    return f"{plays_version[0] if plays_version else 0}-{max_played_at}-{genre_version}"
+
+
+def top_artists(limit=10, user_id=LEGACY_USER_ID, db_path=None):
+    """[(artist, plays)] for the user's most played artists."""
+    with db.connection(db_path) as conn:
+        return conn.execute("""
+            SELECT a.name, c.plays
+            FROM (SELECT artist_id, COUNT(*) AS plays FROM plays WHERE user_id = ?
+                  GROUP BY artist_id ORDER BY plays DESC LIMIT ?) c
+            JOIN artists a ON a.id = c.artist_id
+            ORDER BY c.plays DESC, a.name
+        """, (user_id, limit)).fetchall()
+
+
+def genre_distribution(user_id=LEGACY_USER_ID, db_path=None):
+    """[(genre, plays)] across the user's plays, most played first."""
+    with db.connection(db_path) as conn:
+        return conn.execute("""
+            SELECT COALESCE(a.genre, 'Unknown') AS genre, SUM(c.plays) AS plays
+            FROM (SELECT artist_id, COUNT(*) AS plays FROM plays WHERE user_id = ? GROUP BY artist_id) c
+            JOIN artists a ON a.id = c.artist_id
+            GROUP BY 1
+            ORDER BY plays DESC, genre
+        """, (user_id,)).fetchall()
+
+
+def plays_per_bucket(bucket="day", start_ms=None, end_ms=None, user_id=LEGACY_USER_ID, db_path=None):
+    """[(bucket_label, plays)] in time order, optionally limited to [start_ms, end_ms)."""
+    if bucket not in BUCKET_FORMATS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKET_FORMATS)}")
+
+    with db.connection(db_path) as conn:
+        return conn.execute(f"""
+            SELECT strftime('{BUCKET_FORMATS[bucket]}', played_at / 1000, 'unixepoch') AS bucket, COUNT(*)
+            FROM plays
+            WHERE user_id = ? AND played_at >= ? AND played_at < ?
+            GROUP BY bucket
+            ORDER BY bucket
+        """, (user_id, start_ms if start_ms is not None else 0,
+              end_ms if end_ms is not None else 2 ** 62)).fetchall()
+
+
+def track_features(user_id=LEGACY_USER_ID, db_path=None):
+    """One row per track the user played, for the recommender: track_id, track_name, artist, genre and play stats."""
+    return db.read_sql("""
+        SELECT t.id AS track_id, t.name AS track_name, a.name AS artist, a.genre,
+               c.plays, c.ms_played, c.skip_rate
+        FROM (SELECT track_id, COUNT(*) AS plays, AVG(ms_played) AS ms_played, AVG(skipped) AS skip_rate
+              FROM plays WHERE user_id = ? GROUP BY track_id) c
+        JOIN tracks t ON t.id = c.track_id
+        JOIN artists a ON a.id = t.artist_id
+        ORDER BY t.id
+    """, (user_id,), db_path=db_path)
+
+
+def play_sequence(user_id=LEGACY_USER_ID, db_path=None):
+    """(track_ids, played_at) NumPy arrays for every play of the user's, in time order."""
+    import numpy as np
+
+    with db.connection(db_path) as conn:
+        rows = conn.execute("SELECT track_id, played_at FROM plays WHERE user_id = ? ORDER BY played_at",
+                            (user_id,)).fetchall()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    sequence = np.array(rows, dtype=np.int64)
+    return sequence[:, 0], sequence[:, 1]
@@ -0,0 +1,317 @@
+"""Content-based track recommendations computed locally with NumPy.
+
+Every track becomes one row of a float32 matrix, built from four blocks:
+
+- co-listening: tracks played near each other in a listening session (plays
+  less than SESSION_GAP_MS apart) end up with similar vectors. Each track gets
+  a fixed random "index" vector and accumulates its neighbours' index vectors
+  (random indexing, i.e. a random projection of the co-occurrence matrix), so
+  no sparse matrix is ever materialized.
+- artist: one random vector per artist, shared by all of that artist's tracks
+- genre: one-hot over the most common genres
+- numeric: z-scored features such as duration_ms, popularity, plays, skip rate
+
+Rows are L2-normalized, so a dot product is cosine similarity and top-k
+queries are a single (batched) matrix multiplication. Catalogs larger than
+EXACT_SEARCH_MAX_ROWS get an IVF index: a spherical k-means groups the rows,
+and queries only score the rows in the NPROBE closest groups.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+SESSION_GAP_MS = 30 * 60 * 1000
+CO_LISTEN_WINDOW = 3  # Plays on either side that count as "listened together"
+CO_LISTEN_DIM = 48
+ARTIST_DIM = 16
+MAX_GENRES = 32
+NUMERIC_FEATURES = ("duration_ms", "popularity", "plays", "ms_played", "skip_rate")
+BLOCK_WEIGHTS = {"co_listen": 1.0, "artist": 0.7, "genre": 0.6, "numeric": 0.25}
+PAIR_CHUNK = 200_000
+
+EXACT_SEARCH_MAX_ROWS = 100_000
+KMEANS_ITERATIONS = 8
+NPROBE = 8
+SEARCH_BATCH_ROWS = 65536
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def _random_vectors(n, dim, seed):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def co_listen_vectors(track_rows, played_at_ms, n_tracks, dim=CO_LISTEN_DIM, window=CO_LISTEN_WINDOW, seed=1):
+    """Random-indexing embedding of which tracks get played together within a session.
+
+    `track_rows` / `played_at_ms` describe every play in time order.
+    """
+    index_vectors = _random_vectors(n_tracks, dim, seed)
+    context = np.zeros((n_tracks, dim), dtype=np.float32)
+    if len(track_rows) < 2:
+        return context
+
+    session = np.concatenate([[0], np.cumsum(np.diff(played_at_ms) > SESSION_GAP_MS)])
+    for offset in range(1, window + 1):
+        a, b = track_rows[:-offset], track_rows[offset:]
+        keep = (session[:-offset] == session[offset:]) & (a != b)
+        a, b = a[keep], b[keep]
+        for source, target in ((a, b), (b, a)):
+            # Sorted chunks + reduceat keep memory bounded and avoid slow np.add.at on 2-D rows
+            for start in range(0, len(source), PAIR_CHUNK):
+                chunk_source, chunk_target = source[start:start + PAIR_CHUNK], target[start:start + PAIR_CHUNK]
+                order = np.argsort(chunk_source, kind="stable")
+                chunk_source = chunk_source[order]
+                starts = np.flatnonzero(np.r_[True, chunk_source[1:] != chunk_source[:-1]])
+                context[chunk_source[starts]] += np.add.reduceat(index_vectors[chunk_target[order]], starts, axis=0)
+    return _normalize_rows(context)
+
+
+def build_vectors(tracks, track_rows=None, played_at_ms=None):
+    """Feature matrix (float32, L2-normalized rows) for a tracks frame.
+
+    `tracks` needs `artist`; `genre` and any NUMERIC_FEATURES columns are used
+    when present. `track_rows` / `played_at_ms` (plays in time order, as row
+    positions into `tracks`) add the co-listening block.
+    """
+    n = len(tracks)
+    blocks = []
+
+    if track_rows is not None and len(track_rows) > 1:
+        blocks.append(BLOCK_WEIGHTS["co_listen"] * co_listen_vectors(track_rows, played_at_ms, n))
+
+    artist_codes = pd.Categorical(tracks["artist"]).codes
+    artist_vectors = _normalize_rows(_random_vectors(artist_codes.max() + 2, ARTIST_DIM, seed=2))
+    blocks.append(BLOCK_WEIGHTS["artist"] * artist_vectors[artist_codes])
+
+    if "genre" in tracks.columns:
+        genres = tracks["genre"].astype("string").str.strip().str.lower()
+        genres = genres.where(~genres.isin(["", "unknown"]))
+        top_genres = genres.value_counts().index[:MAX_GENRES]
+        if len(top_genres):
+            one_hot = np.zeros((n, len(top_genres)), dtype=np.float32)
+            codes = pd.Categorical(genres, categories=top_genres).codes
+            one_hot[np.flatnonzero(codes >= 0), codes[codes >= 0]] = 1
+            blocks.append(BLOCK_WEIGHTS["genre"] * one_hot)
+
+    numeric = [name for name in NUMERIC_FEATURES if name in tracks.columns]
+    if numeric:
+        values = tracks[numeric].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64, copy=True)
+        if "plays" in numeric:
+            column = numeric.index("plays")
+            values[:, column] = np.log1p(values[:, column])
+        values = values[:, ~np.isnan(values).all(axis=0)]  # All-NULL columns (e.g. no audio features yet)
+        if values.shape[1]:
+            std = np.nanstd(values, axis=0)
+            z_scores = np.nan_to_num((values - np.nanmean(values, axis=0)) / np.where(std > 0, std, 1))
+            blocks.append(BLOCK_WEIGHTS["numeric"] * z_scores.astype(np.float32) / np.sqrt(values.shape[1]))
+
+    return _normalize_rows(np.hstack(blocks).astype(np.float32))
+
+
+class VectorIndex:
+    """Top-k cosine search over L2-normalized rows: exact, or IVF when `centroids` is set."""
+
+    def __init__(self, vectors, centroids=None, list_offsets=None, list_rows=None):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+
+    @classmethod
+    def build(cls, vectors, approximate=None, seed=3):
+        n = len(vectors)
+        if not (approximate if approximate is not None else n > EXACT_SEARCH_MAX_ROWS):
+            return cls(vectors)
+
+        # 🧭 Spherical k-means on a sample; ~sqrt(n) lists keeps both steps of a query cheap
+        n_lists = int(min(max(np.sqrt(n), 1), 4096))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, size=min(n, n_lists * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]  # Re-seed empty lists
+            centroids = _normalize_rows(sums)
+
+        assignment = np.concatenate([np.argmax(vectors[start:start + SEARCH_BATCH_ROWS] @ centroids.T, axis=1)
+                                     for start in range(0, n, SEARCH_BATCH_ROWS)])
+        list_rows = np.argsort(assignment, kind="stable").astype(np.int64)
+        list_offsets = np.searchsorted(assignment[list_rows], np.arange(n_lists + 1)).astype(np.int64)
+        return cls(vectors, centroids, list_offsets, list_rows)
+
+    @property
+    def approximate(self):
+        return self.centroids is not None
+
+    def search(self, queries, k=10, exclude=None, nprobe=NPROBE):
+        """Returns [[(row, score)]] per query row, best first; `exclude` rows never appear."""
+        queries = _normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        exclude = np.asarray(sorted(exclude or ()), dtype=np.int64)
+
+        if not self.approximate:
+            # Batched matrix multiply over row blocks keeps the score matrix small
+            candidates = np.arange(len(self.vectors))
+            scores = np.hstack([queries @ self.vectors[start:start + SEARCH_BATCH_ROWS].T
+                                for start in range(0, len(self.vectors), SEARCH_BATCH_ROWS)])
+            return [self._top_k(candidates, row_scores, k, exclude) for row_scores in scores]
+
+        results = []
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+        for query, lists in zip(queries, probes):
+            candidates = np.concatenate([self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists])
+            results.append(self._top_k(candidates, self.vectors[candidates] @ query, k, exclude))
+        return results
+
+    @staticmethod
+    def _top_k(candidates, scores, k, exclude):
+        if len(exclude):
+            keep = ~np.isin(candidates, exclude)
+            candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(candidates[i]), round(float(scores[i]), 4)) for i in order]
+
+
+class Recommender:
+    """Track vectors plus the caller's ids for each row (track IDs, dataset row numbers, ...)."""
+
+    FILES = ("ids", "vectors", "centroids", "list_offsets", "list_rows")
+
+    def __init__(self, ids, index):
+        self.ids = np.asarray(ids)
+        self.index = index
+        self.row_of = {int(track_id): row for row, track_id in enumerate(self.ids)}
+
+    @classmethod
+    def build(cls, tracks, ids, play_ids=None, played_at_ms=None, approximate=None):
+        """`tracks` holds one row per track with `ids`; `play_ids` lists every play's id in time order."""
+        track_rows = None
+        if play_ids is not None and len(play_ids):
+            order = np.argsort(ids)
+            positions = np.minimum(np.searchsorted(np.asarray(ids)[order], play_ids), len(ids) - 1)
+            known = np.asarray(ids)[order][positions] == play_ids
+            track_rows, played_at_ms = order[positions[known]], np.asarray(played_at_ms)[known]
+        vectors = build_vectors(tracks, track_rows, played_at_ms)
+        return cls(ids, VectorIndex.build(vectors, approximate=approximate))
+
+    @classmethod
+    def from_frame(cls, df):
+        """Recommender over an uploaded dataset. Ids are the first row of each (artist, track_name)
+        pair, the same rows SearchIndex returns; each row counts as one play."""
+        artist_codes = pd.Categorical(df["artist"]).codes.astype(np.int64)
+        track_codes = pd.Categorical(df["track_name"]).codes.astype(np.int64)
+        pair = pd.Series(artist_codes * (track_codes.max() + 2) + track_codes)
+        group = pair.groupby(pair, sort=False).ngroup().to_numpy()
+        first_rows = np.flatnonzero(~pair.duplicated().to_numpy())
+
+        tracks = pd.DataFrame({"artist": df["artist"].to_numpy()[first_rows],
+                               "plays": np.bincount(group, minlength=len(first_rows))})
+        if "genre" in df.columns:
+            tracks["genre"] = df["genre"].to_numpy()[first_rows]
+        for name in NUMERIC_FEATURES:
+            if name in df.columns and name != "plays":
+                tracks[name] = pd.to_numeric(df[name], errors="coerce").groupby(group).mean().to_numpy()
+
+        # ⏱️ Exports with a timestamp column also get the co-listening block
+        play_ids = played_at_ms = None
+        time_column = next((name for name in ("played_at", "ts", "endTime") if name in df.columns), None)
+        if time_column:
+            played_at = pd.to_datetime(df[time_column], errors="coerce", utc=True)
+            valid = played_at.notna().to_numpy()
+            played_at_ms = ((played_at[valid] - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(milliseconds=1)).to_numpy()
+            order = np.argsort(played_at_ms, kind="stable")
+            play_ids, played_at_ms = first_rows[group[valid]][order], played_at_ms[order]
+        return cls.build(tracks, first_rows, play_ids, played_at_ms)
+
+    @classmethod
+    def from_history(cls, user_id=None, db_path=None):
+        """Recommender over every track in a user's listening history; ids are track IDs."""
+        import queries
+
+        user_id = queries.LEGACY_USER_ID if user_id is None else user_id
+        tracks = queries.track_features(user_id, db_path)
+        play_ids, played_at_ms = queries.play_sequence(user_id, db_path)
+        return cls.build(tracks, tracks["track_id"].to_numpy(), play_ids, played_at_ms)
+
+    def similar(self, seed_ids, k=10, weights=None, exclude_seeds=True):
+        """[(id, score)] for the tracks closest to the (weighted) mean of the seeds' vectors."""
+        known = [int(track_id) in self.row_of for track_id in seed_ids]
+        rows = [self.row_of[int(track_id)] for track_id, keep in zip(seed_ids, known) if keep]
+        if not rows:
+            return []
+        weights = np.ones(len(rows)) if weights is None else np.asarray(weights, dtype=np.float64)[known]
+        profile = (weights[:, None] * self.index.vectors[rows]).sum(axis=0)
+        matches = self.index.search(profile, k=k, exclude=rows if exclude_seeds else None)[0]
+        return [(self.ids[row].item(), score) for row, score in matches]
+
+    # 💾 Persistence
+    def save(self, directory):
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-recommender-")
+        arrays = {"ids": self.ids, "vectors": self.index.vectors, "centroids": self.index.centroids,
+                  "list_offsets": self.index.list_offsets, "list_rows": self.index.list_rows}
+        for name, array in arrays.items():
+            if array is not None:
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), array, allow_pickle=False)
+        try:
+            os.rename(tmp_dir, directory)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)  # Built concurrently by another worker
+
+    @classmethod
+    def load(cls, directory):
+        arrays = {}
+        for name in cls.FILES:
+            path = os.path.join(directory, f"{name}.npy")
+            arrays[name] = np.load(path, mmap_mode="r", allow_pickle=False) if os.path.exists(path) else None
+        index = VectorIndex(arrays["vectors"], arrays["centroids"], arrays["list_offsets"], arrays["list_rows"])
+        return cls(np.asarray(arrays["ids"]), index)
+
+
+class RecommenderCache:
+    """Loaded recommenders by directory (LRU). Missing ones are built with `build()` and saved."""
+
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.recommenders = OrderedDict()
+        self.counters = {"hits": 0, "loads": 0, "builds": 0}
+
+    def get(self, directory, build):
+        with self.lock:
+            if directory in self.recommenders:
+                self.recommenders.move_to_end(directory)
+                self.counters["hits"] += 1
+                return self.recommenders[directory]
+
+        if os.path.exists(directory):
+            recommender, counter = Recommender.load(directory), "loads"
+        else:
+            recommender, counter = build(), "builds"
+            recommender.save(directory)
+
+        with self.lock:
+            self.counters[counter] += 1
+            self.recommenders[directory] = recommender
+            while len(self.recommenders) > self.max_entries:
+                self.recommenders.popitem(last=False)
+        return recommender
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "loaded": len(self.recommenders)}
@@ -0,0 +1,112 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# endpoint -> (fresh for, then served stale while refreshing for) in seconds.
+# Top lists are keyed by time_range: long_term barely moves, short_term does.
+DEFAULT_TTLS = {
+    "me": (24 * 3600, 24 * 3600),
+    "me/top/artists:long_term": (6 * 3600, 18 * 3600),
+    "me/top/artists:medium_term": (3600, 6 * 3600),
+    "me/top/artists:short_term": (15 * 60, 3600),
+    "me/top/tracks:long_term": (6 * 3600, 18 * 3600),
+    "me/top/tracks:medium_term": (3600, 6 * 3600),
+    "me/top/tracks:short_term": (15 * 60, 3600),
+    "recommendations": (30 * 60, 3600),
+    "artists": (3 * 24 * 3600, 4 * 24 * 3600),
+    "artists/{id}": (3 * 24 * 3600, 4 * 24 * 3600),
+}
+SHARED_ENDPOINTS = {"artists", "artists/{id}"}  # Public catalog data: identical for every user
+TOP_ENDPOINTS = {"me/top/artists", "me/top/tracks"}
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+FRESH, STALE, MISS = "fresh", "stale", "miss"
+
+
+class ResponseCache:
+    """In-memory cache of Spotify GET responses (raw JSON bytes), LRU-evicted by total size.
+
+    Only endpoints with a TTL are cached; anything else (e.g. recently-played,
+    which must stay live for sync) always goes to Spotify. Keys include a scope:
+    "shared" for catalog endpoints, otherwise the Spotify user the token belongs
+    to, so one user's data is never served to another. Entries past their TTL
+    are still returned during the stale window while a refresh runs.
+    Overrides: SPOTIFY_CACHE_TTLS='{"artists/{id}": [86400, 86400]}'.
+    """
+
+    def __init__(self, ttls=None, max_bytes=None):
+        self.ttls = {**DEFAULT_TTLS, **json.loads(os.getenv("SPOTIFY_CACHE_TTLS", "{}")), **(ttls or {})}
+        self.max_bytes = max_bytes or int(os.getenv("SPOTIFY_CACHE_MB", "64")) * 1024 * 1024
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (body, fetched_at, ttl, stale_for)
+        self.bytes = 0
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0,
+                         "evictions": 0}
+        self.endpoint_counters = {}
+
+    def policy(self, endpoint, params):
+        """(ttl, stale_for, shared) for a request, or None when it must not be cached."""
+        name = endpoint
+        if endpoint in TOP_ENDPOINTS:
+            name = f"{endpoint}:{params.get('time_range', 'medium_term')}"
+        if name not in self.ttls:
+            return None
+        ttl, stale_for = self.ttls[name]
+        return ttl, stale_for, endpoint in SHARED_ENDPOINTS
+
+    def _count(self, endpoint, counter):
+        self.counters[counter] += 1
+        per_endpoint = self.endpoint_counters.setdefault(endpoint, {"hits": 0, "stale_hits": 0, "misses": 0})
+        if counter in per_endpoint:
+            per_endpoint[counter] += 1
+
+    def lookup(self, key, endpoint):
+        """Returns (FRESH | STALE | MISS, body)."""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                body, fetched_at, ttl, stale_for = entry
+                age = now - fetched_at
+                if age < ttl + stale_for:
+                    self.entries.move_to_end(key)
+                    state = FRESH if age < ttl else STALE
+                    self._count(endpoint, "hits" if state == FRESH else "stale_hits")
+                    return state, body
+                self._remove(key)
+            self._count(endpoint, "misses")
+            return MISS, None
+
+    def put(self, key, body, ttl, stale_for):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            if len(body) > self.max_bytes:
+                return
+            self.entries[key] = (body, time.time(), ttl, stale_for)
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.counters["evictions"] += 1
+
+    def _remove(self, key):
+        body = self.entries.pop(key)[0]
+        self.bytes -= len(body)
+
+    def record_refresh(self, ok):
+        with self.lock:
+            self.counters["refreshes" if ok else "refresh_errors"] += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["stale_hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round((self.counters["hits"] + self.counters["stale_hits"]) / lookups, 3) if lookups else None,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "endpoints": {name: dict(counters) for name, counters in sorted(self.endpoint_counters.items())},
+            }
@@ -0,0 +1,207 @@
+"""Time-series analytics served from the rollup tables (see schema._v5_rollups).
+
+catch_up() folds plays added since the last run into rollup_hourly and
+rollup_daily, a chunk of play IDs at a time, so its cost depends on how many
+plays are new rather than on the size of the history. The readers below
+(heatmap, trends, streaks) only touch the rollups and the small artists
+table, never plays.
+
+All buckets are UTC. heatmap() can shift by a whole-hour timezone offset.
+Rollup rows are keyed by user first, so every reader touches one user's rows.
+"""
+import time
+from datetime import date, datetime, timezone
+
+import db
+from schema import LEGACY_USER_ID
+
+ROLLUP_CHUNK_PLAYS = 200_000
+MS_PER_HOUR = 3_600_000
+MS_PER_DAY = 86_400_000
+TREND_BUCKETS = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+GROUP_COLUMNS = {"artist": "a.name", "genre": "COALESCE(a.genre, 'Unknown')"}
+
+ROLLUP_SQL = """
+    INSERT INTO {table} (user_id, {bucket}, artist_id, plays, ms_played)
+    SELECT user_id, played_at / {size}, artist_id, COUNT(*), COALESCE(SUM(ms_played), 0)
+    FROM plays
+    WHERE id > ? AND id <= ?
+    GROUP BY 1, 2, 3
+    ON CONFLICT (user_id, {bucket}, artist_id) DO UPDATE SET
+        plays = plays + excluded.plays,
+        ms_played = ms_played + excluded.ms_played
+"""
+PENDING_SQL = """
+    SELECT COALESCE((SELECT MAX(id) FROM plays), 0) >
+           (SELECT last_play_id FROM rollup_state WHERE name = 'plays')
+"""
+
+
+def catch_up(chunk=ROLLUP_CHUNK_PLAYS, progress=None, db_path=None):
+    """Adds plays newer than the watermark to the rollups. Returns how many plays were folded in.
+
+    Each chunk reads the watermark, aggregates and moves the watermark in one
+    IMMEDIATE transaction, so concurrent workers can never count a play twice.
+    """
+    folded = 0
+    while True:
+        with db.connection(db_path) as conn:
+            # Plain read first: requests call this on every read, and the common "nothing new"
+            # case must not take the write lock and queue behind syncs and imports
+            if not conn.execute(PENDING_SQL).fetchone()[0]:
+                return folded
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                last_id = conn.execute("SELECT last_play_id FROM rollup_state WHERE name = 'plays'").fetchone()[0]
+                max_id = conn.execute("SELECT MAX(id) FROM plays").fetchone()[0] or 0
+                if max_id <= last_id:
+                    conn.rollback()
+                    return folded
+
+                upper = min(max_id, last_id + chunk)
+                for table, bucket, size in (("rollup_hourly", "hour", MS_PER_HOUR), ("rollup_daily", "day", MS_PER_DAY)):
+                    conn.execute(ROLLUP_SQL.format(table=table, bucket=bucket, size=size), (last_id, upper))
+                folded += conn.execute("SELECT COUNT(*) FROM plays WHERE id > ? AND id <= ?",
+                                       (last_id, upper)).fetchone()[0]
+                conn.execute("UPDATE rollup_state SET last_play_id = ? WHERE name = 'plays'", (upper,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        if progress:
+            progress(upper, max_id)
+
+
+def rebuild(db_path=None):
+    """Drops every rollup row and recounts from scratch (e.g. after deleting plays by hand)."""
+    with db.transaction(db_path) as conn:
+        conn.execute("DELETE FROM rollup_hourly")
+        conn.execute("DELETE FROM rollup_daily")
+        conn.execute("UPDATE rollup_state SET last_play_id = 0 WHERE name = 'plays'")
+    return catch_up(db_path=db_path)
+
+
+def to_day(value):
+    """'YYYY-MM-DD' (or a date) -> days since the epoch."""
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return (value - date(1970, 1, 1)).days
+
+
+def _filters(user_id, start_day, end_day, artist, genre, bucket_column, bucket_per_day=1):
+    """(JOIN, WHERE, params) over a rollup aliased `r`; artists `a` is only joined when filtered on.
+
+    end_day is inclusive.
+    """
+    where, params = ["r.user_id = ?"], [user_id]
+    if start_day is not None:
+        where.append(f"r.{bucket_column} >= ?")
+        params.append(to_day(start_day) * bucket_per_day)
+    if end_day is not None:
+        where.append(f"r.{bucket_column} < ?")
+        params.append((to_day(end_day) + 1) * bucket_per_day)
+    if artist:
+        where.append("a.name = ?")
+        params.append(artist)
+    if genre:
+        where.append("COALESCE(a.genre, 'Unknown') = ?")
+        params.append(genre)
+    join = "JOIN artists a ON a.id = r.artist_id" if artist or genre else ""
+    return join, "WHERE " + " AND ".join(where), params
+
+
+def heatmap(tz_offset_minutes=0, start_day=None, end_day=None, artist=None, genre=None,
+            user_id=LEGACY_USER_ID, db_path=None):
+    """Plays by weekday (0 = Monday) x local hour, as a 7 x 24 grid, from the hourly rollup."""
+    offset = round(tz_offset_minutes / 60)
+    join, where, params = _filters(user_id, start_day, end_day, artist, genre, "hour", bucket_per_day=24)
+    grid = [[0] * 24 for _ in range(7)]
+    with db.connection(db_path) as conn:
+        # Sum per hour first (walks the primary key in order), then fold hours into the grid.
+        # 1970-01-01 was a Thursday (weekday 3).
+        rows = conn.execute(f"""
+            SELECT ((hour + ?) / 24 + 3) % 7 AS weekday, (hour + ?) % 24 AS hour_of_day, SUM(plays)
+            FROM (SELECT r.hour, SUM(r.plays) AS plays FROM rollup_hourly r {join} {where} GROUP BY r.hour)
+            GROUP BY 1, 2
+        """, [offset, offset, *params]).fetchall()
+    for weekday, hour_of_day, plays in rows:
+        grid[weekday][hour_of_day] = plays
+    return {"tz_offset_hours": offset, "weekdays": ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"], "plays": grid}
+
+
+def trends(bucket="month", start_day=None, end_day=None, by=None, limit=5, user_id=LEGACY_USER_ID, db_path=None):
+    """Plays (and minutes) per day/week/month, plus one series per top artist or genre when `by` is set."""
+    if bucket not in TREND_BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(TREND_BUCKETS)}")
+    if by is not None and by not in GROUP_COLUMNS:
+        raise ValueError(f"by must be one of {', '.join(GROUP_COLUMNS)}")
+
+    # Labels are computed once per day after summing, not once per rollup row
+    label = f"strftime('{TREND_BUCKETS[bucket]}', day * 86400, 'unixepoch')"
+    _, where, params = _filters(user_id, start_day, end_day, None, None, "day")
+    with db.connection(db_path) as conn:
+        totals = conn.execute(f"""
+            SELECT {label} AS bucket, SUM(plays), SUM(ms_played) / 60000
+            FROM (SELECT r.day, SUM(r.plays) AS plays, SUM(r.ms_played) AS ms_played
+                  FROM rollup_daily r {where} GROUP BY r.day)
+            GROUP BY bucket ORDER BY bucket
+        """, params).fetchall()
+        result = {"bucket": bucket, "labels": [row[0] for row in totals], "plays": [row[1] for row in totals],
+                  "minutes_played": [row[2] for row in totals], "series": []}
+        if by is None or not totals:
+            return result
+
+        column = GROUP_COLUMNS[by]
+        top = [name for name, _ in conn.execute(f"""
+            SELECT {column} AS name, SUM(r.plays) AS plays
+            FROM rollup_daily r JOIN artists a ON a.id = r.artist_id
+            {where}
+            GROUP BY name ORDER BY plays DESC, name LIMIT ?
+        """, [*params, limit]).fetchall()]
+        in_top = f"{column} IN ({','.join('?' * len(top))})"
+        rows = conn.execute(f"""
+            SELECT {label} AS bucket, name, SUM(plays)
+            FROM (SELECT r.day, {column} AS name, SUM(r.plays) AS plays
+                  FROM rollup_daily r JOIN artists a ON a.id = r.artist_id
+                  {where} AND {in_top}
+                  GROUP BY r.day, name)
+            GROUP BY bucket, name
+        """, [*params, *top]).fetchall()
+
+    position = {name: i for i, name in enumerate(result["labels"])}
+    series = {name: [0] * len(position) for name in top}
+    for bucket_label, name, plays in rows:
+        series[name][position[bucket_label]] = plays
+    result["series"] = [{"name": name, "plays": series[name]} for name in top]
+    return result
+
+
+def streaks(today=None, user_id=LEGACY_USER_ID, db_path=None):
+    """Current and longest runs of consecutive UTC days on which the user played something."""
+    today = to_day(today) if today is not None else int(time.time() // 86400)
+    with db.connection(db_path) as conn:
+        # Gaps and islands: day - row_number is constant within a run of consecutive days
+        runs = conn.execute("""
+            SELECT MIN(day), MAX(day), COUNT(*)
+            FROM (SELECT day, day - ROW_NUMBER() OVER (ORDER BY day) AS island
+                  FROM (SELECT DISTINCT day FROM rollup_daily WHERE user_id = ?))
+            GROUP BY island
+        """, (user_id,)).fetchall()
+
+    def iso(day):
+        return datetime.fromtimestamp(day * 86400, tz=timezone.utc).date().isoformat()
+
+    if not runs:
+        return {"active_days": 0, "current_streak_days": 0, "longest_streak_days": 0}
+    first, last, length = max(runs, key=lambda run: (run[2], run[1]))
+    latest = max(runs, key=lambda run: run[1])
+    current = latest[2] if latest[1] >= today - 1 else 0  # Still alive if you listened yesterday
+    return {
+        "active_days": sum(run[2] for run in runs),
+        "current_streak_days": current,
+        "current_streak_start": iso(latest[0]) if current else None,
+        "longest_streak_days": length,
+        "longest_streak_start": iso(first),
+        "longest_streak_end": iso(last),
+        "last_active_day": iso(latest[1]),
+    }
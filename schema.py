@@ -0,0 +1,479 @@
+"""Versioned schema migrations for spotify_data.db.
+
+The applied version is kept in SQLite's `PRAGMA user_version`. Run
+`python schema.py [db_path]` to migrate an existing database ahead of a
+deploy; the app also calls migrate() on startup.
+"""
+import logging
+import os
+import sys
+import time
+
+import db
+
+log = logging.getLogger(__name__)
+
+# Owner of plays stored before plays had a user key (and of rows written without one).
+# Set SPOTIFY_LEGACY_USER_ID before migrating to hand the old history to a Spotify user,
+# or move it later with shards.claim_plays().
+LEGACY_USER_ID = ""
+
+# played_at is stored as unix milliseconds; the view turns it back into Spotify's ISO format
+PLAYED_AT_MS_SQL = "CAST(ROUND((julianday({column}) - 2440587.5) * 86400000) AS INTEGER)"
+PLAYED_AT_ISO_SQL = "strftime('%Y-%m-%dT%H:%M:%fZ', {column} / 1000.0, 'unixepoch')"
+
+NORMALIZED_TABLES = [
+    """
+    CREATE TABLE artists (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        spotify_id TEXT,
+        genre TEXT
+    )
+    """,
+    "CREATE INDEX idx_artists_spotify_id ON artists (spotify_id)",
+    "CREATE INDEX idx_artists_genre ON artists (genre)",
+    """
+    CREATE TABLE tracks (
+        id INTEGER PRIMARY KEY,
+        artist_id INTEGER NOT NULL REFERENCES artists (id),
+        name TEXT,
+        UNIQUE (artist_id, name)
+    )
+    """,
+    """
+    CREATE TABLE plays (
+        id INTEGER PRIMARY KEY,
+        track_id INTEGER NOT NULL REFERENCES tracks (id),
+        artist_id INTEGER NOT NULL REFERENCES artists (id),
+        played_at INTEGER NOT NULL UNIQUE
+    )
+    """,
+    # Top-artist / genre charts group plays by artist; time charts filter on played_at
+    "CREATE INDEX idx_plays_artist ON plays (artist_id, played_at)",
+    "CREATE INDEX idx_plays_track ON plays (track_id)",
+]
+
+
+def _v1_listening_history(conn):
+    """The original single-table layout (plus the artist_id column)."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS listening_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        track_name TEXT,
+        artist TEXT,
+        played_at TEXT UNIQUE,
+        genre TEXT,
+        artist_id TEXT
+    )
+    """)
+
+    # Older databases were created before we stored the Spotify artist ID
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(listening_history)")]
+    if "artist_id" not in columns:
+        conn.execute("ALTER TABLE listening_history ADD COLUMN artist_id TEXT")
+
+
+def _v2_normalize(conn):
+    """Splits listening_history into artists / tracks / plays.
+
+    Genre lives on `artists`, so a genre update touches one row per artist
+    instead of one per play. `listening_history` becomes a read-only view with
+    the old columns so exports and ad-hoc queries keep working.
+    """
+    # executescript() would COMMIT first, so run the DDL one statement at a time
+    for statement in NORMALIZED_TABLES:
+        conn.execute(statement)
+
+    # Keep the most specific genre we have for each artist
+    conn.execute("""
+    INSERT INTO artists (name, spotify_id, genre)
+    SELECT artist, MAX(artist_id), COALESCE(MAX(NULLIF(genre, 'Unknown')), MAX(genre))
+    FROM listening_history
+    WHERE artist IS NOT NULL
+    GROUP BY artist
+    """)
+    conn.execute("""
+    INSERT OR IGNORE INTO tracks (artist_id, name)
+    SELECT DISTINCT a.id, lh.track_name
+    FROM listening_history lh JOIN artists a ON a.name = lh.artist
+    """)
+    conn.execute(f"""
+    INSERT OR IGNORE INTO plays (id, track_id, artist_id, played_at)
+    SELECT lh.id, t.id, a.id, {PLAYED_AT_MS_SQL.format(column="lh.played_at")}
+    FROM listening_history lh
+    JOIN artists a ON a.name = lh.artist
+    JOIN tracks t ON t.artist_id = a.id AND t.name IS lh.track_name
+    WHERE julianday(lh.played_at) IS NOT NULL
+    """)
+
+    skipped = conn.execute("SELECT COUNT(*) FROM listening_history").fetchone()[0] - \
+        conn.execute("SELECT COUNT(*) FROM plays").fetchone()[0]
+    if skipped:
+        log.warning("⚠️ Skipped %d rows with a missing artist or unparseable played_at", skipped)
+
+    conn.execute("DROP TABLE listening_history")
+    conn.execute(f"""
+    CREATE VIEW listening_history AS
+    SELECT p.id AS id,
+           t.name AS track_name,
+           a.name AS artist,
+           {PLAYED_AT_ISO_SQL.format(column="p.played_at")} AS played_at,
+           a.genre AS genre,
+           a.spotify_id AS artist_id
+    FROM plays p
+    JOIN tracks t ON t.id = p.track_id
+    JOIN artists a ON a.id = p.artist_id
+    """)
+
+
+def _v3_data_version(conn):
+    """Counter bumped whenever an artist's genre changes, so caches keyed on the data can tell."""
+    conn.execute("CREATE TABLE data_version (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+    conn.execute("INSERT INTO data_version (name, version) VALUES ('genres', 0)")
+    conn.execute("""
+    CREATE TRIGGER bump_genre_version AFTER UPDATE OF genre ON artists
+    WHEN OLD.genre IS NOT NEW.genre
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE name = 'genres';
+    END
+    """)
+
+
+PLAY_DETAIL_COLUMNS = [
+    ("ms_played", "INTEGER"),
+    ("platform", "TEXT"),
+    ("skipped", "INTEGER"),
+    ("shuffle", "INTEGER"),
+    ("reason_start", "TEXT"),
+    ("reason_end", "TEXT"),
+]
+
+
+def _v4_play_details(conn):
+    """Per-play details from Spotify's extended streaming history exports (NULL for API syncs)."""
+    for column, column_type in PLAY_DETAIL_COLUMNS:
+        conn.execute(f"ALTER TABLE plays ADD COLUMN {column} {column_type}")
+
+    conn.execute("DROP VIEW listening_history")
+    conn.execute(f"""
+    CREATE VIEW listening_history AS
+    SELECT p.id AS id,
+           t.name AS track_name,
+           a.name AS artist,
+           {PLAYED_AT_ISO_SQL.format(column="p.played_at")} AS played_at,
+           a.genre AS genre,
+           a.spotify_id AS artist_id,
+           {", ".join(f"p.{column} AS {column}" for column, _ in PLAY_DETAIL_COLUMNS)}
+    FROM plays p
+    JOIN tracks t ON t.id = p.track_id
+    JOIN artists a ON a.id = p.artist_id
+    """)
+
+
+def _v5_rollups(conn):
+    """Hourly / daily play counts per artist, filled incrementally by rollups.catch_up().
+
+    Buckets are UTC hours and days since the epoch. Genre is joined from artists
+    at read time, so genre fixes never require a rebuild. rollup_state holds the
+    highest plays.id already counted; it starts at 0 so the first catch-up
+    backfills existing history.
+    """
+    for table, bucket in (("rollup_hourly", "hour"), ("rollup_daily", "day")):
+        conn.execute(f"""
+        CREATE TABLE {table} (
+            {bucket} INTEGER NOT NULL,
+            artist_id INTEGER NOT NULL REFERENCES artists (id),
+            plays INTEGER NOT NULL,
+            ms_played INTEGER NOT NULL,
+            PRIMARY KEY ({bucket}, artist_id)
+        ) WITHOUT ROWID
+        """)
+    conn.execute("CREATE TABLE rollup_state (name TEXT PRIMARY KEY, last_play_id INTEGER NOT NULL)")
+    conn.execute("INSERT INTO rollup_state (name, last_play_id) VALUES ('plays', 0)")
+
+
+def _v6_per_user_plays(conn):
+    """Gives every play an owner: plays.user_id, unique per (user_id, played_at).
+
+    Two users listening at the same millisecond no longer collide, and the
+    indexes lead with user_id so charts and exports read one user's rows only.
+    SQLite can't change a UNIQUE constraint in place, so plays is rebuilt
+    (keeping its ids). The rollups gain a user key and are rebuilt by the next
+    catch-up; data_version gets a per-user plays counter.
+    """
+    owner = os.getenv("SPOTIFY_LEGACY_USER_ID", LEGACY_USER_ID)
+    detail_columns = ", ".join(column for column, _ in PLAY_DETAIL_COLUMNS)
+
+    conn.execute("DROP VIEW listening_history")
+    conn.execute(f"""
+    CREATE TABLE plays_v6 (
+        id INTEGER PRIMARY KEY,
+        user_id TEXT NOT NULL DEFAULT '',
+        track_id INTEGER NOT NULL REFERENCES tracks (id),
+        artist_id INTEGER NOT NULL REFERENCES artists (id),
+        played_at INTEGER NOT NULL,
+        {", ".join(f"{column} {column_type}" for column, column_type in PLAY_DETAIL_COLUMNS)},
+        UNIQUE (user_id, played_at)
+    )
+    """)
+    conn.execute(f"""
+    INSERT INTO plays_v6 (id, user_id, track_id, artist_id, played_at, {detail_columns})
+    SELECT id, ?, track_id, artist_id, played_at, {detail_columns} FROM plays
+    """, (owner,))
+    conn.execute("DROP TABLE plays")
+    conn.execute("ALTER TABLE plays_v6 RENAME TO plays")
+    # (user_id, played_at) is covered by the UNIQUE constraint's index
+    conn.execute("CREATE INDEX idx_plays_user_artist ON plays (user_id, artist_id, played_at)")
+    conn.execute("CREATE INDEX idx_plays_user_track ON plays (user_id, track_id)")
+
+    conn.execute(f"""
+    CREATE VIEW listening_history AS
+    SELECT p.id AS id,
+           p.user_id AS user_id,
+           t.name AS track_name,
+           a.name AS artist,
+           {PLAYED_AT_ISO_SQL.format(column="p.played_at")} AS played_at,
+           a.genre AS genre,
+           a.spotify_id AS artist_id,
+           {", ".join(f"p.{column} AS {column}" for column, _ in PLAY_DETAIL_COLUMNS)}
+    FROM plays p
+    JOIN tracks t ON t.id = p.track_id
+    JOIN artists a ON a.id = p.artist_id
+    """)
+
+    for table, bucket in (("rollup_hourly", "hour"), ("rollup_daily", "day")):
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"""
+        CREATE TABLE {table} (
+            user_id TEXT NOT NULL,
+            {bucket} INTEGER NOT NULL,
+            artist_id INTEGER NOT NULL REFERENCES artists (id),
+            plays INTEGER NOT NULL,
+            ms_played INTEGER NOT NULL,
+            PRIMARY KEY (user_id, {bucket}, artist_id)
+        ) WITHOUT ROWID
+        """)
+    conn.execute("UPDATE rollup_state SET last_play_id = 0 WHERE name = 'plays'")
+
+    conn.execute("""
+    INSERT INTO data_version (name, version)
+    SELECT 'plays:' || user_id, COUNT(*) FROM plays GROUP BY user_id
+    """)
+
+
+def _v7_artist_spotify_ids(conn):
+    """Keys artists on their Spotify ID instead of their name.
+
+    Two artists can share a name, and an artist who is renamed on Spotify
+    stays one row. Rows without an ID (streaming history exports) are still
+    one per name. SQLite can't drop the UNIQUE on name in place, so artists is
+    rebuilt (keeping its ids). Where several names already share an ID, the
+    oldest row keeps it and the others become name-only.
+    """
+    conn.execute("DROP VIEW listening_history")
+    conn.execute("""
+    CREATE TABLE artists_v7 (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        spotify_id TEXT,
+        genre TEXT
+    )
+    """)
+    conn.execute("""
+    INSERT INTO artists_v7 (id, name, spotify_id, genre)
+    SELECT a.id, a.name,
+           CASE WHEN a.id = (SELECT MIN(id) FROM artists WHERE spotify_id = a.spotify_id)
+                THEN NULLIF(a.spotify_id, '') END,
+           a.genre
+    FROM artists a
+    """)
+    demoted = conn.execute("SELECT COUNT(*) FROM artists_v7 WHERE spotify_id IS NULL").fetchone()[0] - \
+        conn.execute("SELECT COUNT(*) FROM artists WHERE NULLIF(spotify_id, '') IS NULL").fetchone()[0]
+    if demoted:
+        log.warning("⚠️ %d artists shared a Spotify ID with an older row and are now matched by name", demoted)
+
+    conn.execute("DROP TABLE artists")
+    conn.execute("ALTER TABLE artists_v7 RENAME TO artists")
+    conn.execute("CREATE UNIQUE INDEX idx_artists_spotify_id ON artists (spotify_id) WHERE spotify_id IS NOT NULL")
+    conn.execute("CREATE UNIQUE INDEX idx_artists_name_only ON artists (name) WHERE spotify_id IS NULL")
+    conn.execute("CREATE INDEX idx_artists_name ON artists (name)")
+    conn.execute("CREATE INDEX idx_artists_genre ON artists (genre)")
+    conn.execute("""
+    CREATE TRIGGER bump_genre_version AFTER UPDATE OF genre ON artists
+    WHEN OLD.genre IS NOT NEW.genre
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE name = 'genres';
+    END
+    """)
+
+    conn.execute(f"""
+    CREATE VIEW listening_history AS
+    SELECT p.id AS id,
+           p.user_id AS user_id,
+           t.name AS track_name,
+           a.name AS artist,
+           {PLAYED_AT_ISO_SQL.format(column="p.played_at")} AS played_at,
+           a.genre AS genre,
+           a.spotify_id AS artist_id,
+           {", ".join(f"p.{column} AS {column}" for column, _ in PLAY_DETAIL_COLUMNS)}
+    FROM plays p
+    JOIN tracks t ON t.id = p.track_id
+    JOIN artists a ON a.id = p.artist_id
+    """)
+
+
+MIGRATIONS = [
+    (1, "listening_history table", _v1_listening_history),
+    (2, "normalize into artists / tracks / plays", _v2_normalize),
+    (3, "data_version counters", _v3_data_version),
+    (4, "play details from streaming history exports", _v4_play_details),
+    (5, "hourly / daily rollups", _v5_rollups),
+    (6, "per-user plays", _v6_per_user_plays),
+    (7, "artists keyed on Spotify ID", _v7_artist_spotify_ids),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(db_path=None):
+    with db.connection(db_path) as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_path=None):
+    """Applies every pending migration, each in its own transaction. Returns the final version."""
+    version = get_version(db_path)
+    for target, description, apply in MIGRATIONS:
+        if target <= version:
+            continue
+
+        log.info("🛠️ Migrating database to v%d: %s...", target, description)
+        start = time.perf_counter()
+        with db.connection(db_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= target:
+                    conn.rollback()  # Another process (e.g. a second worker) got here first
+                    version = target
+                    continue
+                apply(conn)
+                conn.execute(f"PRAGMA user_version = {target}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        version = target
+        log.info("✅ Migrated to v%d in %.2fs", target, time.perf_counter() - start)
+    return version
+
+
+def bump_plays_version(conn, user_id, inserted):
+    """Moves the user's plays counter (part of queries.data_version) when plays were added."""
+    if inserted:
+        conn.execute("""INSERT INTO data_version (name, version) VALUES ('plays:' || ?, 1)
+                        ON CONFLICT (name) DO UPDATE SET version = version + 1""", (user_id,))
+
+
+# The artist a row belongs to: by Spotify ID when the row has one, else the oldest artist with that name.
+# Parameters are (spotify_id, name).
+ARTIST_ID_SQL = """COALESCE((SELECT id FROM artists WHERE spotify_id = ?),
+                            (SELECT MIN(id) FROM artists WHERE name = ?))"""
+UNKNOWN_GENRE_SQL = "(genre IS NULL OR genre = 'Unknown')"
+
+
+def insert_artists(conn, artists):
+    """Adds or updates (name, spotify_id, genre) artists; a stored 'Unknown' genre is replaced by a real one.
+
+    Artists with a Spotify ID are matched on it (a name-only artist of the same
+    name takes the ID the first time we see one); the rest fall back to name.
+    """
+    with_id = [(name, spotify_id, genre) for name, spotify_id, genre in artists if spotify_id]
+    without_id = [(name, genre) for name, spotify_id, genre in artists if not spotify_id]
+    conn.executemany(
+        """UPDATE artists SET spotify_id = ?2
+           WHERE name = ?1 AND spotify_id IS NULL AND NOT EXISTS (SELECT 1 FROM artists WHERE spotify_id = ?2)""",
+        [(name, spotify_id) for name, spotify_id, _ in with_id]
+    )
+    conn.executemany(
+        f"""INSERT INTO artists (name, spotify_id, genre) VALUES (?, ?, ?)
+            ON CONFLICT (spotify_id) WHERE spotify_id IS NOT NULL DO UPDATE SET
+                name = excluded.name,
+                genre = CASE WHEN {UNKNOWN_GENRE_SQL} THEN excluded.genre ELSE genre END""",
+        with_id
+    )
+    conn.executemany(
+        "INSERT INTO artists (name, genre) SELECT ?1, ?2 WHERE NOT EXISTS (SELECT 1 FROM artists WHERE name = ?1)",
+        without_id
+    )
+    conn.executemany(
+        f"""UPDATE artists SET genre = ?2
+            WHERE id = (SELECT MIN(id) FROM artists WHERE name = ?1) AND {UNKNOWN_GENRE_SQL} AND ?2 IS NOT NULL""",
+        without_id
+    )
+
+
+def set_artist_genres(conn, genres):
+    """Stores {(name, spotify_id): genre}: by Spotify ID, or by name for artists stored without one.
+
+    Never by name alone for an artist with an ID, since several artists can share a name.
+    """
+    conn.executemany("UPDATE artists SET genre = ? WHERE spotify_id = ?",
+                     [(genre, spotify_id) for (_, spotify_id), genre in genres.items() if spotify_id])
+    conn.executemany("UPDATE artists SET genre = ? WHERE name = ? AND spotify_id IS NULL",
+                     [(genre, name) for (name, spotify_id), genre in genres.items() if not spotify_id])
+
+
+def insert_plays(conn, rows, user_id=LEGACY_USER_ID):
+    """Inserts (track_name, artist, played_at, genre, spotify_artist_id) rows for one user; duplicates are skipped.
+
+    Runs on the caller's connection so it joins their transaction. Returns the
+    number of new plays.
+    """
+    insert_artists(conn, {(artist, spotify_id, genre) for _, artist, _, genre, spotify_id in rows})
+    conn.executemany(
+        f"INSERT OR IGNORE INTO tracks (artist_id, name) SELECT {ARTIST_ID_SQL}, ?",
+        [(spotify_id, artist, track_name) for track_name, artist, _, _, spotify_id in rows]
+    )
+    changes_before = conn.total_changes
+    conn.executemany(
+        f"""INSERT OR IGNORE INTO plays (user_id, track_id, artist_id, played_at)
+            SELECT ?, t.id, t.artist_id, {PLAYED_AT_MS_SQL.format(column="?")}
+            FROM tracks t
+            WHERE t.artist_id = {ARTIST_ID_SQL} AND t.name IS ?""",
+        [(user_id, played_at, spotify_id, artist, track_name) for track_name, artist, played_at, _, spotify_id in rows]
+    )
+    inserted = conn.total_changes - changes_before
+    bump_plays_version(conn, user_id, inserted)
+    return inserted
+
+
+def insert_streamed_plays(conn, rows, user_id=LEGACY_USER_ID):
+    """Bulk-inserts one user's extended history rows; plays they already have at the same played_at are skipped.
+
+    Rows are (track_name, artist, played_at_ms, ms_played, platform, skipped,
+    shuffle, reason_start, reason_end). Exports carry no artist IDs, so artists
+    are matched by name. New artists start as 'Unknown' so the genre
+    maintenance job picks them up. Returns the number of new plays.
+    """
+    conn.executemany("INSERT INTO artists (name, genre) SELECT ?1, 'Unknown' "
+                     "WHERE NOT EXISTS (SELECT 1 FROM artists WHERE name = ?1)",
+                     {(row[1],) for row in rows})
+    conn.executemany(f"INSERT OR IGNORE INTO tracks (artist_id, name) SELECT {ARTIST_ID_SQL}, ?",
+                     {(None, row[1], row[0]) for row in rows})
+    changes_before = conn.total_changes
+    conn.executemany(
+        f"""INSERT OR IGNORE INTO plays (user_id, track_id, artist_id, played_at, {", ".join(c for c, _ in PLAY_DETAIL_COLUMNS)})
+            SELECT ?, t.id, t.artist_id, ?, ?, ?, ?, ?, ?, ?
+            FROM tracks t
+            WHERE t.artist_id = {ARTIST_ID_SQL} AND t.name = ?""",
+        [(user_id, *row[2:], None, row[1], row[0]) for row in rows]
+    )
+    inserted = conn.total_changes - changes_before
+    bump_plays_version(conn, user_id, inserted)
+    return inserted
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")  # Show each migration step
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    print(f"✅ Database is at schema v{migrate(path)}")
@@ -0,0 +1,370 @@
+"""Search index for an uploaded dataset's tracks and artists.
+
+Every distinct (artist, track_name) pair is a document. Names are casefolded
+and accent-stripped ("Beyoncé" -> "beyonce"), split into words, and kept in an
+inverted index of sorted term -> document postings (numpy arrays, CSR style):
+
+- exact words are a bisect in the sorted term list
+- prefixes ("beyo") are the contiguous run of terms after that point
+- misspellings ("beyonse") fall back to terms sharing enough trigrams
+
+Documents are numbered most-played first, so every posting list is already in
+popularity order and capping a long list keeps the best candidates. For
+multi-word queries the rarest word picks the candidates and the others are
+checked exactly against posting lists or a doc -> terms forward index. Results
+are ranked by idf-weighted match quality (artist hits count a bit more) plus a
+small popularity boost. The index is built once per dataset version and saved
+as .npy files that later loads memory-map.
+"""
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+EXACT_WEIGHT = 1.0
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.6
+ARTIST_BOOST = 1.5
+POPULARITY_WEIGHT = 0.05
+
+MAX_PREFIX_TERMS = 32  # Most frequent completions of a short prefix
+# Postings read per query word, shared by its candidate terms (each gets at least the floor)
+MAX_POSTINGS_PER_TOKEN = 12000
+MIN_POSTINGS_PER_TERM = 500
+BINARY_SEARCH_MAX_TERMS = 4  # Above this, multi-word checks use the forward index
+MAX_FUZZY_TERMS = 16
+FUZZY_MIN_LENGTH = 3
+FUZZY_MIN_SIMILARITY = 0.45
+MAX_TOKEN_LENGTH = 40
+
+ARTIST_FIELD, TRACK_FIELD = 1, 2
+ARRAYS = ("term_offsets", "post_docs", "post_fields", "doc_offsets", "doc_terms", "doc_fields",
+          "gram_offsets", "gram_terms", "term_gram_count", "doc_row", "doc_plays")
+
+_COMBINING_MARKS = re.compile("[̀-ͯ᪰-᫿᷀-᷿⃐-⃿︠-︯]")
+_NON_WORD = re.compile(r"[^\w\n]+|_")
+
+
+def normalize(text):
+    """Casefolded, accent-stripped text with punctuation turned into spaces."""
+    text = unicodedata.normalize("NFKD", str(text).casefold())
+    return _NON_WORD.sub(" ", _COMBINING_MARKS.sub("", text))
+
+
+def tokenize(text):
+    return [token[:MAX_TOKEN_LENGTH] for token in normalize(text).split()]
+
+
+def _normalize_many(texts):
+    # One pass over a joined string is far cheaper than normalizing a million short ones
+    return normalize("\n".join(str(text).replace("\n", " ") for text in texts)).split("\n")
+
+
+def _trigrams(term):
+    padded = f" {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _csr_positions(keys, offsets):
+    """Positions of every row-slice offsets[k]:offsets[k + 1], and which key each belongs to."""
+    starts = offsets[keys]
+    lengths = offsets[keys + 1] - starts
+    owners = np.repeat(np.arange(len(keys)), lengths)
+    positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(starts, lengths)
+    return positions, owners
+
+
+class SearchIndex:
+    def __init__(self, terms, grams, arrays):
+        self.terms = terms
+        self.grams = grams
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.doc_count = len(self.doc_row)
+        self.doc_freq = np.diff(self.term_offsets)
+        self.idf = np.log1p(self.doc_count / np.maximum(self.doc_freq, 1))
+
+    # 🏗️ Building
+    @classmethod
+    def build(cls, artists, tracks):
+        """Builds the index from per-row artist and track name sequences (one entry per play/row)."""
+        artist_cat, track_cat = pd.Categorical(artists), pd.Categorical(tracks)
+        # Shift codes so missing values (-1) become the empty name at 0
+        artist_codes = artist_cat.codes.astype(np.int64) + 1
+        track_codes = track_cat.codes.astype(np.int64) + 1
+        artist_names = [""] + list(artist_cat.categories)
+        track_names = [""] + list(track_cat.categories)
+
+        _, first_row, plays = np.unique(artist_codes * len(track_names) + track_codes,
+                                        return_index=True, return_counts=True)
+        order = np.lexsort((first_row, -plays))  # Most played first
+        doc_row, doc_plays = first_row[order], plays[order]
+        doc_count = len(doc_row)
+
+        vocabulary = {}
+
+        def name_tokens(names):
+            ids, offsets = [], [0]
+            for text in _normalize_many(names):
+                for token in dict.fromkeys(token[:MAX_TOKEN_LENGTH] for token in text.split()):
+                    ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                offsets.append(len(ids))
+            return np.array(ids, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+        def doc_tokens(codes, names):
+            ids, offsets = name_tokens(names)
+            positions, docs = _csr_positions(codes[doc_row], offsets)
+            return ids[positions], docs
+
+        artist_terms, artist_docs = doc_tokens(artist_codes, artist_names)
+        track_terms, track_docs = doc_tokens(track_codes, track_names)
+
+        # Renumber terms alphabetically so prefixes are contiguous ranges
+        terms = sorted(vocabulary)
+        rank = np.empty(len(terms), dtype=np.int64)
+        rank[[vocabulary[term] for term in terms]] = np.arange(len(terms))
+
+        keys = rank[np.concatenate([artist_terms, track_terms])] * doc_count + \
+            np.concatenate([artist_docs, track_docs])
+        fields = np.concatenate([np.full(len(artist_terms), ARTIST_FIELD, dtype=np.uint8),
+                                 np.full(len(track_terms), TRACK_FIELD, dtype=np.uint8)])
+        order = np.argsort(keys, kind="stable")
+        keys, fields = keys[order], fields[order]
+        keys, starts = np.unique(keys, return_index=True)
+        fields = np.bitwise_or.reduceat(fields, starts) if len(keys) else fields  # Word in both names
+
+        post_terms = keys // max(doc_count, 1)
+        post_docs = keys % max(doc_count, 1)
+        term_offsets = np.searchsorted(post_terms, np.arange(len(terms) + 1)).astype(np.int64)
+
+        # Forward index (doc -> its terms) for checking the other words of a multi-word query
+        forward = np.lexsort((post_terms, post_docs))
+        doc_offsets = np.searchsorted(post_docs[forward], np.arange(doc_count + 1)).astype(np.int64)
+
+        gram_lists = {}
+        term_gram_count = np.empty(len(terms), dtype=np.int16)
+        for term_id, term in enumerate(terms):
+            term_grams = _trigrams(term)
+            term_gram_count[term_id] = len(term_grams)
+            for gram in term_grams:
+                gram_lists.setdefault(gram, []).append(term_id)
+        grams = sorted(gram_lists)
+        gram_offsets = np.zeros(len(grams) + 1, dtype=np.int64)
+        gram_offsets[1:] = np.cumsum([len(gram_lists[gram]) for gram in grams])
+        gram_terms = np.array([term_id for gram in grams for term_id in gram_lists[gram]], dtype=np.int32)
+
+        return cls(terms, grams, {
+            "term_offsets": term_offsets,
+            "post_docs": post_docs.astype(np.int32),
+            "post_fields": fields,
+            "doc_offsets": doc_offsets,
+            "doc_terms": post_terms[forward].astype(np.int32),
+            "doc_fields": fields[forward],
+            "gram_offsets": gram_offsets,
+            "gram_terms": gram_terms,
+            "term_gram_count": term_gram_count,
+            "doc_row": doc_row.astype(np.int64),
+            "doc_plays": doc_plays.astype(np.int64),
+        })
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls.build(df["artist"], df["track_name"])
+
+    # 💾 Persistence
+    def save(self, directory):
+        """Writes the index atomically (temp dir + rename) to `directory`."""
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-search-")
+        for name in ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), getattr(self, name), allow_pickle=False)
+        for name, strings in (("terms", self.terms), ("grams", self.grams)):
+            with open(os.path.join(tmp_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(strings))  # Normalized terms never contain newlines
+        try:
+            os.rename(tmp_dir, directory)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)  # Built concurrently by another worker
+
+    @classmethod
+    def load(cls, directory):
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+                  for name in ARRAYS}
+        strings = {}
+        for name in ("terms", "grams"):
+            with open(os.path.join(directory, f"{name}.txt"), encoding="utf-8") as f:
+                text = f.read()
+            strings[name] = text.split("\n") if text else []
+        return cls(strings["terms"], strings["grams"], arrays)
+
+    # 🔎 Querying
+    def _term_candidates(self, token, prefix):
+        """[(term_id, match weight)] for one query token."""
+        candidates = []
+        lo = bisect_left(self.terms, token)
+        exact = lo < len(self.terms) and self.terms[lo] == token
+        if exact:
+            candidates.append((lo, EXACT_WEIGHT))
+        if prefix:
+            hi = bisect_left(self.terms, token + "\U0010ffff")
+            completions = np.arange(lo + exact, hi)
+            if len(completions) > MAX_PREFIX_TERMS:
+                completions = completions[np.argsort(-self.doc_freq[completions], kind="stable")[:MAX_PREFIX_TERMS]]
+            candidates.extend((int(term_id), PREFIX_WEIGHT) for term_id in completions)
+        if not candidates and len(token) >= FUZZY_MIN_LENGTH:
+            candidates = self._fuzzy_candidates(token)
+        return candidates
+
+    def _fuzzy_candidates(self, token):
+        token_grams = _trigrams(token)
+        slices = []
+        for gram in token_grams:
+            i = bisect_left(self.grams, gram)
+            if i < len(self.grams) and self.grams[i] == gram:
+                slices.append(self.gram_terms[self.gram_offsets[i]:self.gram_offsets[i + 1]])
+        if not slices:
+            return []
+        term_ids, shared = np.unique(np.concatenate(slices), return_counts=True)
+        similarity = 2 * shared / (len(token_grams) + self.term_gram_count[term_ids])  # Dice coefficient
+        keep = np.flatnonzero(similarity >= FUZZY_MIN_SIMILARITY)
+        keep = keep[np.argsort(-similarity[keep], kind="stable")[:MAX_FUZZY_TERMS]]
+        return [(int(term_ids[i]), FUZZY_WEIGHT * float(similarity[i])) for i in keep]
+
+    def _token_scores(self, candidates):
+        """(docs, scores) for one query token: each doc's best-matching candidate term."""
+        per_term = max(MAX_POSTINGS_PER_TOKEN // len(candidates), MIN_POSTINGS_PER_TERM)
+        docs, scores = [], []
+        for term_id, weight in candidates:
+            start = self.term_offsets[term_id]
+            end = min(self.term_offsets[term_id + 1], start + per_term)
+            score = weight * self.idf[term_id]
+            docs.append(self.post_docs[start:end])
+            scores.append(np.where(self.post_fields[start:end] & ARTIST_FIELD, score * ARTIST_BOOST, score))
+        if len(docs) == 1:
+            return docs[0], scores[0]
+
+        # Each slice is sorted by doc, so a stable sort just merges the runs
+        docs, scores = np.concatenate(docs), np.concatenate(scores)
+        order = np.argsort(docs, kind="stable")
+        docs, scores = docs[order], scores[order]
+        starts = np.flatnonzero(np.r_[True, docs[1:] != docs[:-1]])
+        return docs[starts], np.maximum.reduceat(scores, starts)
+
+    def _filter_docs(self, docs, scores, candidates):
+        """Keeps the docs that contain one of `candidates`, adding that word's best score."""
+        if len(candidates) <= BINARY_SEARCH_MAX_TERMS:
+            best = self._best_by_postings(docs, candidates)
+        else:
+            best = self._best_by_forward_index(docs, candidates)
+        keep = best > 0
+        return docs[keep], scores[keep] + best[keep]
+
+    def _best_by_postings(self, docs, candidates):
+        """Binary-searches each term's (doc-sorted) posting list; cheap for a few terms."""
+        best = np.zeros(len(docs))
+        for term_id, weight in candidates:
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            postings = self.post_docs[start:end]
+            positions = np.minimum(np.searchsorted(postings, docs), len(postings) - 1)
+            score = weight * self.idf[term_id]
+            term_scores = np.where(self.post_fields[start + positions] & ARTIST_FIELD, score * ARTIST_BOOST, score)
+            best = np.where(postings[positions] == docs, np.maximum(best, term_scores), best)
+        return best
+
+    def _best_by_forward_index(self, docs, candidates):
+        """Looks the candidates up in each doc's own term list; cost doesn't grow with the candidates."""
+        term_ids = np.array([term_id for term_id, _ in candidates])
+        term_scores = np.array([weight * self.idf[term_id] for term_id, weight in candidates])
+        order = np.argsort(term_ids)
+        term_ids, term_scores = term_ids[order], term_scores[order]
+
+        positions, owners = _csr_positions(docs, self.doc_offsets)
+        doc_terms = self.doc_terms[positions]
+        matched = np.minimum(np.searchsorted(term_ids, doc_terms), len(term_ids) - 1)
+        hit = term_ids[matched] == doc_terms
+        hit_scores = term_scores[matched[hit]]
+        hit_scores = np.where(self.doc_fields[positions[hit]] & ARTIST_FIELD, hit_scores * ARTIST_BOOST, hit_scores)
+
+        best = np.zeros(len(docs))
+        np.maximum.at(best, owners[hit], hit_scores)
+        return best
+
+    def search(self, query, limit=10, prefix=True):
+        """Returns [(row, score)] for the best matches, row being an index into the source rows.
+
+        Every query word has to match (exactly, as a prefix if it's the last
+        word and `prefix` is set, or fuzzily).
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or not self.doc_count:
+            return []
+
+        per_token = []
+        for i, token in enumerate(tokens):
+            candidates = self._term_candidates(token, prefix=prefix and i == len(tokens) - 1)
+            if not candidates:
+                return []
+            per_token.append(candidates)
+
+        # The rarest word picks the candidate docs; the others are checked against their full lists
+        per_token.sort(key=lambda candidates: sum(int(self.doc_freq[term_id]) for term_id, _ in candidates))
+        docs, scores = self._token_scores(per_token[0])
+        for candidates in per_token[1:]:
+            docs, scores = self._filter_docs(docs, scores, candidates)
+            if not len(docs):
+                return []
+
+        scores = scores + POPULARITY_WEIGHT * np.log1p(self.doc_plays[docs])
+        if len(docs) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+            docs, scores = docs[top], scores[top]
+        order = np.lexsort((docs, -scores))
+        return [(int(self.doc_row[docs[i]]), round(float(scores[i]), 4)) for i in order]
+
+
+class SearchIndexCache:
+    """Loaded indexes by directory, least recently used dropped past `max_entries`.
+
+    A missing index is built from the dataset frame and saved, so each dataset
+    version is indexed once and other workers just load the files.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.indexes = OrderedDict()
+        self.counters = {"hits": 0, "loads": 0, "builds": 0}
+
+    def get(self, directory, df):
+        with self.lock:
+            if directory in self.indexes:
+                self.indexes.move_to_end(directory)
+                self.counters["hits"] += 1
+                return self.indexes[directory]
+
+        if os.path.exists(directory):
+            index = SearchIndex.load(directory)
+            counter = "loads"
+        else:
+            index = SearchIndex.from_frame(df)
+            index.save(directory)
+            counter = "builds"
+
+        with self.lock:
+            self.counters[counter] += 1
+            self.indexes[directory] = index
+            while len(self.indexes) > self.max_entries:
+                self.indexes.popitem(last=False)
+        return index
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "loaded": len(self.indexes)}
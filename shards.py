@@ -0,0 +1,166 @@
+"""Where each user's plays live: the shared database, or one SQLite file per user.
+
+By default every user shares spotify_data.db and is told apart by
+plays.user_id. With SHARD_DIR set, each user gets their own database file
+under it (same schema, same user_id column), so one user's sync never waits
+on another user's write lock and their queries only ever touch their own
+file. Jobs, sync cursors and the genre cache stay in the main database.
+
+Moving an existing deployment over:
+  1. claim_plays(): give the pre-multi-user history (LEGACY_USER_ID) to its owner
+  2. split_into_shards(): copy every user's plays into their shard
+  3. set SHARD_DIR and restart
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import db
+import rollups
+import schema
+
+SHARD_MAX_OPEN = 64  # Shards that keep idle pooled connections; older ones are closed
+# The shard's row for source artist `a`
+MAIN_ARTIST_ID_SQL = """COALESCE((SELECT id FROM main.artists WHERE spotify_id = a.spotify_id),
+                                 (SELECT id FROM main.artists WHERE name = a.name AND spotify_id IS NULL))"""
+
+
+def shard_name(user_id):
+    """Stable, file-system-safe file name for a user's shard."""
+    if re.fullmatch(r"[A-Za-z0-9_-]{1,64}", user_id):
+        return f"user-{user_id}.db"
+    return f"user-{hashlib.sha256(user_id.encode()).hexdigest()[:32]}.db"
+
+
+class ShardRouter:
+    """Maps a user to the db_path holding their plays.
+
+    Unsharded, every user maps to None (the main database). Sharded, a user's
+    file is created and migrated on first use. Only the `max_open` most
+    recently used shards keep idle connections, so thousands of users don't
+    mean thousands of open files.
+    """
+
+    def __init__(self, directory=None, max_open=SHARD_MAX_OPEN):
+        self.directory = directory if directory is not None else os.getenv("SHARD_DIR") or None
+        self.max_open = max_open
+        self.lock = threading.Lock()
+        self.recent = OrderedDict()  # path -> True, least recently used first
+        self.migration_locks = {}
+        self.migrated = set()
+
+    @property
+    def sharded(self):
+        return self.directory is not None
+
+    def path(self, user_id):
+        """db_path for the user's plays: None (the main database) unless sharding is on."""
+        if not self.sharded:
+            return None
+        path = os.path.join(self.directory, shard_name(user_id))
+
+        evicted = []
+        with self.lock:
+            self.recent[path] = True
+            self.recent.move_to_end(path)
+            while len(self.recent) > self.max_open:
+                evicted.append(self.recent.popitem(last=False)[0])
+            migration_lock = self.migration_locks.setdefault(path, threading.Lock())
+        for old_path in evicted:
+            db.get_pool(old_path).close_all()  # Idle connections only; busy ones go back to the pool
+
+        if path not in self.migrated:
+            with migration_lock:
+                if path not in self.migrated:
+                    os.makedirs(self.directory, exist_ok=True)
+                    schema.migrate(path)
+                    self.migrated.add(path)
+        return path
+
+    def paths(self):
+        """Every database that can hold plays: the main one, plus each shard file."""
+        if not self.sharded or not os.path.isdir(self.directory):
+            return [None]
+        return [None] + [os.path.join(self.directory, name) for name in sorted(os.listdir(self.directory))
+                         if name.startswith("user-") and name.endswith(".db")]
+
+    def stats(self):
+        with self.lock:
+            return {"sharded": self.sharded, "directory": self.directory, "shards": len(self.paths()) - 1,
+                    "open": len(self.recent), "max_open": self.max_open}
+
+
+def claim_plays(user_id, from_user=schema.LEGACY_USER_ID, db_path=None):
+    """Moves `from_user`'s plays (by default the pre-multi-user history) to `user_id`. Returns plays moved.
+
+    Plays `user_id` already has at the same instant are the same plays, so
+    those duplicates are dropped. The rollups are rebuilt afterwards.
+    """
+    with db.transaction(db_path) as conn:
+        moved = conn.execute("UPDATE OR IGNORE plays SET user_id = ? WHERE user_id = ?",
+                             (user_id, from_user)).rowcount
+        conn.execute("DELETE FROM plays WHERE user_id = ?", (from_user,))
+        schema.bump_plays_version(conn, user_id, moved)
+        schema.bump_plays_version(conn, from_user, moved)
+    rollups.rebuild(db_path)
+    return moved
+
+
+def split_into_shards(router, users=None, progress=None, db_path=None):
+    """Copies each user's plays from the main database into their shard. Returns {user_id: plays copied}.
+
+    Artists are matched by Spotify ID (by name for those without one) and
+    tracks by artist and name, so a shard that already has rows of its own
+    stays consistent, and plays already there are skipped: an interrupted
+    split can simply be run again. The main database is not
+    changed; delete its plays once the shards are checked.
+    """
+    source = os.path.abspath(db_path or os.getenv("SPOTIFY_DB_PATH", db.DEFAULT_DB_PATH))
+    if users is None:
+        with db.connection(db_path) as conn:
+            users = [row[0] for row in conn.execute("SELECT DISTINCT user_id FROM plays ORDER BY user_id")]
+
+    detail_columns = [column for column, _ in schema.PLAY_DETAIL_COLUMNS]
+    copied = {}
+    for done, user_id in enumerate(users, 1):
+        with db.connection(router.path(user_id)) as conn:
+            conn.execute("ATTACH DATABASE ? AS source", (source,))
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("""
+                    INSERT OR IGNORE INTO main.artists (name, spotify_id, genre)
+                    SELECT name, spotify_id, genre FROM source.artists
+                    WHERE id IN (SELECT artist_id FROM source.plays WHERE user_id = ?)
+                """, (user_id,))
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO main.tracks (artist_id, name)
+                    SELECT ma.id, t.name
+                    FROM source.tracks t
+                    JOIN source.artists a ON a.id = t.artist_id
+                    JOIN main.artists ma ON ma.id = {MAIN_ARTIST_ID_SQL}
+                    WHERE t.id IN (SELECT track_id FROM source.plays WHERE user_id = ?)
+                """, (user_id,))
+                changes_before = conn.total_changes
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO main.plays (user_id, track_id, artist_id, played_at, {", ".join(detail_columns)})
+                    SELECT p.user_id, mt.id, ma.id, p.played_at, {", ".join(f"p.{column}" for column in detail_columns)}
+                    FROM source.plays p
+                    JOIN source.tracks t ON t.id = p.track_id
+                    JOIN source.artists a ON a.id = t.artist_id
+                    JOIN main.artists ma ON ma.id = {MAIN_ARTIST_ID_SQL}
+                    JOIN main.tracks mt ON mt.artist_id = ma.id AND mt.name IS t.name
+                    WHERE p.user_id = ?
+                """, (user_id,))
+                copied[user_id] = conn.total_changes - changes_before
+                schema.bump_plays_version(conn, user_id, copied[user_id])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.execute("DETACH DATABASE source")
+        if progress:
+            progress(done, len(users))
+    return copied
@@ -0,0 +1,312 @@
+"""One shared client for the Spotify Web API.
+
+All calls (plain spotipy calls from request threads and `gather` fan-outs)
+run on a single background asyncio loop that owns one aiohttp session, so:
+
+- connections are kept alive and pooled across requests and users
+- a token bucket keeps the whole process under SPOTIFY_REQUESTS_PER_SECOND
+- a 429 pauses every caller for the `Retry-After` the server asked for
+- 5xx / connection errors are retried with jittered exponential backoff
+- identical GETs already in flight (same token, URL and params) share one response
+- with a ResponseCache, slow-changing GETs are served from memory (see response_cache.py)
+- latency / retry / throttle counters are kept per endpoint (see `stats()`), and
+  every attempt is timed into metrics.EXTERNAL_LATENCY for /metrics
+"""
+import asyncio
+import atexit
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+
+import aiohttp
+import spotipy
+
+from metrics import EXTERNAL_LATENCY
+from response_cache import MISS, STALE
+
+log = logging.getLogger(__name__)
+
+SPOTIFY_API = "https://api.spotify.com/v1/"
+RETRY_STATUSES = {500, 502, 503, 504}
+LATENCY_SAMPLES = 1000  # Recent latencies kept per endpoint for percentiles
+ID_SEGMENT = re.compile(r"^[0-9A-Za-z]{22}$")  # Spotify IDs, folded into "{id}" for metrics
+TOKEN_USERS_MAX = 1024
+
+
+class AsyncTokenBucket:
+    """Token bucket for the client's event loop; `pause()` holds everyone back after a 429."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate or 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def pause(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            if not self.rate:
+                return  # ✅ No limit configured
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class EndpointMetrics:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.counters = {"calls": 0, "errors": 0, "retries": 0, "throttled": 0, "coalesced": 0}
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.total_sec = 0.0
+
+    def snapshot(self):
+        latencies = sorted(self.latencies)
+        pick = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)  # noqa: E731
+        return {
+            **self.counters,
+            "avg_ms": round(self.total_sec / len(latencies) * 1000, 2) if latencies else None,
+            "p50_ms": pick(0.5) if latencies else None,
+            "p95_ms": pick(0.95) if latencies else None,
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+        }
+
+
+def _parse(body):
+    return json.loads(body) if body else None
+
+
+def _clean_params(params):
+    """aiohttp only takes str values; spotipy passes None for unset options and Python bools."""
+    return {key: ("true" if value else "false") if isinstance(value, bool) else str(value)
+            for key, value in (params or {}).items() if value is not None and key != "content_type"}
+
+
+class SpotifyClient:
+    def __init__(self, base_url=None, rate=None, burst=None, pool_size=None, max_retries=4,
+                 backoff_base=0.5, backoff_max=30.0, timeout=10.0, cache=None):
+        self.base_url = base_url or os.getenv("SPOTIFY_API_BASE", SPOTIFY_API)
+        self.rate = rate if rate is not None else float(os.getenv("SPOTIFY_REQUESTS_PER_SECOND", "10"))
+        self.burst = burst
+        self.pool_size = pool_size or int(os.getenv("SPOTIFY_POOL_SIZE", "20"))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.loop = None
+        self.session = None
+        self.limiter = None
+        self.inflight = {}
+        self.refreshing = {}  # cache key -> background refresh task
+        self.token_users = {}  # sha256(token) -> Spotify user ID, for per-user cache keys
+        self.metrics = {}
+
+    # 🔄 Background event loop
+    def _ensure_loop(self):
+        with self.lock:
+            if self.loop is not None:
+                return self.loop
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="spotify-client", daemon=True).start()
+            asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+            self.loop = loop
+            atexit.register(self.close)
+            return loop
+
+    async def _open(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self.limiter = AsyncTokenBucket(self.rate, self.burst)
+        self.slots = asyncio.Semaphore(self.pool_size)  # Latency below excludes waiting for a connection
+
+    def close(self):
+        with self.lock:
+            loop, self.loop = self.loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self.session.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+    # 📞 Public API
+    def request(self, token, method, url, params=None, payload=None):
+        """Blocking call from any thread. Raises spotipy.SpotifyException like spotipy does."""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self.call(token, method, url, params, payload), loop).result()
+
+    def gather(self, token, calls):
+        """Runs [(url, params)] GETs concurrently; returns results in order (exceptions in place of failures)."""
+        async def run():
+            return await asyncio.gather(*(self.call(token, "GET", url, params) for url, params in calls),
+                                        return_exceptions=True)
+
+        return asyncio.run_coroutine_threadsafe(run(), self._ensure_loop()).result()
+
+    def for_token(self, token):
+        return PooledSpotify(self, token)
+
+    def stats(self):
+        with self.lock:
+            return {endpoint: metrics.snapshot() for endpoint, metrics in sorted(self.metrics.items())}
+
+    # 🔁 Requests with coalescing, rate limiting and retries (run on the loop)
+    def _endpoint(self, url):
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else url.split("://", 1)[-1]
+        path = path.split("?", 1)[0].strip("/")
+        return "/".join("{id}" if ID_SEGMENT.match(segment) else segment for segment in path.split("/"))
+
+    def _metrics(self, endpoint):
+        with self.lock:
+            if endpoint not in self.metrics:
+                self.metrics[endpoint] = EndpointMetrics(endpoint)
+            return self.metrics[endpoint]
+
+    async def call(self, token, method, url, params=None, payload=None):
+        if not url.startswith("http"):
+            url = self.base_url + url
+        params = _clean_params(params)
+        endpoint = self._endpoint(url)
+        metrics = self._metrics(endpoint)
+        if method != "GET":
+            return _parse(await self._send(token, method, url, params, payload, metrics))
+
+        policy = self.cache.policy(endpoint, params) if self.cache else None
+        if policy is None:
+            return _parse(await self._fetch(token, url, params, metrics))
+
+        ttl, stale_for, shared = policy
+        scope = "shared" if shared else await self._user_scope(token)
+        key = (scope, url, tuple(sorted(params.items())))
+        state, body = self.cache.lookup(key, endpoint)
+        if state == STALE:
+            self._refresh(key, token, url, params, metrics, ttl, stale_for)
+        elif state == MISS:
+            body = await self._fetch(token, url, params, metrics)
+            self.cache.put(key, body, ttl, stale_for)
+        return _parse(body)
+
+    async def _fetch(self, token, url, params, metrics):
+        """GET returning the raw body; identical requests already in flight share one call."""
+        key = (token, url, tuple(sorted(params.items())))
+        if key in self.inflight:
+            metrics.counters["coalesced"] += 1
+            return await asyncio.shield(self.inflight[key])
+        future = asyncio.ensure_future(self._send(token, "GET", url, params, None, metrics))
+        self.inflight[key] = future
+        future.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _user_scope(self, token):
+        """Cache scope for per-user endpoints: the Spotify user behind the token (looked up once per token)."""
+        token_key = hashlib.sha256(token.encode()).hexdigest()
+        user_id = self.token_users.get(token_key)
+        if user_id is None:
+            body = await self._fetch(token, self.base_url + "me", {}, self._metrics("me"))
+            user_id = json.loads(body)["id"]
+            self.token_users[token_key] = user_id
+            if len(self.token_users) > TOKEN_USERS_MAX:
+                self.token_users.pop(next(iter(self.token_users)))  # Tokens expire after an hour anyway
+        return f"user:{user_id}"
+
+    def _refresh(self, key, token, url, params, metrics, ttl, stale_for):
+        """Stale-while-revalidate: refetch in the background, at most once per key at a time."""
+        if key in self.refreshing:
+            return
+
+        async def refresh():
+            try:
+                self.cache.put(key, await self._fetch(token, url, params, metrics), ttl, stale_for)
+                self.cache.record_refresh(True)
+            except spotipy.SpotifyException as e:
+                log.warning("⚠️ Background refresh of %s failed: %s", url, e)
+                self.cache.record_refresh(False)
+            finally:
+                self.refreshing.pop(key, None)
+
+        self.refreshing[key] = asyncio.ensure_future(refresh())
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))  # Full jitter
+
+    async def _send(self, token, method, url, params, payload, metrics):
+        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        data = json.dumps(payload) if payload else None
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire()
+            metrics.counters["calls"] += 1
+            await self.slots.acquire()
+            start = time.perf_counter()
+            status = None
+            try:
+                async with self.session.request(method, url, params=params, data=data, headers=headers) as response:
+                    body = await response.read()
+                    status, response_headers = response.status, response.headers
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    metrics.counters["errors"] += 1
+                    raise spotipy.SpotifyException(599, -1, f"{url}:\n {e!r}")
+                metrics.counters["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            finally:
+                self.slots.release()
+                elapsed = time.perf_counter() - start
+                metrics.latencies.append(elapsed)
+                metrics.total_sec += elapsed
+                EXTERNAL_LATENCY.observe(elapsed, service="spotify", operation=metrics.endpoint,
+                                         outcome="network_error" if status is None else str(status))
+
+            if status == 429 or status in RETRY_STATUSES:
+                if attempt < self.max_retries:
+                    metrics.counters["retries"] += 1
+                    if status == 429:
+                        metrics.counters["throttled"] += 1
+                        try:
+                            wait = float(response_headers.get("Retry-After", ""))
+                        except ValueError:
+                            wait = self._backoff(attempt)
+                        self.limiter.pause(wait)  # Spotify's limit is per app: hold back every caller
+                    else:
+                        await asyncio.sleep(self._backoff(attempt))
+                    continue
+            if status >= 400:
+                metrics.counters["errors"] += 1
+                try:
+                    error = json.loads(body).get("error", {})
+                    message, reason = error.get("message"), error.get("reason")
+                except (ValueError, AttributeError):
+                    message, reason = body.decode(errors="replace") or None, None
+                raise spotipy.SpotifyException(status, -1, f"{url}:\n {message}", reason=reason,
+                                               headers=dict(response_headers))
+            return body
+
+
+class PooledSpotify(spotipy.Spotify):
+    """spotipy.Spotify whose HTTP calls go through a shared SpotifyClient."""
+
+    def __init__(self, client, token):
+        super().__init__(auth=token, requests_session=False, retries=0)
+        self.client = client
+        self.prefix = client.base_url
+
+    def _internal_call(self, method, url, payload, params):
+        return self.client.request(self._auth, method, url, params=params, payload=payload)
+
+    def gather(self, calls):
+        """Concurrent GETs of [(url, params)] on the shared client (see SpotifyClient.gather)."""
+        return self.client.gather(self._auth, calls)
@@ -1,19 +1,19 @@
 document.addEventListener("DOMContentLoaded", function() {
-    document.getElementById("uploadForm").addEventListener("submit", async function(event) {
+    document.getElementById("uploadForm")?.addEventListener("submit", async function(event) {
         event.preventDefault();
         await uploadFile();
     });
 
-    document.getElementById("interactiveBtn").addEventListener("click", async function() {
+    document.getElementById("interactiveBtn")?.addEventListener("click", async function() {
         await fetchInteractiveChart();
     });
 
-    document.getElementById("recommendForm").addEventListener("submit", async function(event) {
+    document.getElementById("recommendForm")?.addEventListener("submit", async function(event) {
         event.preventDefault();
         await fetchRecommendations();
     });
 
-    document.getElementById("visualizeHistoryBtn").addEventListener("click", async function() {
+    document.getElementById("visualizeHistoryBtn")?.addEventListener("click", async function() {
         await fetchListeningHistoryVisualization();
     });
 });
@@ -33,6 +33,13 @@ async function uploadFile() {
             return;
         }
 
+        // ⏳ The server parses the CSV in the background; wait for the job to finish
+        let job = await waitForJob(result.progress_url);
+        if (job.status !== "done") {
+            alert(`❌ Error: ${job.error || `Upload ${job.status}`}`);
+            return;
+        }
+
         alert("✅ File uploaded successfully!");
 
         // Fetch summary stats & visualization
@@ -40,10 +47,30 @@ async function uploadFile() {
         await fetchVisualization();
     } catch (error) {
         console.error("Upload Error:", error);
-        alert("⚠️ Upload failed. Please try again.");
+        alert(`⚠️ Upload failed: ${error.message}. Please try again.`);
     }
 }
 
+// ⏳ Poll a background job until it finishes (backing off up to 5s between polls, giving up after 10 min)
+async function waitForJob(progressUrl, { timeoutMs = 10 * 60 * 1000, maxDelayMs = 5000 } = {}) {
+    let deadline = Date.now() + timeoutMs;
+    let delay = 500;
+    while (Date.now() < deadline) {
+        let response = await fetch(progressUrl);
+        let job = await response.json().catch(() => ({}));  // Error pages aren't always JSON
+        if (!response.ok) {
+            throw new Error(job.error || `Job status unavailable (${response.status})`);
+        }
+        if (["done", "failed", "cancelled", "interrupted"].includes(job.status)) {
+            return job;
+        }
+        console.log(`Upload: ${job.percent ?? 0}% ${job.message ?? ""}`);
+        await new Promise(resolve => setTimeout(resolve, delay));
+        delay = Math.min(delay * 1.5, maxDelayMs);
+    }
+    throw new Error("Timed out waiting for the job to finish");
+}
+
 // 📊 Fetch Summary Stats
 async function fetchSummary() {
     try {
@@ -68,17 +95,13 @@ async function fetchSummary() {
     }
 }
 
-// 📈 Fetch Static Visualization
+// 📈 Top artists of the uploaded CSV, drawn in the browser
 async function fetchVisualization() {
     try {
-        let response = await fetch("/visualize");
-        let data = await response.json();
-
-        if (data.image_url) {
-            let chartImage = document.getElementById("chartImage");
-            chartImage.src = data.image_url;
-            chartImage.style.display = "block";
-        }
+        let data = await fetchChartData("/chart-data/top-artists?source=upload&limit=10");
+        let chart = document.getElementById("uploadChart");
+        renderBarChart(chart, data, { title: "Top 10 Artists", color: "skyblue", yLabel: "Number of Songs" });
+        chart.style.display = "block";
     } catch (error) {
         console.error("Visualization Fetch Error:", error);
     }
@@ -87,18 +110,12 @@ async function fetchVisualization() {
 // 🎨 Fetch Listening History Visualization
 async function fetchListeningHistoryVisualization() {
     try {
-        let response = await fetch("/visualize-history");
-        let data = await response.json();
-
-        if (data.image_url) {
-            let historyChart = document.getElementById("historyChart");
-            historyChart.src = data.image_url;
-            historyChart.style.display = "block";
-        } else {
-            alert(`⚠️ ${data.error}`);
-        }
+        let data = await fetchChartData("/chart-data/top-artists?limit=10");
+        let historyChart = document.getElementById("historyChart");
+        renderBarChart(historyChart, data, { title: "Top 10 Most Played Artists", yLabel: "Times Played" });
+        historyChart.style.display = "block";
     } catch (error) {
-        console.error("Listening History Visualization Fetch Error:", error);
+        alert(`⚠️ ${error.message}`);
     }
 }
 
@@ -143,3 +160,151 @@ async function fetchSpotifyRecommendations() {
         console.error("Error fetching Spotify recommendations:", error);
     }
 }
+
+// 📊 Client-side charts: the server sends only the aggregated numbers (/chart-data/*) and the browser draws SVG
+const SVG_NS = "http://www.w3.org/2000/svg";
+const CHART_COLORS = ["#1DB954", "#8E44AD", "#3498DB", "#E67E22", "#E74C3C",
+                      "#F1C40F", "#1ABC9C", "#EC407A", "#95A5A6", "#D35400"];
+
+function svgElement(tag, attributes = {}, text = null) {
+    let element = document.createElementNS(SVG_NS, tag);
+    for (let [name, value] of Object.entries(attributes)) {
+        element.setAttribute(name, value);
+    }
+    if (text !== null) {
+        element.textContent = text;
+    }
+    return element;
+}
+
+function newChart(container, width, height, title) {
+    container.innerHTML = "";
+    let svg = svgElement("svg", { viewBox: `0 0 ${width} ${height}`, role: "img", "aria-label": title });
+    svg.appendChild(svgElement("text", { x: width / 2, y: 22, "text-anchor": "middle", class: "chart-title" }, title));
+    container.appendChild(svg);
+    return svg;
+}
+
+// 🔁 Plain fetch is enough for caching: the responses say no-cache + ETag, so the browser revalidates
+// with If-None-Match and reuses its stored copy when the server answers 304
+async function fetchChartData(url) {
+    let response = await fetch(url);
+    let data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || response.statusText);
+    }
+    return data;
+}
+
+// 🎵 Bar chart from {labels, values}
+function renderBarChart(container, data, { title = "", color = "#8E44AD", yLabel = "" } = {}) {
+    const width = 500, height = 320, left = 50, right = 10, top = 40, bottom = 90;
+    let svg = newChart(container, width, height, title);
+    let max = Math.max(1, ...data.values);
+    let slot = (width - left - right) / Math.max(1, data.values.length);
+
+    svg.appendChild(svgElement("line", { x1: left, y1: height - bottom, x2: width - right, y2: height - bottom, class: "chart-axis" }));
+    svg.appendChild(svgElement("text", { x: left, y: top - 6, class: "chart-tick" }, `${max}`));
+    svg.appendChild(svgElement("text", { x: 14, y: (top + height - bottom) / 2, class: "chart-tick",
+                                         transform: `rotate(-90 14 ${(top + height - bottom) / 2})`, "text-anchor": "middle" }, yLabel));
+    data.values.forEach((value, i) => {
+        let barHeight = (value / max) * (height - top - bottom);
+        let x = left + i * slot + slot * 0.15;
+        let bar = svgElement("rect", { x, y: height - bottom - barHeight, width: slot * 0.7, height: barHeight, fill: color });
+        bar.appendChild(svgElement("title", {}, `${data.labels[i]}: ${value}`));
+        svg.appendChild(bar);
+        let labelX = x + slot * 0.35, labelY = height - bottom + 12;
+        svg.appendChild(svgElement("text", { x: labelX, y: labelY, class: "chart-tick", "text-anchor": "end",
+                                             transform: `rotate(-45 ${labelX} ${labelY})` }, data.labels[i]));
+    });
+}
+
+// 🎨 Pie chart from {labels, values, pct, labeled}; slices after `labeled` are too small to label
+// on the pie, so they are listed top-left instead (same rule as the PNG version)
+function renderPieChart(container, data, { title = "" } = {}) {
+    const width = 500, height = 420, cx = 270, cy = 235, r = 150;
+    let svg = newChart(container, width, height, title);
+    let total = data.values.reduce((sum, value) => sum + value, 0) || 1;
+    let angle = -Math.PI / 2;
+
+    data.values.forEach((value, i) => {
+        let sweep = (value / total) * 2 * Math.PI;
+        let color = CHART_COLORS[i % CHART_COLORS.length];
+        let point = a => [cx + r * Math.cos(a), cy + r * Math.sin(a)];
+        let [x1, y1] = point(angle), [x2, y2] = point(angle + sweep);
+        let d = sweep >= 2 * Math.PI - 1e-9
+            ? `M ${cx - r} ${cy} a ${r} ${r} 0 1 0 ${2 * r} 0 a ${r} ${r} 0 1 0 ${-2 * r} 0`
+            : `M ${cx} ${cy} L ${x1} ${y1} A ${r} ${r} 0 ${sweep > Math.PI ? 1 : 0} 1 ${x2} ${y2} Z`;
+        let slice = svgElement("path", { d, fill: color });
+        slice.appendChild(svgElement("title", {}, `${data.labels[i]}: ${data.pct[i]}%`));
+        svg.appendChild(slice);
+
+        let middle = angle + sweep / 2;
+        if (i < data.labeled) {
+            svg.appendChild(svgElement("text", { x: cx + r * 0.7 * Math.cos(middle), y: cy + r * 0.7 * Math.sin(middle),
+                                                 "text-anchor": "middle", class: "chart-tick" }, `${data.pct[i]}%`));
+            svg.appendChild(svgElement("text", { x: cx + r * 1.12 * Math.cos(middle), y: cy + r * 1.12 * Math.sin(middle),
+                                                 "text-anchor": Math.cos(middle) < 0 ? "end" : "start", class: "chart-tick" }, data.labels[i]));
+        } else {
+            svg.appendChild(svgElement("text", { x: 8, y: 48 + (i - data.labeled) * 14, fill: color, class: "chart-small-slice" },
+                                       `${data.labels[i]}: ${data.pct[i]}%`));
+        }
+        angle += sweep;
+    });
+}
+
+// 📈 Line chart from rollups.trends: {labels, plays, series: [{name, plays}]}
+function renderLineChart(container, data, { title = "" } = {}) {
+    const width = 700, height = 320, left = 50, right = 150, top = 40, bottom = 60;
+    let svg = newChart(container, width, height, title);
+    let lines = [{ name: "All plays", plays: data.plays }, ...data.series];
+    let max = Math.max(1, ...data.plays);
+    let step = (width - left - right) / Math.max(1, data.labels.length - 1);
+    let x = i => left + i * step;
+    let y = value => height - bottom - (value / max) * (height - top - bottom);
+
+    svg.appendChild(svgElement("line", { x1: left, y1: height - bottom, x2: width - right, y2: height - bottom, class: "chart-axis" }));
+    svg.appendChild(svgElement("text", { x: left, y: top - 6, class: "chart-tick" }, `${max}`));
+    let every = Math.ceil(data.labels.length / 12);  // At most ~12 x labels
+    data.labels.forEach((label, i) => {
+        if (i % every === 0) {
+            svg.appendChild(svgElement("text", { x: x(i), y: height - bottom + 16, "text-anchor": "middle", class: "chart-tick" }, label));
+        }
+    });
+    lines.forEach((line, n) => {
+        let color = CHART_COLORS[n % CHART_COLORS.length];
+        let points = line.plays.map((value, i) => `${x(i)},${y(value)}`).join(" ");
+        svg.appendChild(svgElement("polyline", { points, fill: "none", stroke: color, "stroke-width": n === 0 ? 2.5 : 1.5 }));
+        svg.appendChild(svgElement("text", { x: width - right + 10, y: top + n * 16, fill: color, class: "chart-small-slice" }, line.name));
+    });
+}
+
+// 📊 Load every history chart; returns false when there is no data yet (the caller can retry)
+async function loadCharts() {
+    try {
+        let [topArtists, genres, plays] = await Promise.all([
+            fetchChartData("/chart-data/top-artists?limit=10"),
+            fetchChartData("/chart-data/genres"),
+            fetchChartData("/chart-data/plays?bucket=month&by=genre"),
+        ]);
+        renderBarChart(document.getElementById("historyChart"), topArtists,
+                       { title: "Top 10 Most Played Artists", yLabel: "Times Played" });
+        renderPieChart(document.getElementById("genreChart"), genres, { title: "Top Genres Played" });
+        renderLineChart(document.getElementById("playsChart"), plays, { title: "Plays per Month" });
+        return true;
+    } catch (error) {
+        console.log("Charts not ready:", error.message);
+        return false;
+    }
+}
+
+// 🖼️ PNG export still renders server-side through the cached /visualize* routes
+async function exportChartPng(endpoint) {
+    let response = await fetch(endpoint);
+    let data = await response.json();
+    if (data.image_url) {
+        window.open(data.image_url, "_blank");
+    } else {
+        alert(`⚠️ ${data.error}`);
+    }
+}
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The app is a set of top-level modules, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# app.py reads these at import time; the tests never talk to Spotify
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "test")
+os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "test")
+os.environ.setdefault("SPOTIFY_REDIRECT_URI", "http://localhost/callback")
@@ -0,0 +1,88 @@
+"""Two artists sharing a name (schema v7) must keep their own genres through every genre writer."""
+import pytest
+
+import db
+import schema
+from genre_cache import GenreCache
+from genre_pipeline import GenreEnrichmentPipeline
+from history_sync import save_plays
+
+SPOTIFY_GENRES = {"nirvana-us": "grunge", "nirvana-uk": "britpop"}
+
+
+class FakeSpotify:
+    def artists(self, artist_ids):
+        return {"artists": [{"id": artist_id, "genres": [SPOTIFY_GENRES[artist_id]]} for artist_id in artist_ids]}
+
+    def search(self, q, type="artist", limit=1):
+        return {"artists": {"items": [{"genres": ["psychedelic"]}]}}
+
+
+class FakeClassifier:
+    def __init__(self, genre):
+        self.genre = genre
+
+    def classify(self, artists):
+        return {artist: self.genre for artist in artists}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "spotify_data.db")
+    schema.migrate(path)
+    yield path
+    db.get_pool(path).close_all()
+
+
+def stored_genres(db_path):
+    with db.connection(db_path) as conn:
+        return dict(conn.execute("SELECT COALESCE(spotify_id, name), genre FROM artists").fetchall())
+
+
+def add_artists(db_path, genre="Unknown"):
+    with db.transaction(db_path) as conn:
+        schema.insert_plays(conn, [
+            ("Smells Like Teen Spirit", "Nirvana", "2024-01-01T00:00:00Z", genre, "nirvana-us"),
+            ("Rainbow Chaser", "Nirvana", "2024-01-02T00:00:00Z", genre, "nirvana-uk"),
+        ])
+        # A name-only row next to them, as left by the v7 migration or a shard copy
+        conn.execute("INSERT INTO artists (name, genre) VALUES ('Nirvana', ?)", (genre,))
+
+
+@pytest.mark.parametrize("with_cache", [False, True])
+def test_pipeline_keeps_genres_apart(db_path, with_cache):
+    add_artists(db_path)
+    cache = GenreCache(db_path) if with_cache else None
+    with db.connection(db_path) as conn:
+        missing = conn.execute("SELECT name, spotify_id FROM artists").fetchall()
+
+    for _ in range(2):  # The second run is served from the cache when there is one
+        GenreEnrichmentPipeline(FakeSpotify(), lambda name: "Unknown", db_path=db_path, cache=cache).run(missing)
+        assert stored_genres(db_path) == {"nirvana-us": "grunge", "nirvana-uk": "britpop", "Nirvana": "psychedelic"}
+
+
+def test_save_plays_keeps_genres_apart(db_path):
+    pipeline = GenreEnrichmentPipeline(FakeSpotify(), lambda name: "Unknown", db_path=db_path)
+    tracks = [{"track_name": "Smells Like Teen Spirit", "artist": "Nirvana", "played_at": "2024-01-01T00:00:00Z",
+               "artist_id": "nirvana-us"},
+              {"track_name": "Rainbow Chaser", "artist": "Nirvana", "played_at": "2024-01-02T00:00:00Z",
+               "artist_id": "nirvana-uk"}]
+    inserted, stats = save_plays(tracks, pipeline, db_path=db_path)
+
+    assert inserted == 2 and stats["distinct_artists"] == 2
+    assert stored_genres(db_path) == {"nirvana-us": "grunge", "nirvana-uk": "britpop"}
+
+
+def test_maintenance_jobs_update_one_artist(db_path, monkeypatch):
+    import app
+
+    add_artists(db_path)
+    with db.transaction(db_path) as conn:
+        conn.execute("UPDATE artists SET genre = 'britpop' WHERE spotify_id = 'nirvana-uk'")
+        conn.execute("UPDATE artists SET genre = 'Nirvana is a band' WHERE spotify_id = 'nirvana-us'")
+    monkeypatch.setattr(app, "genre_cache", GenreCache(db_path))
+    monkeypatch.setattr(app, "genre_classifier", FakeClassifier("grunge"))
+
+    app.reset_invalid_genres(db_path=db_path)  # Resets the invalid one, then re-asks the LLM for every 'Unknown'
+
+    assert stored_genres(db_path) == {"nirvana-us": "grunge", "nirvana-uk": "britpop", "Nirvana": "grunge"}
@@ -0,0 +1,44 @@
+"""Startup budget: runs benchmarks/bench_startup.py's in-process measurement and fails on a regression."""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import bench_startup  # noqa: E402
+
+# ~0.25s / ~0.3s on a laptop; the headroom is for slow CI machines, not for regressions
+IMPORT_BUDGET_SEC = 2.0
+FIRST_RESPONSE_BUDGET_SEC = 3.0
+
+IMPORT_ONLY = "import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)"
+
+
+def run_python(code, env, cwd=ROOT):
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ""
+
+
+def test_import_is_fast_and_writes_nothing(tmp_path):
+    env = {**bench_startup.bench_env(str(tmp_path)), "PYTHONPATH": ROOT}
+    workdir = tmp_path / "cwd"  # Relative paths (chart_cache/, recommender/...) would land here
+    workdir.mkdir()
+
+    import_sec = float(run_python(IMPORT_ONLY, env, cwd=workdir))
+
+    assert import_sec < IMPORT_BUDGET_SEC
+    assert os.listdir(tmp_path) == ["cwd"]  # No database file
+    assert os.listdir(workdir) == []
+
+
+def test_first_response_within_budget(tmp_path):
+    env = bench_startup.bench_env(str(tmp_path))
+    run_python(bench_startup.SEED, env)
+
+    result = json.loads(run_python(bench_startup.IN_PROCESS, env))
+
+    assert result["status"] == 200
+    assert result["first_response_sec"] < FIRST_RESPONSE_BUDGET_SEC